@@ -0,0 +1,112 @@
+"""Multi-lot fulfillment: cheapest combination of lots covering a purchase request.
+
+Lotlar bölünebilir (ton bazında kısmi alım yapılabildiği için), bu yüzden problem kesirli
+sırt çantası problemidir: adaylar ton fiyatına göre sıralanıp ucuzdan pahalıya doldurulur.
+Bu açgözlü seçim bu problem için optimaldir; sadece son lottan kısmi alım yapılır.
+Binlerce aday için maliyet tek bir sıralamadır (milisaniyeler).
+
+Rezervasyon `checkout` ile tek transaction'da yapılır: lotlar id sırasıyla, ardından
+etkilenen malzemelerin market_stats satırları malzeme adı sırasıyla kilitlenir (Postgres'te
+FOR UPDATE, eşzamanlı çoklu alımlarda kilitlenme olmasın diye sabit sıra) ve her stok
+düşümü koşullu UPDATE'tir; biri tutmazsa hiçbir lot düşülmez. Tek lotluk checkout da
+aynı yoldan geçer.
+"""
+from collections import namedtuple
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+import models
+import matching
+import market_stats
+import price_history
+import jobs
+
+# Ton hesaplarındaki kayan nokta artıkları
+EPSILON_TONS = 1e-6
+
+Pick = namedtuple("Pick", "lot_id quantity_tons price_usd subtotal_usd quality_score")
+
+
+def candidates(db: Session, criteria, min_quality: Optional[float] = None):
+    """(id, mfi, density, fiyat, kalite, tonaj, enlem, boylam) satırları — matching ile aynı filtre ve indeks."""
+    lot = models.GuaranteedLot
+    query = matching.candidate_query(
+        db, criteria.material_type, criteria.min_mfi, criteria.max_mfi, criteria.min_density, criteria.max_density
+    ).filter(lot.quantity_tons > 0, lot.selling_price_usd.isnot(None))
+    if min_quality is not None:
+        query = query.filter(lot.quality_score_numeric >= min_quality)
+    return query.yield_per(matching.STREAM_CHUNK)
+
+
+def solve(rows, target_tons: float) -> dict:
+    """Hedef tonajı en düşük toplam maliyetle karşılayan seçim (eşit fiyatta büyük lot, sonra düşük id)."""
+    ordered = sorted(rows, key=lambda row: (row[3], -row[5], row[0]))
+    picks: List[Pick] = []
+    remaining = target_tons
+    for lot_id, _, _, price, quality, available, *_ in ordered:
+        if remaining <= EPSILON_TONS:
+            break
+        take = min(available, remaining)
+        picks.append(Pick(lot_id, round(take, 6), price, round(take * price, 2), quality))
+        remaining -= take
+    covered = target_tons - max(remaining, 0.0)
+    total = sum(p.subtotal_usd for p in picks)
+    return {
+        "target_tons": target_tons,
+        "allocated_tons": round(covered, 6),
+        "shortfall_tons": round(max(remaining, 0.0), 6),
+        "total_usd": round(total, 2),
+        "average_price_usd": round(total / covered, 2) if covered else None,
+        "lots": [p._asdict() for p in picks],
+    }
+
+
+def allocate(db: Session, criteria, target_tons: Optional[float] = None, min_quality: Optional[float] = None) -> dict:
+    return solve(candidates(db, criteria, min_quality), target_tons or criteria.target_quantity_tons)
+
+
+def checkout(db: Session, items: list, incoterms: str, buyer_id: int) -> List[models.Order]:
+    """items: (lot_id, quantity_tons) listesi. Ya hepsi rezerve edilir ya hiçbiri; commit etmez."""
+    wanted = {}
+    for lot_id, quantity in items:
+        if quantity <= 0:
+            raise HTTPException(status_code=400, detail="Miktar sıfırdan büyük olmalı")
+        wanted[lot_id] = wanted.get(lot_id, 0.0) + quantity
+
+    lot = models.GuaranteedLot
+    # populate_existing: çağıran lotu kilitten önce okumuş olabilir, delta kilitli değerden hesaplansın
+    locked = db.query(lot).filter(lot.id.in_(wanted)).order_by(lot.id).with_for_update().populate_existing().all()
+    if len(locked) != len(wanted):
+        missing = sorted(set(wanted) - {row.id for row in locked})
+        raise HTTPException(status_code=404, detail=f"Lot bulunamadı: {missing}")
+    # İstatistik satırları döngüde lot sırasıyla değil, burada malzeme sırasıyla kilitlenir
+    market_stats.lock(db, [row.material_type for row in locked])
+
+    orders = []
+    for row in locked:
+        quantity = wanted[row.id]
+        before = market_stats.lot_state(row)
+        # Koşullu düşüm: kilit olmayan SQLite'ta da eşzamanlı alım stoğu eksiye düşüremez
+        result = db.execute(
+            update(lot)
+            .where(lot.id == row.id, lot.is_active == True, lot.quantity_tons >= quantity - EPSILON_TONS)
+            .values(quantity_tons=lot.quantity_tons - quantity, is_active=lot.quantity_tons - quantity > EPSILON_TONS)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            raise HTTPException(status_code=409, detail=f"Lot #{row.id} için yetersiz stok, hiçbir lot rezerve edilmedi")
+        db.refresh(row)
+
+        total_usd = row.selling_price_usd * quantity
+        order = models.Order(
+            buyer_id=buyer_id, lot_id=row.id, quantity_tons=quantity, total_amount_usd=total_usd,
+            incoterms=incoterms, payment_status="Escrow_Funded",
+        )
+        db.add(order)
+        orders.append(order)
+        market_stats.apply_lot_change(db, before, market_stats.lot_state(row))
+        market_stats.record_fill(db, row.material_type, quantity, total_usd)
+        price_history.record_event(db, row, "fill", row.selling_price_usd, quantity)
+    jobs.enqueue(db, "price_model.refresh", delay_seconds=60, unique=True)
+    return orders
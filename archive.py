@@ -0,0 +1,165 @@
+"""Hot/cold archival of settled orders, idle conversations and dead lots.
+
+Sıcak tablolar (ve indeksleri) sadece canlı veriyi tutsun diye uygun satırlar küçük
+partiler halinde `*_archive` tablolarına taşınır: her parti tek transaction'da
+`INSERT ... SELECT` + `DELETE`'tir, yarıda kesilen bir çalıştırma tekrar başlatılabilir.
+
+Sıra FK'lara göredir: önce kapanmış siparişler, sonra sessiz konuşmaların mesajları ve
+konuşmaların kendisi, en son hiçbir sıcak sipariş/konuşmanın göstermediği pasif lotlar.
+Okumalar arşive sadece `include_archived` açıkça istendiğinde bakar; market_stats'ın tam
+hesaplaması arşivlenmiş siparişleri de sayar. Arşivlenen id'ler sıcak tabloda tekrar
+verilmez (SQLite'ta AUTOINCREMENT, mevcut veritabanları için migration_v16.py).
+
+    python archive.py run [--batch-size 500] [--dry-run]
+"""
+import argparse
+import datetime
+import os
+from sqlalchemy import delete, exists, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+import models
+import jobs
+
+BATCH_SIZE = 500
+SETTLED_PAYMENT_STATUSES = ("Released_to_Seller", "Refunded")
+ORDER_RETENTION_DAYS = int(os.environ.get("ARCHIVE_ORDER_DAYS", "90"))
+CONVERSATION_IDLE_DAYS = int(os.environ.get("ARCHIVE_CONVERSATION_IDLE_DAYS", "180"))
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+# --- Uygunluk kuralları: aday id'leri döndüren SELECT'ler ---
+def _settled_orders(cutoff):
+    order = models.Order
+    return select(order.id).where(order.payment_status.in_(SETTLED_PAYMENT_STATUSES), order.created_at < cutoff)
+
+
+def _idle_conversations(cutoff):
+    conv, message = models.Conversation, models.Message
+    recent = exists().where(message.conversation_id == conv.id, message.created_at >= cutoff)
+    return select(conv.id).where(conv.created_at < cutoff, ~recent)
+
+
+def _dead_lots():
+    lot, order, conv = models.GuaranteedLot, models.Order, models.Conversation
+    return select(lot.id).where(
+        lot.is_active == False,
+        ~exists().where(order.lot_id == lot.id),
+        ~exists().where(conv.lot_id == lot.id),
+    )
+
+
+def _move(db: Session, source, target, ids: list, key="id"):
+    columns = [c.name for c in source.columns]
+    now = _now()
+    db.execute(
+        insert(target).from_select(
+            columns + ["archived_at"],
+            select(*source.columns, literal(now, type_=target.c.archived_at.type)).where(source.c[key].in_(ids)),
+        )
+    )
+    db.execute(delete(source).where(source.c[key].in_(ids)))
+
+
+def _batches(db: Session, candidates, batch_size: int, dry_run: bool, move) -> int:
+    """Aday id'leri id sırasıyla partiler halinde taşır; her parti ayrı commit."""
+    moved, last_id = 0, 0
+    id_column = candidates.selected_columns[0]
+    while True:
+        ids = list(db.execute(candidates.where(id_column > last_id).order_by(id_column).limit(batch_size)).scalars())
+        if not ids:
+            break
+        last_id = ids[-1]
+        if not dry_run:
+            move(ids)
+            db.commit()
+        moved += len(ids)
+    return moved
+
+
+def archive_orders(db: Session, batch_size: int = BATCH_SIZE, dry_run: bool = False) -> int:
+    cutoff = _now() - datetime.timedelta(days=ORDER_RETENTION_DAYS)
+    return _batches(db, _settled_orders(cutoff), batch_size, dry_run,
+                    lambda ids: _move(db, models.Order.__table__, models.orders_archive, ids))
+
+
+def archive_conversations(db: Session, batch_size: int = BATCH_SIZE, dry_run: bool = False) -> int:
+    cutoff = _now() - datetime.timedelta(days=CONVERSATION_IDLE_DAYS)
+
+    def move(ids):
+        # Mesajlar konuşmaya FK ile bağlı: önce onlar
+        _move(db, models.Message.__table__, models.messages_archive, ids, key="conversation_id")
+        _move(db, models.Conversation.__table__, models.conversations_archive, ids)
+
+    return _batches(db, _idle_conversations(cutoff), batch_size, dry_run, move)
+
+
+def archive_lots(db: Session, batch_size: int = BATCH_SIZE, dry_run: bool = False) -> int:
+    return _batches(db, _dead_lots(), batch_size, dry_run,
+                    lambda ids: _move(db, models.GuaranteedLot.__table__, models.guaranteed_lots_archive, ids))
+
+
+def run(db: Session, batch_size: int = BATCH_SIZE, dry_run: bool = False) -> dict:
+    return {
+        "orders": archive_orders(db, batch_size, dry_run),
+        "conversations": archive_conversations(db, batch_size, dry_run),
+        "lots": archive_lots(db, batch_size, dry_run),
+    }
+
+
+@jobs.handler("archive.run")
+def _archive_job(db: Session, payload: dict):
+    run(db, payload.get("batch_size", BATCH_SIZE))
+
+
+# --- Arşivi de kapsayan okumalar ---
+def orders_source(include_archived: bool = False):
+    """Order kolonlarına sahip seçilebilir: sıcak tablo ya da sıcak + arşiv birleşimi."""
+    table = models.Order.__table__
+    if not include_archived:
+        return table
+    cold = models.orders_archive
+    return union_all(select(*table.columns), select(*(cold.c[c.name] for c in table.columns))).subquery("orders_all")
+
+
+def lots_source(include_archived: bool = False):
+    table = models.GuaranteedLot.__table__
+    if not include_archived:
+        return table
+    cold = models.guaranteed_lots_archive
+    return union_all(select(*table.columns), select(*(cold.c[c.name] for c in table.columns))).subquery("lots_all")
+
+
+def archived_conversation(db: Session, conversation_id: int):
+    return db.execute(select(models.conversations_archive).where(models.conversations_archive.c.id == conversation_id)).first()
+
+
+def archived_messages(db: Session, conversation_id: int) -> list:
+    cold = models.messages_archive
+    return db.execute(select(cold).where(cold.c.conversation_id == conversation_id).order_by(cold.c.created_at)).all()
+
+
+def archived_conversations_for(db: Session, user_id: int) -> list:
+    cold = models.conversations_archive
+    return db.execute(select(cold).where((cold.c.user_low_id == user_id) | (cold.c.user_high_id == user_id))).all()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="Sıcak tablolardan arşive taşıma")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    run_parser.add_argument("--dry-run", action="store_true", help="Sadece taşınacak satırları say")
+    args = parser.parse_args()
+
+    init_db() # Arşiv tabloları
+    db = SessionLocal()
+    try:
+        report = run(db, args.batch_size, args.dry_run)
+        print(f"{'Taşınacak' if args.dry_run else 'Arşivlenen'} satırlar: {report}")
+    finally:
+        db.close()
@@ -1,9 +1,11 @@
-"""JWT Authentication utilities for EcoGrade Broker"""
+"""JWT Authentication utilities for EcoGrade Broker
+
+python-jose ve passlib/bcrypt ilk kullanımda yüklenir: soğuk başlangıçta `/` gibi kimlik
+gerektirmeyen istekler bu modüllerin import maliyetini ödemez.
+"""
 import os
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
@@ -15,55 +17,76 @@ SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "ecograde-broker-secret-key-2026-s
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
-# Password hashing (rounds=4 for serverless speed)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4)
+# Password hashing (rounds=4 for serverless speed) — ilk şifre işleminde kurulur
+_pwd_context = None
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 
+def password_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4)
+    return _pwd_context
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
+    from jose import jwt
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def token_subject(token: str) -> Optional[str]:
+    """Token geçerliyse `sub` (e-posta), imza/süre hatasında None."""
+    from jose import JWTError, jwt
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     """Get the current authenticated user from JWT token. Returns None if no token."""
     if token is None:
         return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        user = db.query(models.User).filter(models.User.email == email).first()
-        return user
-    except JWTError:
+    email = token_subject(token)
+    if email is None:
         return None
+    return db.query(models.User).filter(models.User.email == email).first()
 
 
 def require_auth(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     """Require authentication — raises 401 if not authenticated."""
     if token is None:
         raise HTTPException(status_code=401, detail="Giriş yapmanız gerekiyor")
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Geçersiz token")
-        user = db.query(models.User).filter(models.User.email == email).first()
-        if user is None:
-            raise HTTPException(status_code=401, detail="Kullanıcı bulunamadı")
-        return user
     except JWTError:
         raise HTTPException(status_code=401, detail="Token süresi dolmuş veya geçersiz")
+    email: str = payload.get("sub")
+    if email is None:
+        raise HTTPException(status_code=401, detail="Geçersiz token")
+    user = db.query(models.User).filter(models.User.email == email).first()
+    if user is None:
+        raise HTTPException(status_code=401, detail="Kullanıcı bulunamadı")
+    return user
+
+
+def require_admin(current_user: models.User = Depends(require_auth)):
+    """Sadece admin rolündeki kullanıcılar — aksi halde 403."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Bu işlem için admin yetkisi gerekiyor")
+    return current_user
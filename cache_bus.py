@@ -0,0 +1,303 @@
+"""Cross-worker cache invalidation bus.
+
+Yazma yolları önbelleğe etki eden her değişiklikte `bump(db, "catalog")` çağırır; varlığın
+sürümü `entity_versions` tablosunda aynı transaction içinde artar ve olay yayınlanır:
+
+    Postgres  `pg_notify('cache_bus', ...)` — NOTIFY transactional'dır, sadece commit'te teslim edilir
+    SQLite    `change_log` tablosuna satır — worker'lar id > son_görülen ile ucuzca yoklar
+
+Her süreç bir dinleyici thread'i çalıştırır (ilk önbellek kullanımında başlar) ve gelen olayla
+o varlığa bağlı yerel önbellekleri boşaltır. Yazan süreç kendi olayını commit anında yerelde
+uygular; bus'tan tekrar gelen aynı sürüm yok sayılır. Yayılma gecikmesi (olay zamanı ->
+alındığı an) `metrics()` ile izlenir.
+"""
+import datetime
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional
+from sqlalchemy import delete, event, select, text
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine, dialect_insert
+import models
+
+CHANNEL = "cache_bus"
+POLL_SECONDS = float(os.environ.get("CACHE_BUS_POLL_SECONDS", "0.25"))
+CHANGE_LOG_RETENTION_SECONDS = 60 * 60
+PRUNE_EVERY_SECONDS = 10 * 60
+LAG_SAMPLES = 500
+
+_versions: Dict[str, int] = {} # Bu sürecin gördüğü son sürümler
+_subscribers: Dict[str, list] = {}
+_lock = threading.Lock()
+_start_lock = threading.Lock()
+_background_start = threading.Lock()
+_listener = {"thread": None, "error": None, "backend": None}
+_metrics = {"published": 0, "received": 0, "applied": 0, "stale": 0, "lags_ms": deque(maxlen=LAG_SAMPLES)}
+
+
+def _now_ms() -> float:
+    return time.time() * 1000.0
+
+
+def _epoch_ms(value: Optional[datetime.datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    # SQLite tz bilgisini saklamaz; değerler UTC yazılıyor
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp() * 1000.0
+
+
+# --- Yayınlama (yazma yolları) ---
+def bump(db: Session, entity: str) -> int:
+    """Varlığın sürümünü artırır ve olayı transaction'a ekler (commit etmez); yeni sürümü döndürür."""
+    table = models.EntityVersion.__table__
+    stmt = dialect_insert(db)(table).values(entity=entity, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["entity"],
+        set_={"version": table.c.version + 1, "updated_at": stmt.excluded.updated_at},
+    ).returning(table.c.version)
+    version = db.execute(stmt).scalar_one()
+
+    payload = {"e": entity, "v": version, "t": _now_ms()}
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": json.dumps(payload)})
+    else:
+        db.add(models.ChangeLog(entity=entity, version=version))
+    db.info.setdefault("cache_bus_pending", []).append(payload)
+    _metrics["published"] += 1
+    return version
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_own_events(session):
+    for payload in session.info.pop("cache_bus_pending", []):
+        _dispatch(payload["e"], payload["v"])
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _drop_own_events(session):
+    session.info.pop("cache_bus_pending", None)
+
+
+# --- Abonelik ---
+def subscribe(entity: str, callback: Callable[[str, int], None]):
+    """Varlık değiştiğinde `callback(entity, version)` çağrılır (dinleyici thread'inden)."""
+    with _lock:
+        _subscribers.setdefault(entity, []).append(callback)
+
+
+def version(entity: str) -> Optional[int]:
+    return _versions.get(entity)
+
+
+def _dispatch(entity: str, new_version: int, sent_ms: Optional[float] = None):
+    if sent_ms is not None:
+        _metrics["received"] += 1
+        _metrics["lags_ms"].append(max(_now_ms() - sent_ms, 0.0))
+    with _lock:
+        if new_version <= _versions.get(entity, 0):
+            _metrics["stale"] += 1
+            return
+        _versions[entity] = new_version
+        callbacks = list(_subscribers.get(entity, ()))
+    _metrics["applied"] += 1
+    for callback in callbacks:
+        try:
+            callback(entity, new_version)
+        except Exception as e:
+            print(f"cache_bus subscriber error ({entity}): {e}")
+
+
+def _load_versions(db: Session):
+    for entity, current in db.query(models.EntityVersion.entity, models.EntityVersion.version):
+        _dispatch(entity, current)
+
+
+# --- Dinleyiciler ---
+def _listen_postgres():
+    # NOTIFY'lar bağlantıda sorgu çalıştıkça okunur; hafif bir SELECT 1 ile yoklanır
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"LISTEN {CHANNEL}")
+        connection.commit()
+        dbapi = connection.driver_connection
+        while True:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            connection.commit()
+            notifications = getattr(dbapi, "notifications", None) # pg8000
+            if notifications is None: # psycopg2
+                dbapi.poll()
+                notifications = dbapi.notifies
+            while notifications:
+                item = notifications.popleft() if hasattr(notifications, "popleft") else notifications.pop(0)
+                raw = item[2] if isinstance(item, tuple) else item.payload
+                payload = json.loads(raw)
+                _dispatch(payload["e"], payload["v"], payload.get("t"))
+            time.sleep(POLL_SECONDS)
+    finally:
+        connection.close()
+
+
+def _listen_change_log():
+    log = models.ChangeLog
+    db = SessionLocal()
+    try:
+        last_id = db.execute(select(log.id).order_by(log.id.desc()).limit(1)).scalar() or 0
+    finally:
+        db.close()
+    last_prune = time.monotonic()
+    while True:
+        db = SessionLocal()
+        try:
+            for row_id, entity, row_version, created_at in db.execute(
+                select(log.id, log.entity, log.version, log.created_at).where(log.id > last_id).order_by(log.id)
+            ):
+                last_id = row_id
+                _dispatch(entity, row_version, _epoch_ms(created_at))
+            if time.monotonic() - last_prune > PRUNE_EVERY_SECONDS:
+                cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=CHANGE_LOG_RETENTION_SECONDS)
+                db.execute(delete(log).where(log.created_at < cutoff))
+                db.commit()
+                last_prune = time.monotonic()
+        finally:
+            db.close()
+        time.sleep(POLL_SECONDS)
+
+
+def _run_listener(listen):
+    while True:
+        try:
+            listen()
+        except Exception as e:
+            _listener["error"] = str(e)
+            print(f"cache_bus listener error, retrying: {e}")
+            # Bağlantı koptuysa aradaki olaylar kaçmış olabilir: bilinen sürümlerle senkronize ol
+            time.sleep(1.0)
+            db = SessionLocal()
+            try:
+                _load_versions(db)
+            except Exception:
+                pass
+            finally:
+                db.close()
+
+
+def started() -> bool:
+    """Dinleyici çalışıyor ve bilinen sürümler DB'den yüklenmiş mi."""
+    return _listener["thread"] is not None
+
+
+def ensure_started() -> bool:
+    """Dinleyiciyi bir kez başlatır; önbellekler kullanılmadan önce çağrılır."""
+    if _listener["thread"] is not None:
+        return True
+    with _start_lock:
+        if _listener["thread"] is None:
+            postgres = engine.dialect.name == "postgresql"
+            _listener["backend"] = "postgres-notify" if postgres else "change-log-poll"
+            db = SessionLocal()
+            try:
+                _load_versions(db)
+            finally:
+                db.close()
+            thread = threading.Thread(
+                target=_run_listener, args=(_listen_postgres if postgres else _listen_change_log,),
+                name="cache-bus", daemon=True,
+            )
+            thread.start()
+            _listener["thread"] = thread
+    return True
+
+
+def start_in_background():
+    """ensure_started'ı isteği bekletmeden başlatır: soğuk başlangıçta ilk istek sürüm okumasını beklemez."""
+    if started() or not _background_start.acquire(blocking=False):
+        return
+
+    def start():
+        try:
+            ensure_started()
+        except Exception as e:
+            _listener["error"] = str(e)
+            print(f"cache_bus start failed: {e}")
+        finally:
+            _background_start.release()
+
+    threading.Thread(target=start, name="cache-bus-start", daemon=True).start()
+
+
+# --- Yerel önbellek ---
+class LocalCache:
+    """Süreç içi anahtar-değer önbelleği; bağlı varlıklardan biri değişince tamamen boşalır."""
+
+    def __init__(self, name: str, entities: Iterable[str]):
+        self.name = name
+        self.entities = tuple(entities)
+        self._data = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        for entity in self.entities:
+            subscribe(entity, self._invalidate)
+        _caches[name] = self
+
+    def _invalidate(self, entity: str, new_version: int):
+        with self._lock:
+            if self._data:
+                self.evictions += 1
+            self._data.clear()
+
+    def version_key(self) -> tuple:
+        return tuple(_versions.get(entity, 0) for entity in self.entities)
+
+    def get(self, key, loader: Callable[[], object]):
+        # Sürümler yüklenince _dispatch önbelleği boşaltır; o zamana kadar yüklenen değer de doğrudur
+        start_in_background()
+        # Değer yüklenirken sürüm değişirse eski değer yeni sürüm altında saklanmasın
+        tag = self.version_key()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == tag:
+                self.hits += 1
+                return entry[1]
+        self.misses += 1
+        value = loader()
+        with self._lock:
+            if self.version_key() == tag:
+                self._data[key] = (tag, value)
+        return value
+
+    def stats(self) -> dict:
+        return {"entries": len(self._data), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "version": list(self.version_key())}
+
+
+_caches: Dict[str, LocalCache] = {}
+
+
+def _percentile(values: list, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 2)
+
+
+def metrics() -> dict:
+    lags = list(_metrics["lags_ms"])
+    return {
+        "backend": _listener["backend"],
+        "listener_running": _listener["thread"] is not None and _listener["thread"].is_alive(),
+        "last_error": _listener["error"],
+        "published": _metrics["published"],
+        "received": _metrics["received"],
+        "applied": _metrics["applied"],
+        "stale_or_duplicate": _metrics["stale"],
+        "lag_ms": {"p50": _percentile(lags, 0.5), "p95": _percentile(lags, 0.95), "max": round(max(lags), 2) if lags else None},
+        "versions": dict(_versions),
+        "caches": {name: cache.stats() for name, cache in _caches.items()},
+    }
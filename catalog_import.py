@@ -0,0 +1,299 @@
+"""Constant-memory catalog importer for Excel (.xlsx), CSV and NDJSON supplier files.
+
+Dosya satır satır okunur (DataFrame yok), kolonlar bir eşleme (mapping) ile model
+alanlarına çevrilir ve `GuaranteedLot` / `Offer` satırları Core `insert()` partileriyle
+yazılır. `product_code` dolu satırlar o koda göre upsert edilir; güncellemede boş gelen
+alanlar ve iş akışı durumu (ilan onayı, lotun aktifliği) korunur.
+
+    python catalog_import.py katalog.xlsx --mapping mapping.json
+    python catalog_import.py katalog.csv --target offers --seller-id 3 --batch-size 2000
+
+Mapping dosyası örneği:
+    {
+      "target": "lots",
+      "columns": {"Malzeme Adı": "material_type", "Kod": "product_code", "Fiyat": "selling_price_usd"},
+      "defaults": {"carbon_score": "B", "material_form": "Granül"},
+      "extra_to_custom_fields": true
+    }
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from typing import Callable, Iterator, Optional
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from database import dialect_insert
+import models
+import geo
+
+DEFAULT_BATCH_SIZE = 1000
+
+# seed_from_excel'in kullandığı Kitap.xlsx başlıkları + yaygın İngilizce başlıklar
+DEFAULT_MAPPING = {
+    "target": "lots",
+    "columns": {
+        "Malzeme Adı": "material_type",
+        "Kod": "product_code",
+        "material_type": "material_type",
+        "material_form": "material_form",
+        "product_code": "product_code",
+        "mfi": "mfi",
+        "density": "density",
+        "quantity_tons": "quantity_tons",
+        "selling_price_usd": "selling_price_usd",
+        "carbon_score": "carbon_score",
+        "declared_mfi": "declared_mfi",
+        "declared_density": "declared_density",
+        "ai_estimated_price_usd": "ai_estimated_price_usd",
+        "seller_id": "seller_id",
+        "latitude": "latitude",
+        "longitude": "longitude",
+        "Konum": "location",
+        "location": "location",
+    },
+    "defaults": {},
+    "extra_to_custom_fields": False,
+}
+
+TARGETS = {
+    "lots": {
+        "model": models.GuaranteedLot,
+        "fields": {
+            "material_type": str, "material_form": str, "product_code": str, "mfi": float, "density": float,
+            "quantity_tons": float, "selling_price_usd": float, "carbon_score": str,
+            "quality_score_numeric": float, "is_active": bool, "latitude": float, "longitude": float,
+        },
+        "defaults": {"material_form": "Granül", "is_active": True},
+        # Sadece ilk eklemede yazılır; checkout/silme ile değişen durum re-import'ta ezilmez
+        "insert_only": {"is_active"},
+    },
+    "offers": {
+        "model": models.Offer,
+        "fields": {
+            "material_type": str, "material_form": str, "product_code": str, "declared_mfi": float,
+            "declared_density": float, "quantity_tons": float, "ai_estimated_price_usd": float,
+            "seller_id": int, "status": str, "latitude": float, "longitude": float,
+        },
+        "defaults": {"material_form": "Granül", "status": "AwaitingSample"},
+        # İş akışı alanları (onay/red, kuyruk sahipliği) import ile geri alınmaz
+        "insert_only": {"status", "claimed_by", "lease_expires_at"},
+    },
+}
+
+
+# --- Okuyucular: her biri başlık->değer dict'leri üretir ---
+def read_csv(path: str) -> Iterator[dict]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.DictReader(f, dialect=dialect)
+
+
+def read_ndjson(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_xlsx(path: str) -> Iterator[dict]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise SystemExit("Excel import için openpyxl gerekli: pip install openpyxl")
+    # read_only modu satırları diskten akıtır, tüm çalışma kitabını belleğe almaz
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, [])]
+        for values in rows:
+            if values is None or all(v is None for v in values):
+                continue
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+READERS = {".csv": read_csv, ".tsv": read_csv, ".ndjson": read_ndjson, ".jsonl": read_ndjson, ".xlsx": read_xlsx}
+
+
+def open_rows(path: str) -> Iterator[dict]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in READERS:
+        raise SystemExit(f"Desteklenmeyen dosya türü: {ext} (xlsx, csv, ndjson)")
+    return READERS[ext](path)
+
+
+# --- Dönüştürme ---
+def _convert(value, kind):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if kind is float:
+        if isinstance(value, str):
+            value = value.strip().replace(" ", "")
+            # "1.250,50" / "12,5" gibi Türkçe ondalık yazımları
+            if "," in value:
+                value = value.replace(".", "").replace(",", ".")
+        return float(value)
+    if kind is int:
+        return int(float(value))
+    if kind is bool:
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "evet", "yes", "aktif")
+        return bool(value)
+    return str(value).strip()
+
+
+def build_mapper(mapping: dict) -> Callable[[dict], Optional[dict]]:
+    target = mapping.get("target", "lots")
+    spec = TARGETS[target]
+    fields = spec["fields"]
+    columns = mapping.get("columns", {})
+    defaults = dict(spec["defaults"], **mapping.get("defaults", {}))
+    extras = mapping.get("extra_to_custom_fields", False)
+
+    def map_row(raw: dict) -> Optional[dict]:
+        row = dict(defaults)
+        custom = {}
+        for source, value in raw.items():
+            field = columns.get(source)
+            if field == "location" and value not in (None, ""):
+                custom["location"] = str(value) # geo.apply koordinatı buradan çözer
+            elif field in fields:
+                converted = _convert(value, fields[field])
+                if converted is not None:
+                    row[field] = converted
+            elif extras and value not in (None, ""):
+                custom[source] = value if isinstance(value, (int, float, bool)) else str(value)
+        if not row.get("material_type"):
+            return None
+        row["custom_fields"] = custom
+        geo.apply(row)
+        if target == "offers":
+            row["estimated_value_usd"] = (row.get("ai_estimated_price_usd") or 0.0) * (row.get("quantity_tons") or 0.0)
+        return row
+
+    return map_row
+
+
+# --- Yazma ---
+def _insert_only(table) -> set:
+    for spec in TARGETS.values():
+        if spec["model"].__table__ is table:
+            return spec.get("insert_only", set())
+    return set()
+
+
+def _upsert_statement(db: Session, table, rows: list):
+    stmt = dialect_insert(db)(table).values(rows)
+    updatable = {k for row in rows for k in row} - {"product_code", "id"} - _insert_only(table)
+    # Satırda boş gelen (normalize edilirken NULL'lanan) alan mevcut değeri silmesin
+    return stmt.on_conflict_do_update(
+        index_elements=["product_code"],
+        set_={k: func.coalesce(stmt.excluded[k], table.c[k]) for k in updatable},
+    )
+
+
+def write_batch(db: Session, table, rows: list) -> int:
+    coded, plain = {}, []
+    for row in rows:
+        if row.get("product_code"):
+            coded[row["product_code"]] = row # Aynı partide tekrar eden kod: son satır kazanır
+        else:
+            plain.append(row)
+    # Çok satırlı insert'te tüm satırlar aynı anahtarları taşımalı (eksik sayısal alanlar NULL)
+    for group in (list(coded.values()), plain):
+        if not group:
+            continue
+        keys = set().union(*group)
+        normalized = [{k: row.get(k) for k in keys} for row in group]
+        if group is plain:
+            db.execute(insert(table), normalized)
+        else:
+            db.execute(_upsert_statement(db, table, normalized))
+    db.commit()
+    return len(coded) + len(plain)
+
+
+def run_import(db: Session, rows: Iterator[dict], mapping: dict = DEFAULT_MAPPING, batch_size: int = DEFAULT_BATCH_SIZE,
+               limit: Optional[int] = None, transform: Optional[Callable[[dict], dict]] = None,
+               progress: Callable[[str], None] = print) -> dict:
+    target = mapping.get("target", "lots")
+    table = TARGETS[target]["model"].__table__
+    map_row = build_mapper(mapping)
+    started = time.perf_counter()
+    read = written = skipped = 0
+    batch = []
+    for raw in rows:
+        read += 1
+        row = map_row(raw)
+        if row is None:
+            skipped += 1
+        else:
+            batch.append(transform(row) if transform else row)
+        if len(batch) >= batch_size:
+            written += write_batch(db, table, batch)
+            batch = []
+            elapsed = time.perf_counter() - started
+            progress(f"{written} satır yazıldı ({written / elapsed:,.0f} satır/sn)")
+        if limit is not None and read >= limit:
+            break
+    if batch:
+        written += write_batch(db, table, batch)
+
+    # Toplu yazma delta yollarını atladığı için türetilmiş tablolar bir kez yeniden hesaplanır
+    if target == "lots":
+        import market_stats, cache_bus
+        market_stats.rebuild(db)
+        cache_bus.bump(db, "catalog")
+        db.commit()
+    else:
+        import offer_queue
+        offer_queue.rebuild_status_counts(db)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "read": read, "written": written, "skipped": skipped,
+        "seconds": round(elapsed, 2), "rows_per_second": round(written / elapsed) if elapsed > 0 else written,
+    }
+    progress(f"Import tamamlandı: {report}")
+    return report
+
+
+def load_mapping(path: Optional[str]) -> dict:
+    if not path:
+        return dict(DEFAULT_MAPPING)
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="Tedarikçi kataloğu import (xlsx/csv/ndjson)")
+    parser.add_argument("path")
+    parser.add_argument("--mapping", help="Kolon eşleme JSON dosyası")
+    parser.add_argument("--target", choices=tuple(TARGETS), help="Mapping'deki hedefi ezer")
+    parser.add_argument("--seller-id", type=int, help="Offer import'unda varsayılan satıcı")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    mapping = load_mapping(args.mapping)
+    if args.target:
+        mapping["target"] = args.target
+    if args.seller_id is not None:
+        mapping.setdefault("defaults", {})["seller_id"] = args.seller_id
+
+    init_db()
+    db = SessionLocal()
+    try:
+        run_import(db, open_rows(args.path), mapping, args.batch_size, args.limit)
+    finally:
+        db.close()
@@ -0,0 +1,366 @@
+"""Memory-mapped columnar snapshot of the active catalog for cold-start reads.
+
+Yeni bir instance'ın ilk `/products/` ya da eşleştirme isteği uzak veritabanına gitmek
+yerine diskteki anlık görüntüyü `mmap` ile açıp okur. Dosya sütun bazlıdır:
+
+    ECGSNAP1 | uint32 başlık uzunluğu | JSON başlık | (8 bayta hizalı) sütunlar
+    sayısal sütunlar   float64 dizileri, NULL = NaN (mfi, density, fiyat, miktar, kalite, konum)
+    tamsayı sütunlar   int64 dizileri, NULL = -1 (id, original_offer_id)
+    metin sütunları    int32 dizileri, metin tablosundaki sıra no; NULL = -1
+    metin tablosu      int64 ofsetler + UTF-8 blob (tekrarlayan değerler bir kez yazılır)
+
+Sayısal sütunlar `memoryview.cast` ile kopyalanmadan okunur; metinler ilk erişimde çözülür.
+Başlık, görüntünün alındığı katalog sürümünü (cache_bus "catalog") ve malzeme başına
+referans fiyatları taşır. Okurken sürüm cache_bus'ın bildiği sürümden eskiyse görüntü
+bayat sayılır ve çağıran DB'ye düşer.
+
+Soğuk instance'ın ilk istekleri DB'ye hiç gitmez: bus arka planda başlatılır (sürümleri
+`entity_versions`'tan o yükler) ve o senkronize olana kadar CATALOG_SNAPSHOT_MAX_AGE
+saniyeden genç görüntü doğrudan servis edilir. Bedeli: bus'ın başlamasını bekleyen bu kısa
+aralıkta görüntü alındıktan sonra yapılmış bir katalog değişikliği görünmeyebilir; bus
+sürümü yüklediği an bayat görüntü bırakılır.
+
+    python catalog_snapshot.py export [--path catalog.snap] [--force]
+    python catalog_snapshot.py info [--path catalog.snap]
+"""
+import argparse
+import array
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Iterator, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+import models
+import cache_bus
+import jobs
+
+MAGIC = b"ECGSNAP1"
+FORMAT_VERSION = 1
+SNAPSHOT_PATH = os.environ.get("CATALOG_SNAPSHOT_PATH", "catalog.snap")
+# Bus henüz senkronize değilken (soğuk başlangıç) sürüm doğrulanmadan güvenilen en eski görüntü
+MAX_AGE_SECONDS = float(os.environ.get("CATALOG_SNAPSHOT_MAX_AGE", "300"))
+# Dosya değişti mi kontrolü (stat) en fazla bu sıklıkta yapılır
+RECHECK_SECONDS = 1.0
+CATALOG = "catalog"
+
+# Sıra matching.candidate_query satırlarıyla aynı (id'den sonra)
+NUMERIC_COLUMNS = ("mfi", "density", "selling_price_usd", "quality_score_numeric", "quantity_tons", "latitude", "longitude")
+INTEGER_COLUMNS = ("id", "original_offer_id")
+STRING_COLUMNS = ("material_type", "material_form", "carbon_score", "seller_name", "custom_fields")
+
+
+class SnapshotLot:
+    """Görüntüden okunan lot; GuaranteedLot şemasının beklediği alanları taşır."""
+
+    created_at = None
+    is_active = True
+    match_score = None
+    distance_km = None
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class Snapshot:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} bir katalog görüntüsü değil")
+        (header_len,) = struct.unpack_from("<I", view, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(bytes(view[start:start + header_len]))
+        if header.get("format") != FORMAT_VERSION or header.get("byteorder") != sys.byteorder:
+            raise ValueError(f"{path}: desteklenmeyen görüntü biçimi")
+        self.version = header["version"]
+        self.exported_at = header["exported_at"]
+        self.count = header["count"]
+        self.reference_prices = header.get("reference_prices", {})
+        self._columns = {
+            name: view[offset:offset + length].cast(code)
+            for name, (offset, length, code) in header["columns"].items()
+        }
+        offset, length = header["string_offsets"]
+        self._string_offsets = view[offset:offset + length].cast("q")
+        offset, length = header["string_blob"]
+        self._blob = view[offset:offset + length]
+        self._strings = [None] * (len(self._string_offsets) - 1)
+        self._string_index = None
+        self._by_id = None
+
+    # --- Okuma ---
+    def string(self, index: int) -> Optional[str]:
+        if index < 0:
+            return None
+        value = self._strings[index]
+        if value is None:
+            value = self._strings[index] = bytes(
+                self._blob[self._string_offsets[index]:self._string_offsets[index + 1]]
+            ).decode("utf-8")
+        return value
+
+    def _find_string(self, value: str) -> int:
+        if self._string_index is None:
+            self._string_index = {self.string(i): i for i in range(len(self._strings))}
+        return self._string_index.get(value, -2) # -2: hiçbir satırla eşleşmez
+
+    def _number(self, name: str, i: int) -> Optional[float]:
+        value = self._columns[name][i]
+        return None if math.isnan(value) else value
+
+    def lot(self, i: int) -> SnapshotLot:
+        strings = {name: self.string(self._columns[name][i]) for name in STRING_COLUMNS}
+        custom_fields = strings.pop("custom_fields")
+        offer_id = self._columns["original_offer_id"][i]
+        return SnapshotLot(
+            id=self._columns["id"][i],
+            original_offer_id=offer_id if offer_id >= 0 else None,
+            custom_fields=json.loads(custom_fields) if custom_fields is not None else None,
+            **strings,
+            **{name: self._number(name, i) for name in NUMERIC_COLUMNS},
+        )
+
+    def lots(self) -> Iterator[SnapshotLot]:
+        for i in range(self.count):
+            yield self.lot(i)
+
+    def lot_by_id(self, lot_id: int) -> Optional[SnapshotLot]:
+        if self._by_id is None:
+            self._by_id = {value: i for i, value in enumerate(self._columns["id"])}
+        i = self._by_id.get(lot_id)
+        return self.lot(i) if i is not None else None
+
+    def candidates(self, material_type: Optional[str], min_mfi=None, max_mfi=None,
+                   min_density=None, max_density=None) -> Iterator[tuple]:
+        """matching.candidate_query ile aynı filtreler ve aynı satır biçimi; DB'ye gitmez."""
+        columns = self._columns
+        ids, materials = columns["id"], columns["material_type"]
+        mfis, densities = columns["mfi"], columns["density"]
+        wanted = self._find_string(material_type) if material_type else None
+        for i in range(self.count):
+            if wanted is not None and materials[i] != wanted:
+                continue
+            mfi, density = mfis[i], densities[i]
+            # NaN karşılaştırmaları False döner: NULL değerler SQL'deki gibi filtreye takılır
+            if min_mfi and not mfi >= min_mfi:
+                continue
+            if max_mfi and not mfi <= max_mfi:
+                continue
+            if min_density and not density >= min_density:
+                continue
+            if max_density and not density <= max_density:
+                continue
+            yield (ids[i], *(self._number(name, i) for name in NUMERIC_COLUMNS))
+
+    def reference_price(self, material_type: Optional[str]) -> Optional[float]:
+        return self.reference_prices.get(material_type) if material_type else None
+
+
+# --- Yazma ---
+def _catalog_version(db: Session) -> int:
+    version = db.execute(select(models.EntityVersion.version).where(models.EntityVersion.entity == CATALOG)).scalar()
+    return version or 0
+
+
+def _load(db: Session):
+    """Sürümle tutarlı bir lot listesi: okuma sırasında katalog değişirse tekrar okunur."""
+    for _ in range(3):
+        version = _catalog_version(db)
+        lots = (
+            db.query(models.GuaranteedLot)
+            .options(selectinload(models.GuaranteedLot.original_offer).selectinload(models.Offer.seller))
+            .filter(models.GuaranteedLot.is_active == True)
+            .order_by(models.GuaranteedLot.id)
+            .populate_existing() # Uzun ömürlü oturumda kimlik haritasındaki eski değerler kullanılmasın
+            .all()
+        )
+        if _catalog_version(db) == version:
+            return version, lots
+        db.rollback()
+    raise RuntimeError("Katalog görüntü alınırken sürekli değişti, sonra tekrar deneyin")
+
+
+def read_version(path: str) -> Optional[int]:
+    try:
+        return Snapshot(path).version
+    except (OSError, ValueError):
+        return None
+
+
+def export(db: Session, path: Optional[str] = None, force: bool = False) -> dict:
+    """Aktif katalogu `path`'e yazar (geçici dosya + os.replace; açık okuyucular eski dosyada kalır)."""
+    from matching import reference_price
+
+    path = path or SNAPSHOT_PATH
+    if not force and read_version(path) == _catalog_version(db):
+        return {"path": path, "skipped": True, "version": _catalog_version(db)}
+    version, lots = _load(db)
+
+    strings, string_ids = [], {}
+
+    def intern(value) -> int:
+        if value is None:
+            return -1
+        index = string_ids.get(value)
+        if index is None:
+            index = string_ids[value] = len(strings)
+            strings.append(value)
+        return index
+
+    columns = {name: array.array("d") for name in NUMERIC_COLUMNS}
+    columns.update({name: array.array("q") for name in INTEGER_COLUMNS})
+    columns.update({name: array.array("i") for name in STRING_COLUMNS})
+    for lot in lots:
+        for name in NUMERIC_COLUMNS:
+            value = getattr(lot, name)
+            columns[name].append(float("nan") if value is None else float(value))
+        columns["id"].append(lot.id)
+        columns["original_offer_id"].append(lot.original_offer_id if lot.original_offer_id is not None else -1)
+        for name in STRING_COLUMNS:
+            value = getattr(lot, name)
+            if name == "custom_fields" and value is not None:
+                value = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+            columns[name].append(intern(value))
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = array.array("q", [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    blocks = [(name, column.tobytes(), column.typecode) for name, column in columns.items()]
+    blocks.append(("__string_offsets", offsets.tobytes(), "q"))
+    blocks.append(("__string_blob", b"".join(encoded), "B"))
+
+    materials = sorted({lot.material_type for lot in lots if lot.material_type})
+    header = {
+        "format": FORMAT_VERSION, "byteorder": sys.byteorder, "version": version, "exported_at": time.time(),
+        "count": len(lots), "reference_prices": {m: reference_price(db, m) for m in materials},
+    }
+    # Ofsetler başlık uzunluğuna bağlı: başlık sabitlenene kadar yerleşim tekrar hesaplanır
+    header_len = 0
+    while True:
+        position = len(MAGIC) + 4 + header_len
+        layout = {}
+        for name, data, code in blocks:
+            position += -position % 8
+            layout[name] = (position, len(data), code)
+            position += len(data)
+        header["columns"] = {name: list(layout[name]) for name in columns}
+        header["string_offsets"] = list(layout["__string_offsets"][:2])
+        header["string_blob"] = list(layout["__string_blob"][:2])
+        raw_header = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        if len(raw_header) == header_len:
+            break
+        header_len = len(raw_header)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", header_len) + raw_header)
+        for name, data, _ in blocks:
+            f.write(b"\0" * (layout[name][0] - f.tell()))
+            f.write(data)
+        size = f.tell()
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return {"path": path, "skipped": False, "version": version, "lots": len(lots), "strings": len(strings), "bytes": size}
+
+
+@jobs.handler("catalog_snapshot.export")
+def _export_job(db: Session, payload: dict):
+    export(db, payload.get("path"), payload.get("force", False))
+
+
+# --- Süreç içi görüntü ---
+_state = {"snapshot": None, "key": None, "checked": 0.0}
+_state_lock = threading.Lock()
+_stats = {"served": 0, "stale": 0, "missing": 0, "load_errors": 0}
+
+
+def _fresh(snapshot: Snapshot) -> bool:
+    if cache_bus.started():
+        return snapshot.version >= (cache_bus.version(CATALOG) or 0)
+    # İstek yolunda DB bağlantısı açılmaz; sürüm doğrulaması bus'ın arka plan başlangıcındadır
+    cache_bus.start_in_background()
+    return time.time() - snapshot.exported_at <= MAX_AGE_SECONDS
+
+
+def _open(path: str) -> Optional[Snapshot]:
+    now = time.monotonic()
+    if now - _state["checked"] < RECHECK_SECONDS:
+        return _state["snapshot"]
+    with _state_lock:
+        _state["checked"] = now
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            _state.update(snapshot=None, key=None)
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != _state["key"]:
+            try:
+                snapshot = Snapshot(path)
+            except (OSError, ValueError) as e:
+                _stats["load_errors"] += 1
+                print(f"Katalog görüntüsü açılamadı ({path}): {e}")
+                snapshot = None
+            # Eski görüntüyü okuyan istekler referansları bırakınca mmap kapanır
+            _state.update(snapshot=snapshot, key=key)
+        return _state["snapshot"]
+
+
+def current() -> Optional[Snapshot]:
+    """Güncel görüntü; dosya yoksa ya da bayatsa None (çağıran DB'den okur)."""
+    snapshot = _open(SNAPSHOT_PATH)
+    if snapshot is None:
+        _stats["missing"] += 1
+        return None
+    if not _fresh(snapshot):
+        _stats["stale"] += 1
+        return None
+    _stats["served"] += 1
+    return snapshot
+
+
+def metrics() -> dict:
+    snapshot = _state["snapshot"]
+    return {
+        "path": SNAPSHOT_PATH,
+        "loaded_version": snapshot.version if snapshot else None,
+        "lots": snapshot.count if snapshot else None,
+        "age_seconds": round(time.time() - snapshot.exported_at, 1) if snapshot else None,
+        **_stats,
+    }
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="Aktif katalogun mmap görüntüsü")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export")
+    export_parser.add_argument("--path", default=SNAPSHOT_PATH)
+    export_parser.add_argument("--force", action="store_true", help="Sürüm aynı olsa da yeniden yaz")
+    info_parser = sub.add_parser("info")
+    info_parser.add_argument("--path", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        init_db()
+        db = SessionLocal()
+        try:
+            print(export(db, args.path, args.force))
+        finally:
+            db.close()
+    else:
+        snapshot = Snapshot(args.path)
+        print({"version": snapshot.version, "lots": snapshot.count,
+               "age_seconds": round(time.time() - snapshot.exported_at, 1),
+               "materials": sorted(snapshot.reference_prices)})
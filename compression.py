@@ -0,0 +1,106 @@
+"""Precompressed responses with Accept-Encoding negotiation.
+
+Büyük ve önbelleğe alınabilen yanıtlar (katalog) her istekte yeniden sıkıştırılmaz: gövde
+bir kez JSON'a çevrilir, istenen her kodlama için ilk ihtiyaçta bir kez sıkıştırılır ve
+katalog sürümü değişene kadar bellekten servis edilir. Diğer yanıtlar (küçük JSON'lar,
+ledger export gibi akışlar) `GZipMiddleware` ile eşik üstündeyse parça parça sıkıştırılır;
+`Content-Encoding` taşıyan önceden sıkıştırılmış yanıtlara middleware dokunmaz.
+
+brotli kuruluysa (`pip install brotli`) `br` tercih edilir, yoksa sadece gzip sunulur.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bu boyutun altındaki gövdeler sıkıştırılmaz (başlık + CPU maliyeti kazançtan büyük)
+MINIMUM_SIZE = int(os.environ.get("COMPRESS_MINIMUM_SIZE", "1024"))
+# Sürüm başına bir kez ödendiği için yüksek seviyeler kullanılabilir
+GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", "9"))
+BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", "9"))
+
+
+def encodings() -> tuple:
+    """Sunucunun üretebildiği kodlamalar, tercih sırasıyla."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Accept-Encoding başlığından (q değerleriyle) seçilecek kodlama; uygun yoksa None (identity)."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for encoding in encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        # mtime=0: aynı gövde her seferinde aynı bayt dizisine sıkışır
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Desteklenmeyen kodlama: {encoding}")
+
+
+class Precompressed:
+    """Bir kez JSON'a çevrilmiş gövde ve lazım oldukça bir kez üretilen sıkıştırılmış kopyaları."""
+
+    def __init__(self, content, media_type: str = "application/json"):
+        # JSONResponse ile aynı serileştirme
+        self.body = json.dumps(
+            jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+        ).encode("utf-8")
+        self.media_type = media_type
+        self.etag = 'W/"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def variant(self, encoding: Optional[str]) -> bytes:
+        if encoding is None or len(self.body) < MINIMUM_SIZE:
+            return self.body
+        data = self._variants.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._variants.get(encoding)
+                if data is None:
+                    data = self._variants[encoding] = compress(self.body, encoding)
+        return data
+
+    def sizes(self) -> dict:
+        return {"identity": len(self.body), **{k: len(v) for k, v in self._variants.items()}}
+
+    def response(self, accept_encoding: Optional[str], if_none_match: Optional[str] = None) -> Response:
+        headers = {"Vary": "Accept-Encoding", "ETag": self.etag}
+        if if_none_match and self.etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        encoding = negotiate(accept_encoding) if len(self.body) >= MINIMUM_SIZE else None
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(content=self.variant(encoding), media_type=self.media_type, headers=headers)
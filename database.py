@@ -1,6 +1,9 @@
 import os
 import ssl
-from sqlalchemy import create_engine, text
+import threading
+import time
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.pool import NullPool
 
@@ -21,6 +24,14 @@ if IS_PRODUCTION:
         connect_args={"ssl_context": ssl_context},
         poolclass=NullPool
     )
+    
+    # Okuma replikası (opsiyonel) — tanımlı değilse okumalar da primary'ye gider
+    replica_url = os.environ.get("REPLICA_DATABASE_URL")
+    read_engine = create_engine(
+        replica_url,
+        connect_args={"ssl_context": ssl_context},
+        poolclass=NullPool
+    ) if replica_url else engine
 else:
     # --- LOCAL DEVELOPMENT (TEST): SQLite ---
     # Kendi bilgisayarinda test yaparken bu sahte veritabanini kullanir, 
@@ -28,10 +39,91 @@ else:
     engine = create_engine(
         "sqlite:///./broker.db", connect_args={"check_same_thread": False}
     )
+    
+    # Lokal replika denemesi için: REPLICA_DATABASE_URL=sqlite:///./broker_replica.db
+    # (replica_sync.py ile primary'den kopyalanır) veya ikinci bir lokal Postgres
+    replica_url = os.environ.get("REPLICA_DATABASE_URL")
+    read_engine = create_engine(
+        replica_url, connect_args={"check_same_thread": False} if replica_url.startswith("sqlite") else {}
+    ) if replica_url else engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
+# Read-your-writes: yazan istemcinin okumaları bu süre boyunca primary'ye gider
+STICKY_SECONDS = float(os.environ.get("READ_YOUR_WRITES_SECONDS", "5"))
+# Replika erişilemezse bu süre boyunca denenmez, okumalar primary'ye düşer
+REPLICA_RETRY_SECONDS = 30.0
+
+_recent_writers = {}
+_recent_writers_lock = threading.Lock()
+_replica_down_until = 0.0
+
+
+def _client_key(request):
+    # Token varsa kullanıcıya, yoksa IP'ye göre yapışkanlık
+    if request is None:
+        return None
+    auth_header = request.headers.get("authorization")
+    if auth_header:
+        return auth_header
+    return request.client.host if request.client else None
+
+
+def _is_sticky(key) -> bool:
+    if key is None:
+        return False
+    with _recent_writers_lock:
+        wrote_at = _recent_writers.get(key)
+        if wrote_at is None:
+            return False
+        if time.monotonic() - wrote_at > STICKY_SECONDS:
+            del _recent_writers[key]
+            return False
+        return True
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _remember_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+def mark_written(key):
+    """İstemciyi yakın zamanda yazmış say; okumaları bir süre primary'ye gider."""
+    if key is None:
+        return
+    with _recent_writers_lock:
+        _recent_writers[key] = time.monotonic()
+        # Sözlük sınırsız büyümesin
+        if len(_recent_writers) > 10000:
+            cutoff = time.monotonic() - STICKY_SECONDS
+            for stale in [k for k, t in _recent_writers.items() if t < cutoff]:
+                del _recent_writers[stale]
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _mark_sticky(session):
+    key = session.info.get("client_key")
+    if key is not None and session.info.pop("wrote", False):
+        mark_written(key)
+
+
+@event.listens_for(ReadSessionLocal, "before_flush")
+def _reject_replica_writes(session, flush_context, instances):
+    raise RuntimeError("Okuma (replika) session'ı üzerinden yazma yapılamaz; get_db kullanın.")
+
+def dialect_insert(db):
+    """ON CONFLICT destekleyen dialect'e özel insert() (Postgres / SQLite)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Upsert desteklenmiyor: {dialect}")
+    return insert
+
 def init_db():
     try:
         Base.metadata.create_all(bind=engine)
@@ -40,8 +132,32 @@ def init_db():
         print(f"DB init error: {e}")
         return False
 
-def get_db():
+def get_db(request: Request = None):
+    """Yazma session'ı (primary)."""
     db = SessionLocal()
+    db.info["client_key"] = _client_key(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+def _open_read_session():
+    global _replica_down_until
+    if read_engine is engine or time.monotonic() < _replica_down_until:
+        return SessionLocal()
+    db = ReadSessionLocal()
+    try:
+        db.connection() # Replika ayakta mı? (bağlantı sorgu için zaten açılacaktı)
+        return db
+    except Exception as e:
+        db.close()
+        _replica_down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        print(f"Replica unavailable, falling back to primary: {e}")
+        return SessionLocal()
+
+def get_read_db(request: Request = None):
+    """Salt-okunur session — replikaya gider; yakın zamanda yazan istemci veya replika yoksa primary."""
+    db = SessionLocal() if _is_sticky(_client_key(request)) else _open_read_session()
     try:
         yield db
     finally:
@@ -0,0 +1,257 @@
+"""Offline geocoding and grid-indexed proximity search for lots.
+
+Konumlar `custom_fields` içindeki serbest metinden ("Gebze / Kocaeli", "Aliağa / İzmir")
+ağ erişimi olmadan, gömülü bir sanayi bölgesi / il sözlüğüyle koordinata çevrilir.
+
+Her lot/ilan 30 bitlik bir geohash hücresi (`geo_cell`, 6 karakterlik geohash ile aynı,
+~1.2 x 0.6 km) taşır. Geohash'te ortak önek = ortak hücre olduğu için "X km içinde" sorgusu,
+yarıçapı kapsayan birkaç kaba hücrenin tamsayı aralıklarına (indeksli BETWEEN) çevrilir;
+haversine sadece bu aralıklardan dönen adaylara uygulanır. En yakın N sorgusu yarıçapı
+ikiye katlayarak genişler.
+"""
+import math
+import os
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+import models
+
+CELL_BITS = 30 # 6 karakterlik geohash
+MAX_QUERY_CELLS = 16
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+NEAREST_START_KM = 25.0
+NEAREST_MAX_KM = 2000.0 # Türkiye'nin doğu-batı genişliğinden büyük
+
+# Konum metninin aranacağı custom_fields anahtarları (öncelik sırasıyla)
+LOCATION_KEYS = ("location", "konum", "lokasyon", "Konum", "Lokasyon", "Location", "adres", "Adres", "il", "İl", "şehir", "Şehir", "city")
+
+# Karayolu navlunu: ton başı sabit (yükleme/boşaltma) + ton-km ücreti (USD)
+FREIGHT_FIXED_USD_PER_TON = float(os.environ.get("FREIGHT_FIXED_USD_PER_TON", "8"))
+FREIGHT_USD_PER_TON_KM = float(os.environ.get("FREIGHT_USD_PER_TON_KM", "0.06"))
+# Alıcının üstlendiği navlun payı: EXW'de yüklemeyi de alıcı ayarlar, teslimli şartlarda
+# satıcı navlunu fiyata ekler (sigortalı CIF biraz daha pahalı)
+INCOTERM_FREIGHT_FACTOR = {
+    "EXW": 1.10, "FCA": 1.0, "FOB": 1.0, "CPT": 1.0, "CIF": 1.02, "DAP": 1.0, "DDP": 1.0,
+}
+
+# Sanayi bölgeleri (ilçe / OSB) — yaklaşık merkez koordinatları
+DISTRICTS = {
+    # Marmara
+    "gebze": (40.80, 29.43), "dilovasi": (40.78, 29.54), "korfez": (40.77, 29.73), "kartepe": (40.75, 30.03),
+    "cayirova": (40.82, 29.38), "darica": (40.76, 29.38), "izmit": (40.77, 29.92),
+    "tuzla": (40.82, 29.30), "pendik": (40.88, 29.25), "hadimkoy": (41.12, 28.62), "ikitelli": (41.06, 28.80),
+    "esenyurt": (41.03, 28.67), "beylikduzu": (40.98, 28.64), "silivri": (41.07, 28.25), "catalca": (41.14, 28.46),
+    "istanbul avrupa": (41.04, 28.75), "istanbul anadolu": (40.95, 29.20),
+    "cerkezkoy": (41.29, 28.00), "corlu": (41.16, 27.80), "ergene": (41.20, 27.70), "muratli": (41.17, 27.50),
+    "nilufer": (40.21, 28.98), "inegol": (40.08, 29.51), "gemlik": (40.43, 29.15), "mustafakemalpasa": (40.04, 28.41),
+    "hendek": (40.80, 30.75), "arifiye": (40.71, 30.36),
+    # Ege
+    "aliaga": (38.80, 26.97), "kemalpasa": (38.43, 27.42), "torbali": (38.16, 27.36), "cigli": (38.49, 27.07),
+    "izmir serbest bolge": (38.32, 27.15), "gaziemir": (38.32, 27.15), "menemen": (38.61, 27.07),
+    "turgutlu": (38.50, 27.70), "akhisar": (38.92, 27.84), "salihli": (38.48, 28.14),
+    # Akdeniz / Güneydoğu / İç Anadolu
+    "iskenderun": (36.59, 36.17), "ceyhan": (37.03, 35.82), "tarsus": (36.92, 34.89), "dortyol": (36.84, 36.23),
+    "sincan": (39.97, 32.58), "temelli": (39.72, 32.38), "ostim": (39.97, 32.75), "eregli": (41.28, 31.42),
+}
+
+PROVINCES = {
+    "istanbul": (41.01, 28.98), "kocaeli": (40.77, 29.92), "tekirdag": (40.98, 27.51), "izmir": (38.42, 27.14),
+    "manisa": (38.61, 27.43), "bursa": (40.18, 29.06), "ankara": (39.93, 32.86), "konya": (37.87, 32.48),
+    "kayseri": (38.72, 35.49), "gaziantep": (37.07, 37.38), "adana": (37.00, 35.32), "mersin": (36.81, 34.64),
+    "hatay": (36.20, 36.16), "kahramanmaras": (37.58, 36.94), "antalya": (36.89, 30.71), "denizli": (37.78, 29.09),
+    "eskisehir": (39.78, 30.52), "sakarya": (40.78, 30.40), "adapazari": (40.78, 30.40), "duzce": (40.84, 31.16),
+    "bolu": (40.74, 31.61), "balikesir": (39.65, 27.88), "canakkale": (40.15, 26.41), "edirne": (41.68, 26.56),
+    "kirklareli": (41.73, 27.22), "yalova": (40.65, 29.27), "bilecik": (40.14, 29.98), "kutahya": (39.42, 29.98),
+    "usak": (38.68, 29.41), "aydin": (37.85, 27.85), "mugla": (37.22, 28.36), "isparta": (37.76, 30.55),
+    "afyonkarahisar": (38.76, 30.54), "afyon": (38.76, 30.54), "samsun": (41.29, 36.33), "trabzon": (41.00, 39.72),
+    "malatya": (38.35, 38.31), "sanliurfa": (37.16, 38.79), "diyarbakir": (37.91, 40.24), "erzurum": (39.90, 41.27),
+    "sivas": (39.75, 37.02), "corum": (40.55, 34.95), "kirikkale": (39.85, 33.51), "osmaniye": (37.07, 36.25),
+    "zonguldak": (41.45, 31.79), "karaman": (37.18, 33.22), "aksaray": (38.37, 34.03), "nigde": (37.97, 34.68),
+    "nevsehir": (38.62, 34.71), "tokat": (40.31, 36.55), "amasya": (40.65, 35.83), "elazig": (38.67, 39.22),
+    "adiyaman": (37.76, 38.28), "batman": (37.88, 41.13), "mardin": (37.31, 40.74), "ordu": (40.98, 37.88),
+    "giresun": (40.91, 38.39), "rize": (41.02, 40.52), "kastamonu": (41.38, 33.78), "karabuk": (41.20, 32.62),
+    "bartin": (41.63, 32.34), "sinop": (42.03, 35.15), "yozgat": (39.82, 34.81), "kirsehir": (39.15, 34.16),
+    "burdur": (37.72, 30.29), "van": (38.50, 43.38), "kilis": (36.72, 37.12),
+}
+
+_TR_ASCII = str.maketrans("çğıöşüâîûÇĞİÖŞÜÂÎÛ", "cgiosuaiuCGIOSUAIU")
+
+
+def normalize(text: str) -> str:
+    text = text.translate(_TR_ASCII)
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    text = re.sub(r"\b(osb|organize sanayi bolgesi|organize sanayi|ili|ilcesi|merkez|turkiye|turkey)\b", " ", text)
+    return re.sub(r"[^a-z ]+", " ", re.sub(r"\s+", " ", text)).strip()
+
+
+def lookup(text: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Serbest konum metnini koordinata çevirir; ilçe/OSB eşleşmesi ile eşleşmesinden önce gelir."""
+    if not text:
+        return None
+    whole = normalize(str(text))
+    words = whole.split()
+    # Tam metin, ayraçlı parçalar ("Gebze / Kocaeli"), sonra ayraçsız yazımlar için kelime ikilileri ve kelimeler
+    candidates = [whole] + [normalize(p) for p in re.split(r"[/,\-|()]", str(text))]
+    candidates += [" ".join(words[i:i + 2]) for i in range(len(words) - 1)] + words
+    for table in (DISTRICTS, PROVINCES):
+        for candidate in candidates:
+            if candidate in table:
+                return table[candidate]
+    return None
+
+
+def location_text(custom_fields: Optional[dict]) -> Optional[str]:
+    for key in LOCATION_KEYS:
+        value = (custom_fields or {}).get(key)
+        if value:
+            return str(value)
+    return None
+
+
+# --- Geohash hücreleri (tamsayı) ---
+def _split_bits(bits: int) -> Tuple[int, int]:
+    # Geohash boylamla başlar: boylam biti sayısı >= enlem biti sayısı
+    return (bits + 1) // 2, bits // 2
+
+
+def _interleave(lon_index: int, lat_index: int, bits: int) -> int:
+    lon_bits, lat_bits = _split_bits(bits)
+    cell = 0
+    for i in range(bits):
+        if i % 2 == 0:
+            bit = (lon_index >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (lat_index >> (lat_bits - 1 - i // 2)) & 1
+        cell = (cell << 1) | bit
+    return cell
+
+
+def _indices(lat: float, lon: float, bits: int) -> Tuple[int, int]:
+    lon_bits, lat_bits = _split_bits(bits)
+    lon_index = min(int((lon + 180.0) / 360.0 * (1 << lon_bits)), (1 << lon_bits) - 1)
+    lat_index = min(int((lat + 90.0) / 180.0 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    return lon_index, lat_index
+
+
+def encode(lat: float, lon: float, bits: int = CELL_BITS) -> int:
+    return _interleave(*_indices(lat, lon, bits), bits)
+
+
+def cell_ranges(lat: float, lon: float, radius_km: float) -> List[Tuple[int, int]]:
+    """Yarıçapı kapsayan [başlangıç, bitiş) geo_cell aralıkları — en fazla MAX_QUERY_CELLS hücre."""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    west, east = max(lon - dlon, -180.0), min(lon + dlon, 180.0)
+
+    for bits in range(CELL_BITS, 0, -1):
+        west_i, south_i = _indices(south, west, bits)
+        east_i, north_i = _indices(north, east, bits)
+        if (east_i - west_i + 1) * (north_i - south_i + 1) <= MAX_QUERY_CELLS:
+            break
+    shift = CELL_BITS - bits
+    cells = sorted(
+        _interleave(x, y, bits) for x in range(west_i, east_i + 1) for y in range(south_i, north_i + 1)
+    )
+    # Ardışık hücreleri tek aralıkta birleştir
+    ranges = []
+    for cell in cells:
+        start, end = cell << shift, (cell + 1) << shift
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+# --- Model alanları ---
+def apply(target, lat: Optional[float] = None, lon: Optional[float] = None):
+    """Lot/ilan nesnesine ya da import satırı dict'ine latitude/longitude/geo_cell yazar.
+    Koordinat verilmezse custom_fields'taki konum metninden çözülür."""
+    get = target.get if isinstance(target, dict) else lambda key: getattr(target, key, None)
+    if lat is None or lon is None:
+        lat, lon = get("latitude"), get("longitude")
+    if lat is None or lon is None:
+        found = lookup(location_text(get("custom_fields")))
+        lat, lon = found if found else (None, None)
+    values = {
+        "latitude": lat, "longitude": lon,
+        "geo_cell": encode(lat, lon) if lat is not None and lon is not None else None,
+    }
+    if isinstance(target, dict):
+        target.update(values)
+    else:
+        for key, value in values.items():
+            setattr(target, key, value)
+    return target
+
+
+def origin(lat: Optional[float] = None, lon: Optional[float] = None, near: Optional[str] = None) -> Optional[Tuple[float, float]]:
+    """Sorgu parametrelerinden arama merkezi; yer adı sözlükte yoksa ValueError."""
+    if lat is not None and lon is not None:
+        return lat, lon
+    if near:
+        found = lookup(near)
+        if found is None:
+            raise ValueError(near)
+        return found
+    return None
+
+
+def freight_per_ton(distance_km: Optional[float], incoterm: Optional[str] = "EXW") -> float:
+    if distance_km is None:
+        return 0.0
+    factor = INCOTERM_FREIGHT_FACTOR.get((incoterm or "EXW").upper(), 1.0)
+    return (FREIGHT_FIXED_USD_PER_TON + FREIGHT_USD_PER_TON_KM * distance_km) * factor
+
+
+# --- Sorgular ---
+def _within(db: Session, lat: float, lon: float, radius_km: float, material_type: Optional[str]):
+    lot = models.GuaranteedLot
+    ranges = cell_ranges(lat, lon, radius_km)
+    query = db.query(lot.id, lot.latitude, lot.longitude).filter(
+        lot.is_active == True,
+        or_(*(and_(lot.geo_cell >= start, lot.geo_cell < end) for start, end in ranges)),
+    )
+    if material_type:
+        query = query.filter(lot.material_type == material_type)
+    found = []
+    for lot_id, lot_lat, lot_lon in query:
+        distance = haversine_km(lat, lon, lot_lat, lot_lon)
+        if distance <= radius_km:
+            found.append((distance, lot_id))
+    found.sort()
+    return found
+
+
+def _load(db: Session, found: list) -> list:
+    lots = {lot.id: lot for lot in db.query(models.GuaranteedLot).filter(models.GuaranteedLot.id.in_([i for _, i in found]))}
+    result = []
+    for distance, lot_id in found:
+        lot = lots[lot_id]
+        lot.distance_km = round(distance, 1)
+        result.append(lot)
+    return result
+
+
+def within(db: Session, lat: float, lon: float, radius_km: float, material_type: Optional[str] = None, limit: int = 100) -> list:
+    return _load(db, _within(db, lat, lon, radius_km, material_type)[:limit])
+
+
+def nearest(db: Session, lat: float, lon: float, n: int = 10, material_type: Optional[str] = None) -> list:
+    radius = NEAREST_START_KM
+    while True:
+        found = _within(db, lat, lon, radius, material_type)
+        # Yarıçap içindeki n lot, dışarıdaki her lottan yakındır
+        if len(found) >= n or radius >= NEAREST_MAX_KM:
+            return _load(db, found[:n])
+        radius *= 2
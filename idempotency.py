@@ -0,0 +1,224 @@
+"""Idempotency-Key support for retried POSTs (checkout, offer creation).
+
+Kullanım (handler içinde):
+
+    with idempotency.guard(db, idempotency_key, scope, payload) as guard:
+        if guard.replay is not None:
+            return guard.replay
+        ...  # asıl iş
+        db.flush()
+        guard.store(response_dict)  # handler ile aynı transaction
+        db.commit()
+
+İlk istek anahtarı `in_progress` olarak ayrı bir transaction'da kısa bir kiralama (lease)
+ile sahiplenir; aynı anda gelen kopyalar orijinalin bitmesini bekler ve saklanan yanıtı alır.
+Handler hata verirse anahtar bırakılır; süreç çökerse kiralama dolunca bir tekrar deneme
+anahtarı devralır. Kiralamasını kaybeden orijinal istek yanıtı saklayamaz ve 409 ile geri
+alınır, iş iki kez yapılmaz. Tamamlanan yanıtlar TTL_SECONDS boyunca tekrar oynatılır.
+Kapsam (scope) istemciyi içermeli ki farklı istemcilerin aynı anahtarı çakışmasın
+(bkz. `client_id`). Süresi dolanları temizlemek için:
+
+    python idempotency.py purge
+"""
+import datetime
+import hashlib
+import json
+import sys
+import time
+from contextlib import contextmanager
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from auth import token_subject
+from database import SessionLocal
+import models
+import jobs
+
+TTL_SECONDS = 24 * 60 * 60
+# Devam eden isteğin anahtarı tutma süresi; bu süre içinde yanıtı saklamazsa devralınabilir
+IN_PROGRESS_LEASE_SECONDS = 30.0
+# Devam eden orijinal isteği bekleme süresi ve yoklama aralığı
+WAIT_TIMEOUT_SECONDS = 15.0
+POLL_INTERVAL_SECONDS = 0.05
+MAX_KEY_LENGTH = 255
+PURGE_BATCH_SIZE = 1000
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _naive(value: datetime.datetime) -> datetime.datetime:
+    # SQLite'tan gelen değerler tz bilgisi taşımaz
+    return value.replace(tzinfo=None) if value.tzinfo else value
+
+
+def client_id(request) -> str:
+    """Kapsam için istemci kimliği: geçerli Bearer token'ın sahibi, yoksa IP."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    subject = token_subject(token) if scheme.lower() == "bearer" and token else None
+    if subject:
+        return f"user:{subject}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def request_hash(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyGuard:
+    def __init__(self, db: Session, record_id: Optional[int] = None, replay: Optional[JSONResponse] = None):
+        self.db = db
+        self.record_id = record_id
+        self.replay = replay
+        self.stored = False
+
+    def store(self, body, status_code: int = 200):
+        """Yanıtı handler'ın transaction'ına yazar; commit ile birlikte kalıcı olur."""
+        if self.record_id is None:
+            return
+        result = self.db.execute(
+            update(models.IdempotencyRecord)
+            .where(models.IdempotencyRecord.id == self.record_id, models.IdempotencyRecord.status == "in_progress")
+            .values(status="completed", response_code=status_code,
+                    response_body=json.dumps(body, default=str, ensure_ascii=False),
+                    expires_at=_now() + datetime.timedelta(seconds=TTL_SECONDS))
+        )
+        if result.rowcount != 1:
+            # Kiralama doldu ve anahtarı bir tekrar deneme devraldı; bu istek geri alınır
+            raise HTTPException(status_code=409, detail="Idempotency-Key kiralaması doldu, lütfen tekrar deneyin.")
+        self.stored = True
+
+
+def _replay(record: models.IdempotencyRecord) -> JSONResponse:
+    return JSONResponse(
+        status_code=record.response_code or 200,
+        content=json.loads(record.response_body) if record.response_body else None,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def _try_claim(scope: str, key: str, digest: str) -> Optional[int]:
+    """Anahtarı sahiplenir ve kayıt id'sini döndürür; başka istek sahipse None."""
+    session = SessionLocal()
+    try:
+        record = models.IdempotencyRecord(
+            scope=scope, key=key, request_hash=digest, status="in_progress",
+            expires_at=_now() + datetime.timedelta(seconds=IN_PROGRESS_LEASE_SECONDS),
+        )
+        session.add(record)
+        session.commit()
+        return record.id
+    except IntegrityError:
+        session.rollback()
+        return None
+    finally:
+        session.close()
+
+
+def _wait_for_existing(scope: str, key: str, digest: str) -> Optional[JSONResponse]:
+    """Mevcut kaydın yanıtını döndürür; kayıt kaybolduysa (orijinal başarısız/süresi dolmuş) None."""
+    deadline = time.monotonic() + WAIT_TIMEOUT_SECONDS
+    delay = POLL_INTERVAL_SECONDS
+    while True:
+        session = SessionLocal()
+        try:
+            record = session.query(models.IdempotencyRecord).filter(
+                models.IdempotencyRecord.scope == scope,
+                models.IdempotencyRecord.key == key,
+            ).first()
+            if record is None:
+                return None
+            if _naive(record.expires_at) < _naive(_now()):
+                # Süresi dolmuş yanıt ya da kiralaması dolmuş (çökmüş) istek: tek bir bekleyen siler
+                session.execute(delete(models.IdempotencyRecord).where(
+                    models.IdempotencyRecord.id == record.id,
+                    models.IdempotencyRecord.expires_at < _now(),
+                ).execution_options(synchronize_session=False))
+                session.commit()
+                return None
+            if record.request_hash != digest:
+                raise HTTPException(status_code=422, detail="Bu Idempotency-Key farklı bir istek gövdesiyle kullanılmış.")
+            if record.status == "completed":
+                return _replay(record)
+        finally:
+            session.close()
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=409, detail="Aynı Idempotency-Key ile istek hâlâ işleniyor, lütfen tekrar deneyin.")
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def _release(record_id: int):
+    session = SessionLocal()
+    try:
+        session.execute(delete(models.IdempotencyRecord).where(
+            models.IdempotencyRecord.id == record_id,
+            models.IdempotencyRecord.status == "in_progress",
+        ))
+        session.commit()
+    finally:
+        session.close()
+
+
+@contextmanager
+def guard(db: Session, key: Optional[str], scope: str, payload):
+    if not key:
+        yield IdempotencyGuard(db)
+        return
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key çok uzun.")
+
+    digest = request_hash(payload)
+    while True:
+        record_id = _try_claim(scope, key, digest)
+        if record_id is not None:
+            break
+        replay = _wait_for_existing(scope, key, digest)
+        if replay is not None:
+            yield IdempotencyGuard(db, replay=replay)
+            return
+
+    current = IdempotencyGuard(db, record_id=record_id)
+    try:
+        yield current
+    except BaseException:
+        db.rollback()
+        _release(record_id)
+        raise
+    if not current.stored:
+        # Handler yanıtı saklamadan döndü; anahtarı tekrar denemeye açık bırak
+        _release(record_id)
+
+
+def purge_expired(db: Session, batch_size: int = PURGE_BATCH_SIZE) -> int:
+    """Süresi dolmuş kayıtları küçük partiler halinde siler."""
+    removed = 0
+    while True:
+        ids = [row.id for row in db.query(models.IdempotencyRecord.id).filter(
+            models.IdempotencyRecord.expires_at < _now()
+        ).limit(batch_size)]
+        if not ids:
+            return removed
+        db.execute(delete(models.IdempotencyRecord).where(models.IdempotencyRecord.id.in_(ids)))
+        db.commit()
+        removed += len(ids)
+
+
+@jobs.handler("idempotency.purge")
+def _purge_job(db: Session, payload: dict):
+    purge_expired(db)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "purge":
+        print("Kullanım: python idempotency.py purge")
+        sys.exit(2)
+    db = SessionLocal()
+    try:
+        print(f"{purge_expired(db)} süresi dolmuş idempotency kaydı silindi.")
+    finally:
+        db.close()
@@ -0,0 +1,280 @@
+"""Durable DB-backed background job queue for post-commit side effects.
+
+İşler `enqueue` ile isteğin kendi transaction'ına eklenir; yazma commit edilmezse iş de
+oluşmaz. Worker'lar işleri öncelik ve `run_at` sırasıyla alır (Postgres'te
+`FOR UPDATE SKIP LOCKED`, SQLite'ta koşullu UPDATE), hata alan işler üstel geri
+çekilmeyle tekrar denenir, deneme hakkı biten işler `dead` olarak kalır.
+
+    python jobs.py work --threads 4 [--processes 2]
+    python jobs.py dead             # dead-letter listesi
+    python jobs.py retry 42         # dead işi tekrar kuyruğa al
+"""
+import argparse
+import datetime
+import importlib
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from typing import Optional
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+from database import SessionLocal, init_db
+import models
+
+DEFAULT_PRIORITY = 100
+DEFAULT_MAX_ATTEMPTS = 5
+# Worker çökerse iş bu süre sonunda başka worker'a geçer
+LEASE_SECONDS = 5 * 60
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 60 * 60
+POLL_INTERVAL_SECONDS = 1.0
+
+# Handler'larını `@jobs.handler` ile kaydeden modüller; worker başlarken import edilir
+HANDLER_MODULES = ["price_history", "idempotency", "price_model", "archive", "catalog_snapshot"]
+# Worker'ın kendisinin periyodik olarak kuyruğa koyduğu işler: tür -> saniye
+PERIODIC_JOBS = {
+    "price_history.compact": 60,
+    "idempotency.purge": 60 * 60,
+    "price_model.refresh": 6 * 60 * 60,
+    "archive.run": 24 * 60 * 60,
+    "catalog_snapshot.export": 5 * 60, # Sürüm değişmediyse yazmadan döner
+}
+
+HANDLERS = {}
+
+
+def handler(kind: str):
+    """`fn(db, payload)` imzalı fonksiyonu iş türü için kaydeder."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def enqueue(db: Session, kind: str, payload: Optional[dict] = None, priority: int = DEFAULT_PRIORITY,
+            delay_seconds: float = 0, max_attempts: int = DEFAULT_MAX_ATTEMPTS, unique: bool = False):
+    """İşi çağıranın transaction'ına ekler (commit etmez). unique=True ise aynı türden
+    bekleyen iş varsa yenisi eklenmez — tekrarlanan sıkıştırma/yenileme işleri için."""
+    if unique:
+        pending = db.query(models.Job.id).filter(
+            models.Job.status == "queued", models.Job.kind == kind
+        ).first()
+        if pending:
+            return None
+    job = models.Job(
+        kind=kind, payload=payload or {}, priority=priority, status="queued",
+        attempts=0, max_attempts=max_attempts,
+        run_at=_now() + datetime.timedelta(seconds=delay_seconds),
+    )
+    db.add(job)
+    return job
+
+
+def backoff_seconds(attempts: int) -> float:
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _claimable(now: datetime.datetime):
+    job = models.Job
+    return or_(
+        (job.status == "queued") & (job.run_at <= now),
+        # Kirası dolmuş (çöken worker'dan kalan) işler
+        (job.status == "running") & (job.locked_until < now),
+    )
+
+
+def claim(db: Session, worker_id: str, limit: int = 1) -> list:
+    """Çalıştırılabilir işleri bu worker adına kilitler ve commit eder; id listesi döndürür."""
+    now = _now()
+    job = models.Job
+    values = {
+        "status": "running",
+        "locked_by": worker_id,
+        "locked_until": now + datetime.timedelta(seconds=LEASE_SECONDS),
+        "attempts": job.attempts + 1,
+    }
+    base = select(job.id).where(_claimable(now)).order_by(job.priority, job.run_at, job.id)
+    if db.get_bind().dialect.name == "postgresql":
+        ids = list(db.execute(base.limit(limit).with_for_update(skip_locked=True)).scalars())
+        if ids:
+            db.execute(update(job).where(job.id.in_(ids)).values(**values))
+    else:
+        ids = []
+        for candidate in db.execute(base.limit(limit * 4)).scalars().all():
+            result = db.execute(update(job).where(job.id == candidate, _claimable(now)).values(**values))
+            if result.rowcount == 1:
+                ids.append(candidate)
+                if len(ids) >= limit:
+                    break
+    db.commit()
+    return ids
+
+
+def _finish(job_id: int, worker_id: str, **values):
+    session = SessionLocal()
+    try:
+        session.execute(
+            update(models.Job)
+            .where(models.Job.id == job_id, models.Job.locked_by == worker_id, models.Job.status == "running")
+            .values(locked_by=None, locked_until=None, **values)
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def run_job(job_id: int, worker_id: str) -> bool:
+    """İşi kendi session'ında çalıştırır; başarıda True."""
+    db = SessionLocal()
+    try:
+        job = db.get(models.Job, job_id)
+        fn = HANDLERS.get(job.kind)
+        if fn is None:
+            raise LookupError(f"Kayıtlı handler yok: {job.kind}")
+        fn(db, job.payload or {})
+        db.commit()
+    except Exception:
+        db.rollback()
+        error = traceback.format_exc()
+        job = db.get(models.Job, job_id)
+        attempts, max_attempts = job.attempts, job.max_attempts
+        db.close()
+        if attempts >= max_attempts:
+            _finish(job_id, worker_id, status="dead", last_error=error, finished_at=_now())
+        else:
+            run_at = _now() + datetime.timedelta(seconds=backoff_seconds(attempts))
+            _finish(job_id, worker_id, status="queued", last_error=error, run_at=run_at)
+        return False
+    db.close()
+    _finish(job_id, worker_id, status="done", finished_at=_now())
+    return True
+
+
+def _schedule_periodic(last_run: dict):
+    now = time.monotonic()
+    due = [kind for kind, every in PERIODIC_JOBS.items() if now - last_run.get(kind, 0) >= every]
+    if not due:
+        return
+    db = SessionLocal()
+    try:
+        for kind in due:
+            enqueue(db, kind, priority=DEFAULT_PRIORITY + 100, unique=True)
+            last_run[kind] = now
+        db.commit()
+    finally:
+        db.close()
+
+
+def _worker_loop(worker_id: str, stop: threading.Event):
+    while not stop.is_set():
+        db = SessionLocal()
+        try:
+            ids = claim(db, worker_id)
+        except Exception as e:
+            print(f"[{worker_id}] claim error: {e}")
+            ids = []
+        finally:
+            db.close()
+        if not ids:
+            stop.wait(POLL_INTERVAL_SECONDS)
+            continue
+        for job_id in ids:
+            ok = run_job(job_id, worker_id)
+            print(f"[{worker_id}] job #{job_id} {'done' if ok else 'failed'}")
+
+
+def load_handlers():
+    for module_name in HANDLER_MODULES:
+        importlib.import_module(module_name)
+
+
+def run_workers(threads: int = 4, periodic: bool = True):
+    init_db()
+    load_handlers()
+    stop = threading.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    pool = [
+        threading.Thread(target=_worker_loop, args=(f"{prefix}:{i}", stop), daemon=True)
+        for i in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    last_run = {}
+    try:
+        while True:
+            if periodic:
+                try:
+                    _schedule_periodic(last_run)
+                except Exception as e:
+                    print(f"periodic scheduling error: {e}")
+            time.sleep(POLL_INTERVAL_SECONDS)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in pool:
+            thread.join()
+
+
+def _retry_dead(job_id: int):
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(models.Job).where(models.Job.id == job_id, models.Job.status == "dead")
+            .values(status="queued", attempts=0, run_at=_now(), finished_at=None)
+        )
+        db.commit()
+        print("Tekrar kuyruğa alındı." if result.rowcount else "Dead durumda böyle bir iş yok.")
+    finally:
+        db.close()
+
+
+def _list_dead():
+    db = SessionLocal()
+    try:
+        for job in db.query(models.Job).filter(models.Job.status == "dead").order_by(models.Job.id):
+            last_line = (job.last_error or "").strip().splitlines()[-1:] or [""]
+            print(f"#{job.id} {job.kind} attempts={job.attempts} {last_line[0]}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # Handler'lar `jobs` modülüne kayıt olur; __main__ kopyası yerine onu kullan
+    from jobs import run_workers, _list_dead, _retry_dead
+
+    parser = argparse.ArgumentParser(description="EcoGrade arka plan iş kuyruğu")
+    sub = parser.add_subparsers(dest="command", required=True)
+    work = sub.add_parser("work")
+    work.add_argument("--threads", type=int, default=4)
+    work.add_argument("--processes", type=int, default=1)
+    work.add_argument("--no-periodic", action="store_true")
+    sub.add_parser("dead")
+    retry = sub.add_parser("retry")
+    retry.add_argument("job_id", type=int)
+    args = parser.parse_args()
+
+    if args.command == "work":
+        if args.processes > 1:
+            # Periyodik işleri tek süreç planlar; unique=True olduğu için çakışma zararsızdır
+            procs = [
+                multiprocessing.Process(target=run_workers, args=(args.threads, i == 0 and not args.no_periodic))
+                for i in range(args.processes)
+            ]
+            for proc in procs:
+                proc.start()
+            for proc in procs:
+                proc.join()
+        else:
+            run_workers(args.threads, not args.no_periodic)
+    elif args.command == "dead":
+        _list_dead()
+    elif args.command == "retry":
+        _retry_dead(args.job_id)
@@ -0,0 +1,171 @@
+"""Streaming escrow ledger export (orders + lot + buyer/seller + payment status).
+
+Satırlar sunucu taraflı cursor ile sabit boyutlu parçalar halinde okunur ve hemen
+yazılır; bellek kullanımı satır sayısından bağımsızdır. Çıktı order id sırasındadır,
+yarıda kalan bir export son yazılan id ile `after_id` verilerek devam ettirilir.
+
+    python ledger_export.py --format csv --start 2026-09-01 --end 2026-10-01 --out eylul.csv
+    python ledger_export.py --format ndjson --status Escrow_Funded --after-id 120345
+"""
+import argparse
+import csv
+import datetime
+import io
+import json
+import sys
+from typing import Iterator, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased
+import models
+import archive
+
+FORMATS = ("csv", "ndjson")
+CHUNK_SIZE = 1000
+
+COLUMNS = [
+    "order_id", "created_at", "payment_status", "incoterms",
+    "quantity_tons", "unit_price_usd", "total_amount_usd",
+    "lot_id", "material_type", "material_form", "carbon_score",
+    "buyer_id", "buyer_company", "buyer_email",
+    "seller_id", "seller_company",
+]
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def _statement(start: Optional[datetime.datetime], end: Optional[datetime.datetime],
+               payment_status: Optional[str], after_id: int, include_archived: bool = False):
+    order = archive.orders_source(include_archived).c
+    lot = archive.lots_source(include_archived).c
+    buyer = aliased(models.User)
+    seller = aliased(models.User)
+    stmt = (
+        select(
+            order.id, order.created_at, order.payment_status, order.incoterms,
+            order.quantity_tons, order.total_amount_usd,
+            lot.id, lot.material_type, lot.material_form, lot.carbon_score,
+            buyer.id, buyer.company_name, buyer.email,
+            seller.id, seller.company_name,
+        )
+        .select_from(order.id.table)
+        .outerjoin(lot.id.table, lot.id == order.lot_id)
+        .outerjoin(models.Offer, models.Offer.id == lot.original_offer_id)
+        .outerjoin(seller, seller.id == models.Offer.seller_id)
+        .outerjoin(buyer, buyer.id == order.buyer_id)
+        .where(order.id > after_id)
+        .order_by(order.id)
+    )
+    if start is not None:
+        stmt = stmt.where(order.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(order.created_at < end)
+    if payment_status:
+        stmt = stmt.where(order.payment_status == payment_status)
+    return stmt
+
+
+def iter_chunks(db: Session, start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+                payment_status: Optional[str] = None, after_id: int = 0,
+                chunk_size: int = CHUNK_SIZE, include_archived: bool = False) -> Iterator[list]:
+    """Ledger satırlarını en fazla chunk_size elemanlı dict listeleri olarak üretir."""
+    result = db.execute(
+        _statement(start, end, payment_status, after_id, include_archived),
+        execution_options={"stream_results": True, "yield_per": chunk_size},
+    )
+    try:
+        for partition in result.partitions(chunk_size):
+            rows = []
+            for (order_id, created_at, payment_status_, incoterms, quantity, total,
+                 lot_id, material_type, material_form, carbon_score,
+                 buyer_id, buyer_company, buyer_email, seller_id, seller_company) in partition:
+                rows.append({
+                    "order_id": order_id,
+                    "created_at": created_at.isoformat() if created_at else None,
+                    "payment_status": payment_status_,
+                    "incoterms": incoterms,
+                    "quantity_tons": quantity,
+                    "unit_price_usd": round(total / quantity, 2) if quantity else None,
+                    "total_amount_usd": total,
+                    "lot_id": lot_id,
+                    "material_type": material_type,
+                    "material_form": material_form,
+                    "carbon_score": carbon_score,
+                    "buyer_id": buyer_id,
+                    "buyer_company": buyer_company,
+                    "buyer_email": buyer_email,
+                    "seller_id": seller_id,
+                    "seller_company": seller_company,
+                })
+            yield rows
+    finally:
+        result.close()
+
+
+def encode_chunks(chunks: Iterator[list], fmt: str, header: bool = True) -> Iterator[str]:
+    """Parçaları CSV veya NDJSON metin bloklarına çevirir (her parça tek blok)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Bilinmeyen format: {fmt}")
+    if fmt == "csv" and header:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(COLUMNS)
+        yield buffer.getvalue()
+    for rows in chunks:
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow([row[c] for c in COLUMNS])
+            yield buffer.getvalue()
+        else:
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+
+def stream(db: Session, fmt: str, **filters) -> Iterator[str]:
+    """HTTP yanıtı için üretici; session'ı çağıran açar ve kapatır (endpoint'te get_read_db)."""
+    header = not filters.get("after_id")
+    yield from encode_chunks(iter_chunks(db, **filters), fmt, header=header)
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime.datetime]:
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Escrow ledger export (CSV/NDJSON)")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--start", help="Dahil başlangıç (ISO tarih)")
+    parser.add_argument("--end", help="Hariç bitiş (ISO tarih)")
+    parser.add_argument("--status", help="payment_status filtresi")
+    parser.add_argument("--after-id", type=int, default=0, help="Bu order id'den sonrasını export et (devam)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--include-archived", action="store_true", help="Arşive taşınmış siparişleri de dahil et")
+    parser.add_argument("--out", help="Çıktı dosyası (varsayılan stdout)")
+    args = parser.parse_args()
+
+    out = open(args.out, "a" if args.after_id else "w", encoding="utf-8", newline="") if args.out else sys.stdout
+    db = SessionLocal()
+    exported, last_id = 0, args.after_id
+    try:
+        chunks = iter_chunks(
+            db, start=_parse_date(args.start), end=_parse_date(args.end),
+            payment_status=args.status, after_id=args.after_id, chunk_size=args.chunk_size,
+            include_archived=args.include_archived,
+        )
+
+        def tracked():
+            global exported, last_id
+            for rows in chunks:
+                exported += len(rows)
+                yield rows
+                last_id = rows[-1]["order_id"]
+
+        for block in encode_chunks(tracked(), args.format, header=not args.after_id):
+            out.write(block)
+            out.flush()
+    finally:
+        db.close()
+        if out is not sys.stdout:
+            out.close()
+        print(f"{exported} sipariş export edildi, son order id: {last_id} (devam için --after-id {last_id})", file=sys.stderr)
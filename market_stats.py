@@ -0,0 +1,267 @@
+"""Incrementally maintained market statistics per material type.
+
+Lot ve sipariş yazan endpoint'ler commit öncesinde buradaki delta fonksiyonlarını
+çağırır; `market_stats` tablosu böylece ham tabloları taramadan okunabilir kalır.
+Sapma kontrolü ve tam yeniden hesaplama için:
+
+    python market_stats.py verify
+    python market_stats.py rebuild
+"""
+import datetime
+import sys
+from collections import namedtuple
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import models
+import archive
+from database import dialect_insert
+
+# Bir lotun istatistiklere katkısı; aktif olmayan lotlar katkı yapmaz (None)
+LotState = namedtuple("LotState", ["material_type", "price", "tons", "grade"])
+
+# Kayan nokta toplamlarında kabul edilen sapma
+DRIFT_TOLERANCE = 1e-6
+
+
+def lot_state(lot) -> Optional[LotState]:
+    if lot is None or not lot.is_active:
+        return None
+    return LotState(
+        material_type=lot.material_type,
+        price=lot.selling_price_usd or 0.0,
+        tons=lot.quantity_tons or 0.0,
+        grade=lot.carbon_score,
+    )
+
+
+def _get_stat(db: Session, material_type: str) -> models.MarketStat:
+    query = db.query(models.MarketStat).filter(models.MarketStat.material_type == material_type).with_for_update()
+    stat = query.first()
+    if stat is None:
+        # FOR UPDATE olmayan satırı kilitlemez: eşzamanlı ilk yazımlar aynı satırı eklemeye çalışır,
+        # çakışan taraf hata almadan mevcut satırı kilitleyip kullanır
+        table = models.MarketStat.__table__
+        db.execute(dialect_insert(db)(table).values(
+            material_type=material_type,
+            active_lot_count=0, available_tons=0.0, price_sum=0.0, price_tons_sum=0.0,
+            grade_mix={}, order_count=0, sold_tons=0.0, sold_amount_usd=0.0,
+        ).on_conflict_do_nothing(index_elements=["material_type"]))
+        stat = query.one()
+    return stat
+
+
+def lock(db: Session, material_types):
+    """Birden fazla malzemeye yazacak transaction'lar satırları önceden, sabit (sıralı) düzende
+    kilitler; farklı sırada kilitleyen iki çoklu alım birbirini beklemez (deadlock)."""
+    for material_type in sorted(set(material_types), key=str):
+        _get_stat(db, material_type)
+
+
+def _touch(stat: models.MarketStat):
+    stat.updated_at = datetime.datetime.now(datetime.timezone.utc)
+
+
+def _recompute_bounds(db: Session, stat: models.MarketStat):
+    """Silinen değer min/max ise sadece o malzemenin aktif lotlarından sınırları yeniden bul."""
+    db.flush()
+    low, high = db.query(
+        func.min(models.GuaranteedLot.selling_price_usd),
+        func.max(models.GuaranteedLot.selling_price_usd),
+    ).filter(
+        models.GuaranteedLot.material_type == stat.material_type,
+        models.GuaranteedLot.is_active == True,
+    ).one()
+    stat.min_price_usd = low
+    stat.max_price_usd = high
+
+
+def _apply(db: Session, state: LotState, sign: int) -> bool:
+    stat = _get_stat(db, state.material_type)
+    stat.active_lot_count = (stat.active_lot_count or 0) + sign
+    stat.available_tons = (stat.available_tons or 0.0) + sign * state.tons
+    stat.price_sum = (stat.price_sum or 0.0) + sign * state.price
+    stat.price_tons_sum = (stat.price_tons_sum or 0.0) + sign * state.price * state.tons
+
+    # JSON kolonunun değişikliği algılanması için yeni dict atanır
+    mix = dict(stat.grade_mix or {})
+    if state.grade:
+        mix[state.grade] = mix.get(state.grade, 0) + sign
+        if mix[state.grade] <= 0:
+            del mix[state.grade]
+    stat.grade_mix = mix
+
+    needs_bounds = False
+    if stat.active_lot_count <= 0:
+        # Kalan kayan nokta artığını sıfırla
+        stat.active_lot_count = 0
+        stat.available_tons = 0.0
+        stat.price_sum = 0.0
+        stat.price_tons_sum = 0.0
+        stat.min_price_usd = None
+        stat.max_price_usd = None
+    elif sign > 0:
+        if stat.min_price_usd is None or state.price < stat.min_price_usd:
+            stat.min_price_usd = state.price
+        if stat.max_price_usd is None or state.price > stat.max_price_usd:
+            stat.max_price_usd = state.price
+    elif state.price <= (stat.min_price_usd or 0.0) or state.price >= (stat.max_price_usd or 0.0):
+        needs_bounds = True
+
+    _touch(stat)
+    return needs_bounds
+
+
+def apply_lot_change(db: Session, before: Optional[LotState], after: Optional[LotState]):
+    """Bir lotun önceki ve sonraki durumu arasındaki farkı istatistiklere yansıtır (commit etmez)."""
+    if before == after:
+        return
+    recompute = set()
+    if before is not None and _apply(db, before, -1):
+        recompute.add(before.material_type)
+    if after is not None:
+        _apply(db, after, +1)
+    for material_type in recompute:
+        _recompute_bounds(db, _get_stat(db, material_type))
+
+
+def record_fill(db: Session, material_type: str, quantity_tons: float, amount_usd: float):
+    """Checkout ile gerçekleşen satışı istatistiklere ekler (commit etmez)."""
+    stat = _get_stat(db, material_type)
+    stat.order_count = (stat.order_count or 0) + 1
+    stat.sold_tons = (stat.sold_tons or 0.0) + quantity_tons
+    stat.sold_amount_usd = (stat.sold_amount_usd or 0.0) + amount_usd
+    _touch(stat)
+
+
+def to_dict(stat: models.MarketStat) -> dict:
+    count = stat.active_lot_count or 0
+    tons = stat.available_tons or 0.0
+    return {
+        "material_type": stat.material_type,
+        "active_lot_count": count,
+        "available_tons": round(tons, 3),
+        "avg_price_usd": round(stat.price_sum / count, 2) if count else None,
+        "weighted_avg_price_usd": round(stat.price_tons_sum / tons, 2) if tons > 0 else None,
+        "min_price_usd": stat.min_price_usd,
+        "max_price_usd": stat.max_price_usd,
+        "grade_mix": stat.grade_mix or {},
+        "order_count": stat.order_count or 0,
+        "sold_tons": round(stat.sold_tons or 0.0, 3),
+        "sold_amount_usd": round(stat.sold_amount_usd or 0.0, 2),
+        "updated_at": stat.updated_at,
+    }
+
+
+def _compute(db: Session) -> dict:
+    """Ham tablolardan tam hesaplama — sadece rebuild/verify için kullanılır."""
+    lot = models.GuaranteedLot
+    result = {}
+
+    def empty():
+        return {
+            "active_lot_count": 0, "available_tons": 0.0, "price_sum": 0.0, "price_tons_sum": 0.0,
+            "min_price_usd": None, "max_price_usd": None, "grade_mix": {},
+            "order_count": 0, "sold_tons": 0.0, "sold_amount_usd": 0.0,
+        }
+
+    rows = db.query(
+        lot.material_type,
+        func.count(lot.id),
+        func.sum(func.coalesce(lot.quantity_tons, 0.0)),
+        func.sum(func.coalesce(lot.selling_price_usd, 0.0)),
+        func.sum(func.coalesce(lot.selling_price_usd, 0.0) * func.coalesce(lot.quantity_tons, 0.0)),
+        func.min(lot.selling_price_usd),
+        func.max(lot.selling_price_usd),
+    ).filter(lot.is_active == True).group_by(lot.material_type)
+    for material_type, count, tons, price_sum, price_tons_sum, low, high in rows:
+        result[material_type] = dict(
+            empty(),
+            active_lot_count=count, available_tons=tons or 0.0, price_sum=price_sum or 0.0,
+            price_tons_sum=price_tons_sum or 0.0, min_price_usd=low, max_price_usd=high,
+        )
+
+    grades = db.query(lot.material_type, lot.carbon_score, func.count(lot.id)).filter(
+        lot.is_active == True, lot.carbon_score.isnot(None)
+    ).group_by(lot.material_type, lot.carbon_score)
+    for material_type, grade, count in grades:
+        result.setdefault(material_type, empty())["grade_mix"][grade] = count
+
+    # Arşive taşınan siparişler (ve lotları) satış toplamlarından düşmez
+    orders, lots = archive.orders_source(include_archived=True), archive.lots_source(include_archived=True)
+    fills = db.query(
+        lots.c.material_type,
+        func.count(orders.c.id),
+        func.sum(func.coalesce(orders.c.quantity_tons, 0.0)),
+        func.sum(func.coalesce(orders.c.total_amount_usd, 0.0)),
+    ).select_from(orders).join(lots, lots.c.id == orders.c.lot_id).group_by(lots.c.material_type)
+    for material_type, count, tons, amount in fills:
+        entry = result.setdefault(material_type, empty())
+        entry.update(order_count=count, sold_tons=tons or 0.0, sold_amount_usd=amount or 0.0)
+
+    return result
+
+
+def rebuild(db: Session) -> int:
+    """Tabloyu sıfırdan yeniden hesaplar ve commit eder. Yazılan malzeme sayısını döndürür."""
+    computed = _compute(db)
+    db.query(models.MarketStat).delete()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for material_type, values in computed.items():
+        db.add(models.MarketStat(material_type=material_type, updated_at=now, **values))
+    db.commit()
+    return len(computed)
+
+
+def _differs(a, b) -> bool:
+    if isinstance(a, (int, float)) or isinstance(b, (int, float)):
+        if a is None or b is None:
+            return a != b
+        return abs(a - b) > DRIFT_TOLERANCE * max(1.0, abs(a), abs(b))
+    return a != b
+
+
+def verify(db: Session) -> list[str]:
+    """Artımlı tabloyu tam hesaplamayla karşılaştırır, sapmaları açıklayan satırlar döndürür."""
+    computed = _compute(db)
+    stored = {s.material_type: s for s in db.query(models.MarketStat).all()}
+    drift = []
+    for material_type in sorted(set(computed) | set(stored), key=str):
+        expected = computed.get(material_type)
+        stat = stored.get(material_type)
+        if expected is None:
+            if stat.active_lot_count or stat.order_count:
+                drift.append(f"{material_type}: tabloda var, ham veride yok")
+            continue
+        if stat is None:
+            drift.append(f"{material_type}: istatistik satırı eksik")
+            continue
+        for field, value in expected.items():
+            current = getattr(stat, field)
+            if field == "grade_mix":
+                current = current or {}
+            if _differs(current, value):
+                drift.append(f"{material_type}.{field}: {current!r} != {value!r}")
+    return drift
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, init_db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    init_db()
+    db = SessionLocal()
+    try:
+        if command == "rebuild":
+            print(f"{rebuild(db)} malzeme tipi için istatistikler yeniden hesaplandı.")
+        elif command == "verify":
+            problems = verify(db)
+            for line in problems:
+                print(line)
+            print("Sapma yok." if not problems else f"{len(problems)} sapma bulundu.")
+            sys.exit(1 if problems else 0)
+        else:
+            print("Kullanım: python market_stats.py [verify|rebuild]")
+            sys.exit(2)
+    finally:
+        db.close()
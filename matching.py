@@ -0,0 +1,131 @@
+"""Ranked top-k matching of guaranteed lots against a purchase request.
+
+Her aday lot bir maliyet puanı alır (küçük = daha iyi):
+  - MFI / yoğunluk: talep aralığının merkezine uzaklık (yarı genişliğe göre 0..1)
+  - fiyat: malzemenin pazar ortalamasına oranı (market_stats'tan tek satır okuma); alıcı konumu
+    verilirse lotun fiyatına incoterm'e göre tahmini navlun eklenir (geo.freight_per_ton)
+  - kalite: 100 - quality_score_numeric
+  - miktar: hedef tonajın karşılanamayan oranı
+Adaylar hafif kolonlarla akıtılır ve sınırlı bir heap'te sadece ilk (offset + limit)
+tutulur; tam lot nesneleri yalnızca kazananlar için yüklenir. Güncel bir katalog görüntüsü
+varsa (catalog_snapshot) adaylar, referans fiyat ve kazananlar DB'ye gitmeden ondan okunur.
+"""
+import heapq
+import json
+import os
+from typing import Optional
+from sqlalchemy.orm import Session, selectinload
+import models
+import geo
+import catalog_snapshot
+
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 100
+MAX_RANKED = 500 # offset + limit üst sınırı
+STREAM_CHUNK = 500
+
+DEFAULT_WEIGHTS = {"mfi": 1.0, "density": 1.0, "price": 1.5, "quality": 1.0, "quantity": 1.0}
+DEFAULT_WEIGHTS.update(json.loads(os.environ.get("MATCH_WEIGHTS", "{}")))
+
+
+def candidate_query(db: Session, material_type: Optional[str], min_mfi=None, max_mfi=None,
+                    min_density=None, max_density=None):
+    lot = models.GuaranteedLot
+    query = db.query(
+        lot.id, lot.mfi, lot.density, lot.selling_price_usd, lot.quality_score_numeric, lot.quantity_tons,
+        lot.latitude, lot.longitude,
+    ).filter(lot.is_active == True)
+    # Eski davranışla aynı: boş/0 gelen filtreler uygulanmaz
+    if material_type:
+        query = query.filter(lot.material_type == material_type)
+    if min_mfi:
+        query = query.filter(lot.mfi >= min_mfi)
+    if max_mfi:
+        query = query.filter(lot.mfi <= max_mfi)
+    if min_density:
+        query = query.filter(lot.density >= min_density)
+    if max_density:
+        query = query.filter(lot.density <= max_density)
+    return query
+
+
+def _window_distance(value, low, high) -> float:
+    if value is None or not low or not high or high <= low:
+        return 0.0
+    half = (high - low) / 2
+    return min(abs(value - (low + half)) / half, 1.0)
+
+
+def reference_price(db: Session, material_type: Optional[str]) -> Optional[float]:
+    if not material_type:
+        return None
+    stat = db.get(models.MarketStat, material_type)
+    if stat is None:
+        return None
+    if stat.available_tons:
+        return stat.price_tons_sum / stat.available_tons
+    return stat.price_sum / stat.active_lot_count if stat.active_lot_count else None
+
+
+def cost(row, criteria, weights: dict, ref_price: Optional[float], origin=None, incoterm: Optional[str] = None) -> float:
+    _, mfi, density, price, quality, quantity, lat, lon = row
+    terms = {
+        "mfi": _window_distance(mfi, criteria.min_mfi, criteria.max_mfi),
+        "density": _window_distance(density, criteria.min_density, criteria.max_density),
+        "quality": (100.0 - min(max(quality if quality is not None else 50.0, 0.0), 100.0)) / 100.0,
+    }
+    if origin and price is not None and lat is not None and lon is not None:
+        price += geo.freight_per_ton(geo.haversine_km(origin[0], origin[1], lat, lon), incoterm)
+    if ref_price and price is not None:
+        # Ortalamanın yarısı 0, iki katı 1 olacak şekilde sıkıştırılır
+        terms["price"] = min(max((price / ref_price - 0.5) / 1.5, 0.0), 1.0)
+    target = criteria.target_quantity_tons
+    if target and target > 0:
+        terms["quantity"] = max(target - (quantity or 0.0), 0.0) / target
+    total_weight = sum(weights.get(k, 0.0) for k in terms)
+    if total_weight <= 0:
+        return 0.0
+    return sum(weights.get(k, 0.0) * v for k, v in terms.items()) / total_weight
+
+
+def rank(db: Session, criteria, limit: int = DEFAULT_LIMIT, offset: int = 0, weights: Optional[dict] = None,
+         origin=None, incoterm: Optional[str] = None) -> list:
+    """criteria: PurchaseRequest modeli veya aynı alanlara sahip şema. En iyi lotları sırayla döndürür;
+    her lota `match_score` (0-100, büyük = iyi) eklenir. origin: alıcının (lat, lon) konumu."""
+    limit = max(1, min(limit, MAX_LIMIT))
+    offset = max(0, min(offset, MAX_RANKED - limit))
+    # Query şemasından gelen "w_price" gibi anahtarlar da kabul edilir
+    overrides = {k.removeprefix("w_"): v for k, v in (weights or {}).items() if v is not None}
+    weights = dict(DEFAULT_WEIGHTS, **overrides)
+    filters = (criteria.material_type, criteria.min_mfi, criteria.max_mfi, criteria.min_density, criteria.max_density)
+    snapshot = catalog_snapshot.current()
+    if snapshot is not None:
+        ref_price = snapshot.reference_price(criteria.material_type)
+        rows = snapshot.candidates(*filters)
+    else:
+        ref_price = reference_price(db, criteria.material_type)
+        rows = candidate_query(db, *filters).yield_per(STREAM_CHUNK)
+    # (maliyet, id) — eşitlikte düşük id önce, sonuç deterministik olsun
+    best = heapq.nsmallest(offset + limit, ((cost(row, criteria, weights, ref_price, origin, incoterm), row[0]) for row in rows))
+    page = best[offset:offset + limit]
+    if not page:
+        return []
+
+    if snapshot is not None:
+        lots = {lot_id: snapshot.lot_by_id(lot_id) for _, lot_id in page}
+    else:
+        lots = {
+            lot.id: lot
+            for lot in db.query(models.GuaranteedLot)
+            .options(selectinload(models.GuaranteedLot.original_offer).selectinload(models.Offer.seller))
+            .filter(models.GuaranteedLot.id.in_([lot_id for _, lot_id in page]))
+        }
+    ranked = []
+    for score, lot_id in page:
+        lot = lots.get(lot_id)
+        if lot is not None:
+            lot.match_score = round((1.0 - score) * 100, 2)
+            if origin and lot.latitude is not None and lot.longitude is not None:
+                lot.distance_km = round(geo.haversine_km(origin[0], origin[1], lot.latitude, lot.longitude), 1)
+            ranked.append(lot)
+    return ranked
@@ -0,0 +1,33 @@
+"""Conversation lookup by canonical participant pair.
+
+Bir konuşma (küçük kullanıcı id, büyük kullanıcı id, lot_key) üçlüsüyle tekildir; lot
+yoksa lot_key 0'dır (NULL benzersizlik kısıtında eşit sayılmadığı için). Bul-ya-da-yarat
+tek bir `INSERT ... ON CONFLICT DO UPDATE ... RETURNING id` ifadesidir: eşzamanlı ilk
+mesajlar aynı odaya düşer ve tablo taranmaz.
+"""
+from typing import Optional, Tuple
+from sqlalchemy.orm import Session
+from database import dialect_insert
+import models
+
+
+def pair_key(user_a: int, user_b: int, lot_id: Optional[int] = None) -> Tuple[int, int, int]:
+    low, high = sorted((user_a, user_b))
+    return low, high, lot_id or 0
+
+
+def find_or_create_conversation(db: Session, sender_id: int, receiver_id: int, lot_id: Optional[int] = None) -> int:
+    """Konuşma id'sini döndürür; yoksa gönderen alıcı (buyer) olarak oluşturur. Commit etmez."""
+    low, high, lot_key = pair_key(sender_id, receiver_id, lot_id)
+    insert = dialect_insert(db)
+    table = models.Conversation.__table__
+    stmt = insert(table).values(
+        buyer_id=sender_id, seller_id=receiver_id, lot_id=lot_id,
+        user_low_id=low, user_high_id=high, lot_key=lot_key,
+    )
+    # DO NOTHING çakışmada satır döndürmez; etkisiz bir UPDATE ile mevcut id RETURNING'e gelir
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_low_id", "user_high_id", "lot_key"],
+        set_={"lot_key": stmt.excluded.lot_key},
+    ).returning(table.c.id)
+    return db.execute(stmt).scalar_one()
@@ -0,0 +1,39 @@
+from sqlalchemy import text
+from database import engine, SessionLocal, init_db
+import offer_queue
+
+def run_migration():
+    init_db() # offer_status_counts tablosu
+    with engine.begin() as conn:
+        print("Starting Database Migration (Phase 10)...")
+        
+        try:
+            conn.execute(text("ALTER TABLE offers ADD COLUMN estimated_value_usd FLOAT;"))
+        except: pass
+        
+        try:
+            conn.execute(text("ALTER TABLE offers ADD COLUMN claimed_by INTEGER REFERENCES users(id);"))
+        except: pass
+        
+        try:
+            conn.execute(text("ALTER TABLE offers ADD COLUMN lease_expires_at TIMESTAMP;"))
+        except: pass
+        
+        conn.execute(text(
+            "UPDATE offers SET estimated_value_usd = COALESCE(ai_estimated_price_usd, 0) * COALESCE(quantity_tons, 0) "
+            "WHERE estimated_value_usd IS NULL;"
+        ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_offers_status_created ON offers (status, created_at);"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_offers_status_value ON offers (status, estimated_value_usd);"))
+    
+    # Kuyruk sayaçlarını mevcut ilanlardan doldur
+    db = SessionLocal()
+    try:
+        counts = offer_queue.rebuild_status_counts(db)
+    finally:
+        db.close()
+    
+    print(f"🧪 Offer work queue ready, status counts: {counts}. Migration complete.")
+
+if __name__ == "__main__":
+    run_migration()
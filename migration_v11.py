@@ -0,0 +1,23 @@
+from sqlalchemy import text
+from database import engine
+
+def run_migration():
+    with engine.begin() as conn:
+        print("Starting Database Migration (Phase 11)...")
+        
+        try:
+            conn.execute(text("ALTER TABLE guaranteed_lots ADD COLUMN product_code VARCHAR;"))
+        except: pass
+        
+        try:
+            conn.execute(text("ALTER TABLE offers ADD COLUMN product_code VARCHAR;"))
+        except: pass
+        
+        # Upsert (ON CONFLICT) için tekil indeks şart
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_guaranteed_lots_product_code ON guaranteed_lots (product_code);"))
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_offers_product_code ON offers (product_code);"))
+        
+        print("📦 Catalog import columns ready. Migration complete.")
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,45 @@
+from sqlalchemy import text
+from database import engine, SessionLocal
+import models
+import geo
+
+def backfill(db, model, batch_size=1000):
+    """custom_fields'taki konum metninden koordinat çözer; lotlar çözülemezse ilanınınkini alır."""
+    resolved = last_id = 0
+    while True:
+        rows = db.query(model).filter(model.id > last_id, model.geo_cell.is_(None)).order_by(model.id).limit(batch_size).all()
+        if not rows:
+            return resolved
+        for row in rows:
+            geo.apply(row)
+            if row.geo_cell is None and model is models.GuaranteedLot and row.original_offer is not None:
+                geo.apply(row, row.original_offer.latitude, row.original_offer.longitude)
+            resolved += row.geo_cell is not None
+        last_id = rows[-1].id
+        db.commit()
+
+def run_migration():
+    with engine.begin() as conn:
+        print("Starting Database Migration (Phase 12)...")
+        
+        for table in ("offers", "guaranteed_lots"):
+            for column, kind in (("latitude", "FLOAT"), ("longitude", "FLOAT"), ("geo_cell", "INTEGER")):
+                try:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {kind};"))
+                except: pass
+        
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_offers_geo_cell ON offers (geo_cell);"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_guaranteed_lots_active_geo ON guaranteed_lots (is_active, geo_cell);"))
+    
+    # İlanlar önce: lotlar konumu bulunamazsa ilanlarından devralır
+    db = SessionLocal()
+    try:
+        offers = backfill(db, models.Offer)
+        lots = backfill(db, models.GuaranteedLot)
+    finally:
+        db.close()
+    
+    print(f"📍 Geo columns ready ({offers} offers, {lots} lots located). Migration complete.")
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,38 @@
+from sqlalchemy import text
+from database import engine
+
+def run_migration():
+    with engine.begin() as conn:
+        print("Starting Database Migration (Phase 13)...")
+        
+        for column, kind in (("user_low_id", "INTEGER"), ("user_high_id", "INTEGER"), ("lot_key", "INTEGER DEFAULT 0")):
+            try:
+                conn.execute(text(f"ALTER TABLE conversations ADD COLUMN {column} {kind};"))
+            except: pass
+        
+        conn.execute(text(
+            "UPDATE conversations SET "
+            "user_low_id = CASE WHEN buyer_id <= seller_id THEN buyer_id ELSE seller_id END, "
+            "user_high_id = CASE WHEN buyer_id <= seller_id THEN seller_id ELSE buyer_id END, "
+            "lot_key = COALESCE(lot_id, 0) "
+            "WHERE user_low_id IS NULL;"
+        ))
+        
+        # Eski OR sorgusunun yarışında açılmış kopya odaları en eski odaya birleştir
+        duplicates = conn.execute(text(
+            "SELECT MIN(id) AS keep_id, user_low_id, user_high_id, lot_key FROM conversations "
+            "GROUP BY user_low_id, user_high_id, lot_key HAVING COUNT(*) > 1;"
+        )).fetchall()
+        for keep_id, low, high, lot_key in duplicates:
+            params = {"keep": keep_id, "low": low, "high": high, "lot": lot_key}
+            dupes = "SELECT id FROM conversations WHERE user_low_id = :low AND user_high_id = :high AND lot_key = :lot AND id <> :keep"
+            conn.execute(text(f"UPDATE messages SET conversation_id = :keep WHERE conversation_id IN ({dupes});"), params)
+            conn.execute(text(f"DELETE FROM conversations WHERE id IN ({dupes});"), params)
+        
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_conversations_pair ON conversations (user_low_id, user_high_id, lot_key);"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_conversations_user_high ON conversations (user_high_id);"))
+        
+        print(f"💬 Conversation pair keys ready ({len(duplicates)} duplicate rooms merged). Migration complete.")
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,15 @@
+from sqlalchemy import text
+from database import engine, init_db
+
+def run_migration():
+    init_db() # *_archive tabloları
+    with engine.begin() as conn:
+        print("Starting Database Migration (Phase 14)...")
+        
+        # Arşivleme ve mesaj listesi konuşma + zaman sırasıyla okur
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_messages_conversation_created ON messages (conversation_id, created_at);"))
+        
+        print("🗄️ Archive tables ready (python archive.py run --dry-run ile önizleyin). Migration complete.")
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,18 @@
+from sqlalchemy import text
+from database import engine, init_db
+
+def run_migration():
+    init_db() # entity_versions + change_log tabloları
+    with engine.begin() as conn:
+        print("Starting Database Migration (Phase 15)...")
+        
+        # Dinleyiciler change_log'u zamana göre budar
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_change_log_created_at ON change_log (created_at);"))
+        
+        # Mevcut katalog bir başlangıç sürümüyle başlasın
+        conn.execute(text("INSERT INTO entity_versions (entity, version, updated_at) SELECT 'catalog', 1, CURRENT_TIMESTAMP WHERE NOT EXISTS (SELECT 1 FROM entity_versions WHERE entity = 'catalog');"))
+        
+        print("📣 Cache invalidation bus ready. Migration complete.")
+
+if __name__ == "__main__":
+    run_migration()
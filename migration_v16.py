@@ -0,0 +1,50 @@
+from sqlalchemy import text
+from sqlalchemy.schema import CreateTable
+from database import engine, init_db
+import models
+
+# Arşive taşınan tablolar ve arşivleri: SQLite'ta AUTOINCREMENT'e geçer (bkz. models.Order)
+TABLES = (
+    (models.Order.__table__, models.orders_archive),
+    (models.GuaranteedLot.__table__, models.guaranteed_lots_archive),
+    (models.Conversation.__table__, models.conversations_archive),
+    (models.Message.__table__, models.messages_archive),
+)
+
+def _rebuild(conn, table, archive):
+    # SQLite mevcut tabloya AUTOINCREMENT ekleyemez: yeni tablo kurulur, satırlar kopyalanır
+    name = table.name
+    ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name;"), {"name": name}).scalar()
+    if ddl is None or "AUTOINCREMENT" in ddl.upper():
+        return False
+    existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({name});"))}
+    columns = ", ".join(c.name for c in table.columns if c.name in existing)
+    create = str(CreateTable(table).compile(dialect=conn.dialect)).replace(f"CREATE TABLE {name} (", f"CREATE TABLE {name}_new (", 1)
+    conn.execute(text(create))
+    conn.execute(text(f"INSERT INTO {name}_new ({columns}) SELECT {columns} FROM {name};"))
+    conn.execute(text(f"DROP TABLE {name};"))
+    conn.execute(text(f"ALTER TABLE {name}_new RENAME TO {name};"))
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+    # Arşivdeki id'ler de bir daha verilmesin
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name;"), {"name": name})
+    conn.execute(text(
+        f"INSERT INTO sqlite_sequence (name, seq) SELECT :name, MAX("
+        f"(SELECT COALESCE(MAX(id), 0) FROM {name}), (SELECT COALESCE(MAX(id), 0) FROM {archive.name}));"
+    ), {"name": name})
+    return True
+
+def run_migration():
+    init_db() # *_archive tabloları
+    if engine.dialect.name != "sqlite":
+        print("Postgres sequence'ları id'leri tekrar vermez; Phase 16 atlandı.")
+        return
+    with engine.begin() as conn:
+        print("Starting Database Migration (Phase 16)...")
+        
+        rebuilt = [table.name for table, archive in TABLES if _rebuild(conn, table, archive)]
+        
+        print(f"🔢 AUTOINCREMENT ids ready ({', '.join(rebuilt) or 'zaten güncel'}). Migration complete.")
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,24 @@
+from sqlalchemy import text
+from database import engine, SessionLocal, init_db
+import market_stats
+
+def run_migration():
+    init_db() # market_stats tablosu
+    with engine.begin() as conn:
+        print("Starting Database Migration (Phase 9)...")
+        
+        try:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_guaranteed_lots_material_active ON guaranteed_lots (material_type, is_active);"))
+        except: pass
+    
+    # Mevcut lot/siparişlerden pazar istatistiklerini doldur
+    db = SessionLocal()
+    try:
+        count = market_stats.rebuild(db)
+    finally:
+        db.close()
+    
+    print(f"📈 Market stats backfilled for {count} material types. Migration complete.")
+
+if __name__ == "__main__":
+    run_migration()
@@ -1,5 +1,5 @@
 import datetime
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, JSON, Index, UniqueConstraint, Text, Table
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -14,7 +14,7 @@ class User(Base):
     is_verified = Column(Boolean, default=False)
     created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
     
-    offers = relationship("Offer", back_populates="seller")
+    offers = relationship("Offer", back_populates="seller", foreign_keys="Offer.seller_id")
 
 class Offer(Base):
     """
@@ -35,14 +35,38 @@ class Offer(Base):
     ai_estimated_price_usd = Column(Float, nullable=True)
     lab_mfi = Column(Float, nullable=True)
     lab_density = Column(Float, nullable=True)
+    product_code = Column(String, unique=True, index=True, nullable=True) # Tedarikçi katalog kodu (import upsert anahtarı)
+    estimated_value_usd = Column(Float, default=0.0) # ai fiyatı * ton — iş kuyruğu sıralaması için
+    
+    # Exper iş kuyruğu: numuneyi üstlenen exper ve kiralamanın (lease) bitişi
+    claimed_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    
+    # Konum: custom_fields'taki metinden çözülen koordinat ve geohash hücresi (bkz. geo.py)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    geo_cell = Column(Integer, nullable=True)
     
     custom_fields = Column(JSON, default=dict)
     
     created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
 
-    seller = relationship("User", back_populates="offers")
+    seller = relationship("User", back_populates="offers", foreign_keys=[seller_id])
     guaranteed_lots = relationship("GuaranteedLot", back_populates="original_offer")
 
+    __table_args__ = (
+        Index("ix_offers_status_created", "status", "created_at"),
+        Index("ix_offers_status_value", "status", "estimated_value_usd"),
+        Index("ix_offers_geo_cell", "geo_cell"),
+    )
+
+class OfferStatusCount(Base):
+    """Durum bazında ilan sayacı — kuyruk sayıları COUNT(*) yerine buradan okunur."""
+    __tablename__ = "offer_status_counts"
+
+    status = Column(String, primary_key=True)
+    count = Column(Integer, default=0)
+
 class GuaranteedLot(Base):
     """
     EcoGrade Exper testinden geçip platform havuzuna alınan (satışa hazır) garantili parti.
@@ -62,10 +86,22 @@ class GuaranteedLot(Base):
     carbon_score = Column(String) # A+, B
     quality_score_numeric = Column(Float, nullable=True) # 0-100 arası ağırlıklı puan
     is_active = Column(Boolean, default=True)
+    product_code = Column(String, unique=True, index=True, nullable=True) # Tedarikçi katalog kodu (import upsert anahtarı)
+    
+    # Konum: custom_fields'taki metinden çözülen koordinat ve geohash hücresi (bkz. geo.py)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    geo_cell = Column(Integer, nullable=True)
     
     custom_fields = Column(JSON, default=dict)
     
     original_offer = relationship("Offer", back_populates="guaranteed_lots")
+
+    __table_args__ = (
+        Index("ix_guaranteed_lots_material_active", "material_type", "is_active"),
+        Index("ix_guaranteed_lots_active_geo", "is_active", "geo_cell"),
+        {"sqlite_autoincrement": True}, # Arşivlenen id'ler tekrar verilmesin (bkz. Order)
+    )
     
     @property
     def seller_name(self):
@@ -107,6 +143,11 @@ class Order(Base):
     
     created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
 
+    # SQLite varsayılan olarak en büyük rowid silinince onu yeniden verir; arşive taşınan
+    # satırın id'si yeni bir satıra verilirse arşiv INSERT'i PK çakışmasına düşer ve
+    # arşivdeki lot_id/conversation_id referansları yanlış satırı gösterir (Postgres sequence'ı tekrar vermez)
+    __table_args__ = {"sqlite_autoincrement": True}
+
 class Conversation(Base):
     """Alıcı-Satıcı arasındaki mesajlaşma odası."""
     __tablename__ = "conversations"
@@ -117,8 +158,19 @@ class Conversation(Base):
     seller_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
     
+    # Kanonik katılımcı anahtarı: sıralı kullanıcı id'leri + lot (lot yoksa 0) — bkz. messaging.py
+    user_low_id = Column(Integer, nullable=True)
+    user_high_id = Column(Integer, nullable=True)
+    lot_key = Column(Integer, default=0)
+    
     messages = relationship("Message", back_populates="conversation")
 
+    __table_args__ = (
+        UniqueConstraint("user_low_id", "user_high_id", "lot_key", name="uq_conversations_pair"),
+        Index("ix_conversations_user_high", "user_high_id"),
+        {"sqlite_autoincrement": True},
+    )
+
 class Message(Base):
     """Konuşma içindeki tekil mesaj."""
     __tablename__ = "messages"
@@ -130,3 +182,156 @@ class Message(Base):
     created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
     
     conversation = relationship("Conversation", back_populates="messages")
+
+    __table_args__ = (
+        Index("ix_messages_conversation_created", "conversation_id", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
+
+class MarketStat(Base):
+    """
+    Malzeme tipi bazında pazar özeti. Lot/sipariş yazımlarıyla aynı transaction içinde
+    delta olarak güncellenir, böylece /market/stats tabloları taramadan cevap verir.
+    """
+    __tablename__ = "market_stats"
+
+    material_type = Column(String, primary_key=True)
+    active_lot_count = Column(Integer, default=0)
+    available_tons = Column(Float, default=0.0)
+    price_sum = Column(Float, default=0.0) # Aktif lotların birim fiyat toplamı (ortalama için)
+    price_tons_sum = Column(Float, default=0.0) # Tonaj ağırlıklı ortalama için fiyat*ton toplamı
+    min_price_usd = Column(Float, nullable=True)
+    max_price_usd = Column(Float, nullable=True)
+    grade_mix = Column(JSON, default=dict) # {"A+": 3, "B": 1} — aktif lot sayısı
+    order_count = Column(Integer, default=0)
+    sold_tons = Column(Float, default=0.0)
+    sold_amount_usd = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+class PriceEvent(Base):
+    """
+    Fiyat değişikliği ve gerçekleşen satışların salt-ekleme (append-only) kaydı.
+    lot_id bilinçli olarak FK değil; geçmiş kayıtlar lot silinse/arşivlense de kalır.
+    """
+    __tablename__ = "price_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    lot_id = Column(Integer, index=True)
+    material_type = Column(String)
+    kind = Column(String) # listing, reprice, fill
+    price_usd = Column(Float) # Ton başı fiyat
+    quantity_tons = Column(Float, default=0.0) # Sadece fill olaylarında hacim sayılır
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+class PriceRollup(Base):
+    """Arka plan sıkıştırma işinin ürettiği saatlik/günlük OHLC + hacim mumları."""
+    __tablename__ = "price_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    material_type = Column(String)
+    interval = Column(String) # hour, day
+    bucket_start = Column(DateTime)
+    open_usd = Column(Float)
+    high_usd = Column(Float)
+    low_usd = Column(Float)
+    close_usd = Column(Float)
+    volume_tons = Column(Float, default=0.0)
+    event_count = Column(Integer, default=0)
+    fill_count = Column(Integer, default=0)
+    first_event_at = Column(DateTime) # Geç gelen olaylarda open/close doğru kalsın diye
+    last_event_at = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint("material_type", "interval", "bucket_start", name="uq_price_rollups_bucket"),
+    )
+
+class ProcessingCursor(Base):
+    """Artımlı arka plan işlerinin (ör. fiyat sıkıştırma) kaldığı son kayıt id'si."""
+    __tablename__ = "processing_cursors"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+class IdempotencyRecord(Base):
+    """
+    Idempotency-Key ile gelen isteğin ilk yanıtı. Aynı anahtarla tekrar gelen istek
+    handler'ı yeniden çalıştırmadan bu yanıtı alır; süresi dolan kayıtlar temizlenir.
+    """
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String) # "POST /checkout/ user:5" — anahtar kullanıcı/route bazında tekil
+    key = Column(String)
+    request_hash = Column(String) # Aynı anahtarın farklı gövdeyle kullanılmasını yakalar
+    status = Column(String, default="in_progress") # in_progress, completed
+    response_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    expires_at = Column(DateTime, index=True)
+
+    __table_args__ = (
+        UniqueConstraint("scope", "key", name="uq_idempotency_scope_key"),
+    )
+
+class Job(Base):
+    """
+    DB tabanlı arka plan işi. Yazma ile aynı transaction'da kuyruğa eklenir,
+    `python jobs.py work` ile çalışan worker'lar tarafından işlenir.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String) # Handler adı, ör. price_history.compact
+    payload = Column(JSON, default=dict)
+    priority = Column(Integer, default=100) # Küçük değer önce çalışır
+    status = Column(String, default="queued") # queued, running, done, dead
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    run_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc)) # Geri çekilme (backoff) sonrası en erken çalışma zamanı
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_priority_run_at", "status", "priority", "run_at"),
+    )
+
+
+class EntityVersion(Base):
+    """Önbelleğe alınan varlık grubunun (ör. "catalog") sürümü — yazmayla aynı transaction'da artar."""
+    __tablename__ = "entity_versions"
+
+    entity = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+class ChangeLog(Base):
+    """Geliştirme ortamı invalidation kanalı (Postgres'te LISTEN/NOTIFY kullanılır); worker'lar id ile yoklar."""
+    __tablename__ = "change_log"
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String)
+    version = Column(Integer)
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), index=True)
+
+# --- Arşiv (soğuk) tabloları: bkz. archive.py ---
+def _archive_table(source: Table, *indexes) -> Table:
+    """Sıcak tablonun kolon kopyası; FK ve tekil kısıt yok (kaynak satırlar silinebilsin), az indeks."""
+    columns = [Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False) for c in source.columns]
+    return Table(
+        f"{source.name}_archive", Base.metadata, *columns,
+        Column("archived_at", DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc)),
+        *indexes,
+    )
+
+orders_archive = _archive_table(Order.__table__, Index("ix_orders_archive_created", "created_at"))
+guaranteed_lots_archive = _archive_table(GuaranteedLot.__table__, Index("ix_guaranteed_lots_archive_offer", "original_offer_id"))
+conversations_archive = _archive_table(
+    Conversation.__table__,
+    Index("ix_conversations_archive_low", "user_low_id"),
+    Index("ix_conversations_archive_high", "user_high_id"),
+)
+messages_archive = _archive_table(Message.__table__, Index("ix_messages_archive_conversation", "conversation_id", "created_at"))
@@ -0,0 +1,63 @@
+"""Offer status lifecycle with compare-and-swap transitions.
+
+Durum geçişleri tek bir koşullu UPDATE'tir (`... WHERE id = :id AND status = :beklenen`);
+etkilenen satır sayısı 1 değilse başka bir istek (ikinci exper, tekrar denenen istek)
+durumu zaten değiştirmiştir. Geçiş çağıranın transaction'ında yapılır, böylece onayla
+birlikte eklenen GuaranteedLot ya geçişle birlikte commit edilir ya hiç edilmez — tablo
+kilidi gerekmez, lot tam bir kez yayınlanır.
+
+Geçişi yapan exper (`expert_id`) verilirse aynı UPDATE ilanın başka bir experin geçerli
+kiralamasında olmadığını da şart koşar: üstlenilmiş numuneyi başkası onaylayamaz/reddedemez.
+"""
+from typing import Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+import models
+import offer_queue
+
+PENDING = "Pending"
+AWAITING_SAMPLE = "AwaitingSample"
+APPROVED = "Approved"
+REJECTED = "Rejected"
+
+STATUSES = (PENDING, AWAITING_SAMPLE, APPROVED, REJECTED)
+TRANSITIONS = {
+    PENDING: {AWAITING_SAMPLE, REJECTED},
+    AWAITING_SAMPLE: {APPROVED, REJECTED},
+    APPROVED: set(),
+    REJECTED: set(),
+}
+
+
+def can_transition(current: str, new: str) -> bool:
+    return new in TRANSITIONS.get(current, set())
+
+
+def transition(db: Session, offer_id: int, expected: str, new: str, expert_id: Optional[int] = None, **values) -> bool:
+    """İlanı `expected` durumundaysa `new` durumuna geçirir (commit etmez). Yarışı kaybederse
+    ya da ilan başka bir experin kiralamasındaysa False.
+    values: aynı UPDATE'te yazılacak ek kolonlar (ör. exper kiralamasının temizlenmesi)."""
+    if not can_transition(expected, new):
+        raise ValueError(f"Geçersiz durum geçişi: {expected} -> {new}")
+    offer = models.Offer
+    conditions = [offer.id == offer_id, offer.status == expected]
+    if expert_id is not None:
+        conditions.append(offer_queue.held_by_or_free(expert_id))
+    result = db.execute(
+        update(offer)
+        .where(*conditions)
+        .values(status=new, **values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    offer_queue.bump_status_count(db, expected, new)
+    return True
+
+
+def approve(db: Session, offer_id: int, expert_id: Optional[int] = None) -> bool:
+    return transition(db, offer_id, AWAITING_SAMPLE, APPROVED, expert_id, claimed_by=None, lease_expires_at=None)
+
+
+def reject(db: Session, offer_id: int, current: str, expert_id: Optional[int] = None) -> bool:
+    return transition(db, offer_id, current, REJECTED, expert_id, claimed_by=None, lease_expires_at=None)
@@ -0,0 +1,154 @@
+"""Expert work queue over offers: keyset pagination, claim/lease and status counters.
+
+Birden fazla lab experi aynı anda `claim` ile farklı numuneler alır. Postgres'te
+`FOR UPDATE SKIP LOCKED`, SQLite'ta ise koşullu UPDATE (compare-and-swap) kullanılır.
+"""
+import base64
+import datetime
+import json
+from typing import Optional
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+import models
+
+ORDERINGS = ("age", "value")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+LEASE_SECONDS = 15 * 60
+# SQLite yolunda yarışta kaybedilen adaylar için fazladan okunan aday çarpanı
+_CANDIDATE_FACTOR = 4
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def estimated_value(offer) -> float:
+    return (offer.ai_estimated_price_usd or 0.0) * (offer.quantity_tons or 0.0)
+
+
+# --- Durum sayaçları ---
+def bump_status_count(db: Session, old_status: Optional[str], new_status: Optional[str]):
+    """İlan durum değişimini sayaçlara yansıtır (aynı transaction, commit etmez)."""
+    counter = models.OfferStatusCount
+    if old_status:
+        db.execute(update(counter).where(counter.status == old_status).values(count=counter.count - 1))
+    if new_status:
+        result = db.execute(update(counter).where(counter.status == new_status).values(count=counter.count + 1))
+        if result.rowcount == 0:
+            db.add(counter(status=new_status, count=1))
+            db.flush()
+
+
+def status_counts(db: Session) -> dict:
+    return {row.status: row.count for row in db.query(models.OfferStatusCount).all()}
+
+
+def rebuild_status_counts(db: Session) -> dict:
+    counts = dict(db.query(models.Offer.status, func.count(models.Offer.id)).group_by(models.Offer.status).all())
+    db.query(models.OfferStatusCount).delete()
+    for status, count in counts.items():
+        db.add(models.OfferStatusCount(status=status, count=count))
+    db.commit()
+    return counts
+
+
+# --- Keyset sayfalama ---
+def _encode_cursor(offer, order: str) -> str:
+    key = offer.created_at.isoformat() if order == "age" else (offer.estimated_value_usd or 0.0)
+    raw = json.dumps([key, offer.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str, order: str):
+    key, offer_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if order == "age":
+        key = datetime.datetime.fromisoformat(key)
+    return key, int(offer_id)
+
+
+def _ordered(query, order: str):
+    offer = models.Offer
+    if order == "age":
+        return query.order_by(offer.created_at, offer.id)
+    return query.order_by(offer.estimated_value_usd.desc(), offer.id.desc())
+
+
+def _after(query, order: str, cursor: str):
+    offer = models.Offer
+    key, offer_id = _decode_cursor(cursor, order)
+    if order == "age":
+        return query.filter(or_(offer.created_at > key, and_(offer.created_at == key, offer.id > offer_id)))
+    return query.filter(or_(
+        offer.estimated_value_usd < key,
+        and_(offer.estimated_value_usd == key, offer.id < offer_id),
+    ))
+
+
+def _unclaimed(now: datetime.datetime):
+    return or_(models.Offer.claimed_by.is_(None), models.Offer.lease_expires_at < now)
+
+
+def held_by_or_free(expert_id: int, now: Optional[datetime.datetime] = None):
+    """İlan bu experin üzerinde, kimsede değil ya da kirası dolmuş (onay/ret koşulu)."""
+    return or_(_unclaimed(now or _now()), models.Offer.claimed_by == expert_id)
+
+
+def page(db: Session, status: str = "AwaitingSample", order: str = "age", limit: int = DEFAULT_PAGE_SIZE,
+         cursor: Optional[str] = None, unclaimed_only: bool = False):
+    """(ilanlar, sonraki_cursor) döndürür; son sayfada cursor None olur."""
+    if order not in ORDERINGS:
+        raise ValueError(f"Bilinmeyen sıralama: {order}")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(models.Offer).filter(models.Offer.status == status)
+    if unclaimed_only:
+        query = query.filter(_unclaimed(_now()))
+    if cursor:
+        query = _after(query, order, cursor)
+    rows = _ordered(query, order).limit(limit + 1).all()
+    next_cursor = _encode_cursor(rows[limit - 1], order) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+# --- Claim / lease ---
+def claim(db: Session, expert_id: int, limit: int = 1, status: str = "AwaitingSample", order: str = "age",
+          lease_seconds: int = LEASE_SECONDS) -> list:
+    """Boştaki (veya kirası dolmuş) en öncelikli ilanları experin adına kilitler ve commit eder."""
+    if order not in ORDERINGS:
+        raise ValueError(f"Bilinmeyen sıralama: {order}")
+    now = _now()
+    lease = {"claimed_by": expert_id, "lease_expires_at": now + datetime.timedelta(seconds=lease_seconds)}
+    offer = models.Offer
+    base = select(offer.id).where(offer.status == status, _unclaimed(now))
+    base = base.order_by(offer.created_at, offer.id) if order == "age" else base.order_by(offer.estimated_value_usd.desc(), offer.id.desc())
+
+    if db.get_bind().dialect.name == "postgresql":
+        ids = list(db.execute(base.limit(limit).with_for_update(skip_locked=True)).scalars())
+        if ids:
+            db.execute(update(offer).where(offer.id.in_(ids)).values(**lease))
+    else:
+        # SQLite tek yazarlıdır; her aday için koşullu UPDATE yarışı güvenle çözer
+        ids = []
+        for candidate in db.execute(base.limit(limit * _CANDIDATE_FACTOR)).scalars().all():
+            result = db.execute(
+                update(offer).where(offer.id == candidate, offer.status == status, _unclaimed(now)).values(**lease)
+            )
+            if result.rowcount == 1:
+                ids.append(candidate)
+                if len(ids) >= limit:
+                    break
+    db.commit()
+    if not ids:
+        return []
+    return _ordered(db.query(offer).filter(offer.id.in_(ids)), order).all()
+
+
+def release(db: Session, offer_id: int, expert_id: int) -> bool:
+    """Experin üzerindeki kirayı bırakır; kira başkasına geçmişse False döner."""
+    result = db.execute(
+        update(models.Offer)
+        .where(models.Offer.id == offer_id, models.Offer.claimed_by == expert_id)
+        .values(claimed_by=None, lease_expires_at=None)
+    )
+    db.commit()
+    return result.rowcount == 1
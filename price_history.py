@@ -0,0 +1,200 @@
+"""Price history: append-only price events and precomputed OHLC rollups.
+
+Yazma yolları `record_event` ile olay ekler (commit etmez). `compact` işi yeni olayları
+saatlik ve günlük mumlara işler; aralık sorguları sadece `price_rollups` tablosunu okur.
+
+    python price_history.py compact            # tek seferlik
+    python price_history.py compact --loop 60  # 60 sn'de bir (arka plan süreci)
+"""
+import datetime
+import sys
+import time
+from typing import Optional
+from sqlalchemy.orm import Session
+import models
+import jobs
+
+INTERVALS = ("hour", "day")
+CURSOR_NAME = "price_rollups"
+COMPACT_BATCH_SIZE = 5000
+# Geç commit edilen (düşük id'li) olayların atlanmaması için en yeni olaylar bir süre bekletilir
+SETTLE_SECONDS = 10
+# estimate_price'a referans verilecek en eski günlük kapanış
+REFERENCE_MAX_AGE_DAYS = 30
+
+
+def _utc_naive(value: datetime.datetime) -> datetime.datetime:
+    # SQLite tz bilgisini saklamaz; tüm kova hesapları naive UTC üzerinden yapılır
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def bucket_start(value: datetime.datetime, interval: str) -> datetime.datetime:
+    value = _utc_naive(value)
+    if interval == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    if interval == "day":
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Bilinmeyen aralık: {interval}")
+
+
+def record_event(db: Session, lot, kind: str, price_usd: float, quantity_tons: float = 0.0):
+    """Fiyat olayını transaction'a ekler; çağıran commit eder."""
+    if price_usd is None:
+        return
+    if lot.id is None:
+        db.flush() # Yeni lot için id gerekli
+    db.add(models.PriceEvent(
+        lot_id=lot.id,
+        material_type=lot.material_type,
+        kind=kind,
+        price_usd=price_usd,
+        quantity_tons=quantity_tons or 0.0,
+    ))
+    # Mumları olay oturduktan sonra güncelle (bekleyen iş varsa yenisi eklenmez)
+    jobs.enqueue(db, "price_history.compact", delay_seconds=SETTLE_SECONDS, unique=True)
+
+
+def _merge(candle: models.PriceRollup, event: models.PriceEvent, at: datetime.datetime):
+    price = event.price_usd
+    if candle.event_count == 0:
+        candle.open_usd = candle.high_usd = candle.low_usd = candle.close_usd = price
+        candle.first_event_at = candle.last_event_at = at
+    else:
+        candle.high_usd = max(candle.high_usd, price)
+        candle.low_usd = min(candle.low_usd, price)
+        if at < candle.first_event_at:
+            candle.open_usd = price
+            candle.first_event_at = at
+        if at >= candle.last_event_at:
+            candle.close_usd = price
+            candle.last_event_at = at
+    candle.event_count += 1
+    if event.kind == "fill":
+        candle.fill_count += 1
+        candle.volume_tons += event.quantity_tons or 0.0
+
+
+def _load_candle(db: Session, cache: dict, material_type: str, interval: str, start: datetime.datetime):
+    key = (material_type, interval, start)
+    candle = cache.get(key)
+    if candle is None:
+        candle = db.query(models.PriceRollup).filter(
+            models.PriceRollup.material_type == material_type,
+            models.PriceRollup.interval == interval,
+            models.PriceRollup.bucket_start == start,
+        ).first()
+        if candle is None:
+            candle = models.PriceRollup(
+                material_type=material_type, interval=interval, bucket_start=start,
+                volume_tons=0.0, event_count=0, fill_count=0,
+            )
+            db.add(candle)
+        cache[key] = candle
+    return candle
+
+
+def compact(db: Session, batch_size: int = COMPACT_BATCH_SIZE, settle_seconds: float = SETTLE_SECONDS) -> int:
+    """İşlenmemiş olayları mumlara ekler. Her parti kendi transaction'ında commit edilir."""
+    processed = 0
+    while True:
+        cursor = db.query(models.ProcessingCursor).filter(
+            models.ProcessingCursor.name == CURSOR_NAME
+        ).with_for_update().first()
+        if cursor is None:
+            cursor = models.ProcessingCursor(name=CURSOR_NAME, last_id=0)
+            db.add(cursor)
+
+        events = db.query(models.PriceEvent).filter(
+            models.PriceEvent.id > (cursor.last_id or 0)
+        ).order_by(models.PriceEvent.id).limit(batch_size).all()
+        full_batch = len(events) == batch_size
+        cutoff = _utc_naive(datetime.datetime.now(datetime.timezone.utc)) - datetime.timedelta(seconds=settle_seconds)
+        for index, event in enumerate(events):
+            if _utc_naive(event.created_at) > cutoff:
+                events = events[:index]
+                full_batch = False
+                break
+        if not events:
+            db.rollback()
+            return processed
+
+        cache = {}
+        for event in events:
+            at = _utc_naive(event.created_at)
+            for interval in INTERVALS:
+                candle = _load_candle(db, cache, event.material_type, interval, bucket_start(at, interval))
+                _merge(candle, event, at)
+
+        cursor.last_id = events[-1].id
+        cursor.updated_at = datetime.datetime.now(datetime.timezone.utc)
+        db.commit()
+        processed += len(events)
+        if not full_batch:
+            return processed
+
+
+@jobs.handler("price_history.compact")
+def _compact_job(db: Session, payload: dict):
+    compact(db)
+
+
+def candles(db: Session, material_type: str, interval: str = "day",
+            start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None) -> list:
+    if interval not in INTERVALS:
+        raise ValueError(f"Bilinmeyen aralık: {interval}")
+    query = db.query(models.PriceRollup).filter(
+        models.PriceRollup.material_type == material_type,
+        models.PriceRollup.interval == interval,
+    )
+    if start is not None:
+        query = query.filter(models.PriceRollup.bucket_start >= bucket_start(start, interval))
+    if end is not None:
+        query = query.filter(models.PriceRollup.bucket_start <= _utc_naive(end))
+    return [
+        {
+            "bucket_start": c.bucket_start,
+            "open": c.open_usd,
+            "high": c.high_usd,
+            "low": c.low_usd,
+            "close": c.close_usd,
+            "volume_tons": c.volume_tons,
+            "fills": c.fill_count,
+            "events": c.event_count,
+        }
+        for c in query.order_by(models.PriceRollup.bucket_start).all()
+    ]
+
+
+def reference_price(db: Session, material_type: str) -> Optional[float]:
+    """Son günlük kapanış (marj dahil satış fiyatı); yakın tarihli veri yoksa None."""
+    since = bucket_start(datetime.datetime.now(datetime.timezone.utc), "day") - datetime.timedelta(days=REFERENCE_MAX_AGE_DAYS)
+    candle = db.query(models.PriceRollup).filter(
+        models.PriceRollup.material_type == material_type,
+        models.PriceRollup.interval == "day",
+        models.PriceRollup.bucket_start >= since,
+    ).order_by(models.PriceRollup.bucket_start.desc()).first()
+    return candle.close_usd if candle else None
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, init_db
+
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        print("Kullanım: python price_history.py compact [--loop SANIYE]")
+        sys.exit(2)
+    loop_seconds = float(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[2] == "--loop" else None
+
+    init_db()
+    while True:
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            count = compact(db)
+            print(f"{count} fiyat olayı {time.perf_counter() - started:.2f} sn'de mumlara işlendi.")
+        finally:
+            db.close()
+        if loop_seconds is None:
+            break
+        time.sleep(loop_seconds)
@@ -0,0 +1,210 @@
+"""Learned price estimator fitted from historical lots and orders.
+
+Malzeme tipi başına MFI, yoğunluk, kalite puanı ve log(tonaj) üzerinde ridge regresyon
+(NumPy ile, çevrimdışı) kurulur. Model yeterli istatistikleri (XᵀX, Xᵀy) ve son görülen
+lot/order id'leriyle birlikte küçük, versiyonlu bir JSON dosyasına yazılır; yenileme
+sadece yeni kayıtları ekleyip denklemi tekrar çözer.
+
+Çıkarım saf Python'dur (NumPy gerekmez): dosya ilk kullanımda yüklenir, süreç içinde
+önbelleklenir ve dosya değişince yeniden okunur. Görülmemiş malzemelerde None döner;
+çağıran eski tablo tahminine düşer.
+
+    python price_model.py fit       # sıfırdan
+    python price_model.py refresh   # artımlı
+"""
+import datetime
+import json
+import math
+import os
+import sys
+import threading
+import time
+from typing import Iterable, List, Optional
+from sqlalchemy.orm import Session
+import models
+import jobs
+
+ARTIFACT_FORMAT = 1
+MODEL_PATH = os.environ.get("PRICE_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "price_model.json"))
+FEATURES = ["intercept", "mfi", "density", "quality", "log_quantity"]
+# Satış fiyatı = alış tahmini * marj (approve_offer ile aynı)
+BROKER_MARGIN = 1.05
+MIN_SAMPLES = 8
+RIDGE_LAMBDA = 1.0
+DEFAULT_QUALITY = 75.0
+# Tahmin bu aralığın dışındaysa güvenilmez sayılır, tablo tahminine düşülür
+MIN_PRICE_USD, MAX_PRICE_USD = 50.0, 50000.0
+RELOAD_CHECK_SECONDS = 30.0
+READ_CHUNK = 5000
+
+_cache = {"model": None, "mtime": None, "checked": 0.0}
+_cache_lock = threading.Lock()
+
+
+def features(mfi, density, quality, quantity_tons) -> List[float]:
+    return [
+        1.0,
+        float(mfi or 0.0),
+        float(density or 0.0),
+        float(quality if quality is not None else DEFAULT_QUALITY),
+        math.log1p(max(float(quantity_tons or 0.0), 0.0)),
+    ]
+
+
+# --- Eğitim (NumPy sadece burada) ---
+def _samples(db: Session, lot_after: int, order_after: int):
+    """(malzeme, özellikler, alış fiyatı) üçlüleri — lotlar ve siparişler, parça parça."""
+    lot = models.GuaranteedLot
+    query = db.query(lot.id, lot.material_type, lot.mfi, lot.density, lot.quality_score_numeric,
+                     lot.quantity_tons, lot.selling_price_usd).filter(lot.id > lot_after, lot.selling_price_usd > 0)
+    for lot_id, material, mfi, density, quality, qty, price in query.order_by(lot.id).yield_per(READ_CHUNK):
+        yield "lot", lot_id, material, features(mfi, density, quality, qty), price / BROKER_MARGIN
+
+    order = models.Order
+    query = db.query(order.id, lot.material_type, lot.mfi, lot.density, lot.quality_score_numeric,
+                     order.quantity_tons, order.total_amount_usd).join(lot, lot.id == order.lot_id).filter(
+        order.id > order_after, order.quantity_tons > 0, order.total_amount_usd > 0)
+    for order_id, material, mfi, density, quality, qty, total in query.order_by(order.id).yield_per(READ_CHUNK):
+        yield "order", order_id, material, features(mfi, density, quality, qty), total / qty / BROKER_MARGIN
+
+
+def _solve(np, xtx, xty):
+    penalty = np.eye(len(FEATURES)) * RIDGE_LAMBDA
+    penalty[0, 0] = 0.0 # Sabit terim cezalandırılmaz
+    return np.linalg.solve(xtx + penalty, xty)
+
+
+def fit(db: Session, previous: Optional[dict] = None) -> dict:
+    """previous verilirse onun istatistiklerine sadece yeni kayıtlar eklenir (artımlı)."""
+    import numpy as np
+
+    width = len(FEATURES)
+    stats = {}
+    watermarks = {"lot": 0, "order": 0}
+    if previous:
+        watermarks.update(previous.get("watermarks", {}))
+        for material, entry in previous.get("materials", {}).items():
+            stats[material] = {
+                "n": entry["n"], "quality_sum": entry["quality_mean"] * entry["n"],
+                "xtx": np.array(entry["xtx"]), "xty": np.array(entry["xty"]),
+            }
+
+    new_watermarks = dict(watermarks)
+    for source, row_id, material, x, y in _samples(db, watermarks["lot"], watermarks["order"]):
+        entry = stats.setdefault(material, {"n": 0, "quality_sum": 0.0, "xtx": np.zeros((width, width)), "xty": np.zeros(width)})
+        vector = np.array(x)
+        entry["xtx"] += np.outer(vector, vector)
+        entry["xty"] += vector * y
+        entry["n"] += 1
+        entry["quality_sum"] += x[3]
+        new_watermarks[source] = max(new_watermarks[source], row_id)
+
+    materials = {}
+    for material, entry in stats.items():
+        coef = _solve(np, entry["xtx"], entry["xty"]).tolist() if entry["n"] >= MIN_SAMPLES else None
+        materials[material] = {
+            "n": entry["n"],
+            "coef": coef,
+            "quality_mean": entry["quality_sum"] / entry["n"] if entry["n"] else DEFAULT_QUALITY,
+            "xtx": entry["xtx"].tolist(),
+            "xty": entry["xty"].tolist(),
+        }
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return {
+        "format": ARTIFACT_FORMAT,
+        "version": now.strftime("%Y%m%dT%H%M%S"),
+        "trained_at": now.isoformat(),
+        "features": FEATURES,
+        "watermarks": new_watermarks,
+        "materials": materials,
+    }
+
+
+def save(model: dict, path: str = MODEL_PATH):
+    # Atomik yazım: okuyan süreçler yarım dosya görmesin
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(model, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def load(path: str = MODEL_PATH) -> Optional[dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            model = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if model.get("format") != ARTIFACT_FORMAT or model.get("features") != FEATURES:
+        return None
+    return model
+
+
+def refresh(db: Session, full: bool = False, path: str = MODEL_PATH) -> dict:
+    model = fit(db, None if full else load(path))
+    save(model, path)
+    return model
+
+
+@jobs.handler("price_model.refresh")
+def _refresh_job(db: Session, payload: dict):
+    refresh(db, full=payload.get("full", False))
+
+
+# --- Çıkarım (saf Python) ---
+def current_model() -> Optional[dict]:
+    """Süreç içi önbellek; dosyanın değişip değişmediği en fazla RELOAD_CHECK_SECONDS'ta bir bakılır."""
+    now = time.monotonic()
+    if _cache["checked"] and now - _cache["checked"] < RELOAD_CHECK_SECONDS:
+        return _cache["model"]
+    with _cache_lock:
+        _cache["checked"] = now
+        try:
+            mtime = os.path.getmtime(MODEL_PATH)
+        except OSError:
+            _cache["model"], _cache["mtime"] = None, None
+            return None
+        if mtime != _cache["mtime"]:
+            _cache["model"], _cache["mtime"] = load(MODEL_PATH), mtime
+        return _cache["model"]
+
+
+def predict(material_type: str, mfi: float, density: float, quantity_tons: float,
+            quality: Optional[float] = None) -> Optional[float]:
+    """Ton başı alış fiyatı tahmini; model bu malzemeyi bilmiyorsa None."""
+    model = current_model()
+    entry = model["materials"].get(material_type) if model else None
+    if not entry or not entry.get("coef"):
+        return None
+    x = features(mfi, density, quality if quality is not None else entry["quality_mean"], quantity_tons)
+    price = sum(c * v for c, v in zip(entry["coef"], x))
+    if not (MIN_PRICE_USD <= price <= MAX_PRICE_USD):
+        return None
+    return round(price, 2)
+
+
+def predict_many(items: Iterable[dict]) -> List[Optional[float]]:
+    """Toplu tahmin: her eleman material_type, mfi, density, quantity_tons (ve opsiyonel quality) içerir."""
+    return [
+        predict(item["material_type"], item.get("mfi"), item.get("density"),
+                item.get("quantity_tons"), item.get("quality"))
+        for item in items
+    ]
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "refresh"
+    if command not in ("fit", "refresh"):
+        print("Kullanım: python price_model.py [fit|refresh]")
+        sys.exit(2)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        model = refresh(db, full=command == "fit")
+        fitted = sum(1 for m in model["materials"].values() if m["coef"])
+        print(f"Model {model['version']}: {fitted}/{len(model['materials'])} malzeme için katsayı, "
+              f"{time.perf_counter() - started:.2f} sn ({MODEL_PATH})")
+    finally:
+        db.close()
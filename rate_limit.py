@@ -0,0 +1,191 @@
+"""Per-user / per-IP token-bucket rate limiting and load shedding (ASGI middleware).
+
+- Her istek kimlikli kullanıcının (JWT `sub`) ve IP'nin kovasından token harcar;
+  kova boşsa 429 + Retry-After döner.
+- Aynı anda işlenen istek sayısı veya DB havuzu doluluğu eşiği aşarsa istek
+  handler'a (ve DB'ye) hiç ulaşmadan 503 + Retry-After ile reddedilir.
+
+Varsayılan backend süreç içi bellektir. Çok worker'lı kurulumda `take(key, rate, burst)`
+metodunu sağlayan bir nesne RATE_LIMIT_BACKEND="modul:nesne" ile takılabilir.
+Route limitleri RATE_LIMITS ortam değişkeniyle ezilebilir:
+    RATE_LIMITS='{"POST /offers/": [0.5, 5], "* /products/match": [5, 20]}'
+"""
+import heapq
+import importlib
+import json
+import math
+import os
+import threading
+import time
+from typing import Optional, Tuple
+from auth import token_subject
+
+# (saniyede token, kova kapasitesi) — "METHOD path-öneki"; en uzun önek kazanır, "*" her metot
+DEFAULT_LIMIT = (10.0, 40)
+ROUTE_LIMITS = {
+    "POST /products/match": (5.0, 20),
+    "GET /guaranteed-lots/match": (5.0, 20),
+    "POST /offers/": (1.0, 10),
+    "POST /checkout/": (1.0, 5),
+    "POST /auth/login": (0.5, 5),
+    "POST /auth/register": (0.2, 3),
+    "POST /messages/": (2.0, 20),
+}
+# IP kovası aynı IP'nin arkasındaki birden fazla kullanıcıyı kapsar, bu yüzden daha geniş
+IP_LIMIT_MULTIPLIER = 4
+EXEMPT_PATHS = ("/", "/docs", "/openapi.json")
+
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT_REQUESTS", "64"))
+# Havuzdaki bağlantıların bu oranı kullanımdaysa yeni istek beklemek yerine reddedilir
+POOL_SATURATION_THRESHOLD = float(os.environ.get("POOL_SATURATION_THRESHOLD", "0.95"))
+SHED_RETRY_AFTER_SECONDS = 1
+
+
+class InMemoryBackend:
+    """Süreç içi token bucket deposu (tek worker / geliştirme için)."""
+
+    # Bu kadar süredir dokunulmamış kova zaten dolmuştur, atılması davranışı değiştirmez
+    IDLE_SECONDS = 300.0
+    SWEEP_INTERVAL_SECONDS = 60.0
+
+    def __init__(self, max_keys: int = 50000):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+        self._swept_at = time.monotonic()
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1.0) -> Tuple[bool, float]:
+        """(izin_var_mı, kaç_sn_sonra_tekrar_denenmeli) döndürür."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                result = (True, 0.0)
+            else:
+                self._buckets[key] = (tokens, now)
+                result = (False, (cost - tokens) / rate if rate > 0 else 60.0)
+            # İzin verilen istekler de yeni anahtar ekler: süpürme her iki yolda da çalışır
+            if len(self._buckets) > self._max_keys or now - self._swept_at > self.SWEEP_INTERVAL_SECONDS:
+                self._evict(now)
+            return result
+
+    def _evict(self, now: float):
+        self._swept_at = now
+        stale = [k for k, (_, updated) in self._buckets.items() if now - updated > self.IDLE_SECONDS]
+        for key in stale:
+            del self._buckets[key]
+        # Hepsi yakın zamanda kullanılmışsa en eskiler atılır; her yeni anahtarda tekrar
+        # taranmasın diye sınırın %90'ına inilir
+        overflow = len(self._buckets) - int(self._max_keys * 0.9)
+        if len(self._buckets) > self._max_keys and overflow > 0:
+            for key, _ in heapq.nsmallest(overflow, self._buckets.items(), key=lambda item: item[1][1]):
+                del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def _load_backend():
+    spec = os.environ.get("RATE_LIMIT_BACKEND")
+    if not spec:
+        return InMemoryBackend()
+    module_name, _, attr = spec.partition(":")
+    backend = getattr(importlib.import_module(module_name), attr)
+    return backend() if isinstance(backend, type) else backend
+
+
+def _load_route_limits() -> dict:
+    limits = dict(ROUTE_LIMITS)
+    override = os.environ.get("RATE_LIMITS")
+    if override:
+        limits.update({rule: (float(rate), int(burst)) for rule, (rate, burst) in json.loads(override).items()})
+    # En spesifik kural önce eşleşsin
+    return dict(sorted(limits.items(), key=lambda item: len(item[0].split(" ", 1)[1]), reverse=True))
+
+
+def _pool_saturation(engine) -> float:
+    pool = engine.pool
+    try:
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        return pool.checkedout() / capacity if capacity > 0 else 0.0
+    except AttributeError:
+        # NullPool/StaticPool: bekleme kuyruğu yok
+        return 0.0
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, backend=None, route_limits: Optional[dict] = None, engines=(),
+                 max_in_flight: int = MAX_IN_FLIGHT, pool_threshold: float = POOL_SATURATION_THRESHOLD):
+        self.app = app
+        self.backend = backend or _load_backend()
+        self.route_limits = route_limits if route_limits is not None else _load_route_limits()
+        self.engines = engines
+        self.max_in_flight = max_in_flight
+        self.pool_threshold = pool_threshold
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def _limit_for(self, method: str, path: str) -> Tuple[str, float, int]:
+        # Kova anahtarı ham path değil eşleşen kuraldır (/messages/5 ve /messages/6 aynı kova)
+        for rule, (rate, burst) in self.route_limits.items():
+            rule_method, prefix = rule.split(" ", 1)
+            if rule_method in ("*", method) and path.startswith(prefix):
+                return rule, rate, burst
+        return "default", DEFAULT_LIMIT[0], DEFAULT_LIMIT[1]
+
+    @staticmethod
+    def _user_key(scope) -> Optional[str]:
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                return token_subject(value.decode("latin-1").partition(" ")[2])
+        return None
+
+    async def _reject(self, send, status: int, detail: str, retry_after: float):
+        body = json.dumps({"detail": detail}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        # 1) Yük atma: handler ve DB bağlantısı açılmadan önce
+        if self.in_flight >= self.max_in_flight or any(
+            _pool_saturation(engine) >= self.pool_threshold for engine in self.engines
+        ):
+            await self._reject(send, 503, "Sunucu yoğun, lütfen tekrar deneyin.", SHED_RETRY_AFTER_SECONDS)
+            return
+
+        # 2) Kullanıcı ve IP bazlı token bucket
+        route, rate, burst = self._limit_for(scope["method"], scope["path"])
+        user = self._user_key(scope)
+        if user is not None:
+            allowed, retry_after = self.backend.take(f"user:{user}:{route}", rate, burst)
+            if not allowed:
+                await self._reject(send, 429, "Çok fazla istek gönderdiniz.", retry_after)
+                return
+        client = scope.get("client")
+        ip = client[0] if client else "unknown"
+        allowed, retry_after = self.backend.take(f"ip:{ip}:{route}", rate * IP_LIMIT_MULTIPLIER, burst * IP_LIMIT_MULTIPLIER)
+        if not allowed:
+            await self._reject(send, 429, "Çok fazla istek gönderdiniz.", retry_after)
+            return
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
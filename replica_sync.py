@@ -0,0 +1,35 @@
+"""Local read-replica stand-in: copies the primary SQLite file into the replica file.
+
+Lokal geliştirmede REPLICA_DATABASE_URL=sqlite:///./broker_replica.db ile birlikte çalıştırılır;
+--loop ile periyodik kopyalama gerçek replikasyon gecikmesini taklit eder.
+
+    python replica_sync.py            # tek seferlik kopya
+    python replica_sync.py --loop 2   # 2 sn'de bir
+"""
+import sqlite3
+import sys
+import time
+from database import engine, read_engine
+
+
+def sync_once():
+    if engine.dialect.name != "sqlite" or read_engine.dialect.name != "sqlite" or read_engine is engine:
+        raise SystemExit("Sadece iki ayrı SQLite dosyası arasında çalışır (REPLICA_DATABASE_URL=sqlite:///...).")
+    source = sqlite3.connect(engine.url.database)
+    target = sqlite3.connect(read_engine.url.database)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+if __name__ == "__main__":
+    loop_seconds = float(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[1] == "--loop" else None
+    while True:
+        started = time.perf_counter()
+        sync_once()
+        print(f"Replika {time.perf_counter() - started:.3f} sn'de güncellendi.")
+        if loop_seconds is None:
+            break
+        time.sleep(loop_seconds)
@@ -0,0 +1,353 @@
+"""On-demand per-request profiling for production diagnostics.
+
+Bir admin, yavaşlayan tek bir isteği yeniden deploy etmeden profilleyebilir:
+
+    curl -H "Authorization: Bearer <admin token>" -H "X-Profile: sample" .../messages/inbox/list
+    curl -H "Authorization: Bearer <admin token>" ".../admin/approve_offer/12?_profile=trace" -X POST ...
+
+Yanıt `X-Profile-Id` başlığı taşır; profil `GET /admin/profiles/{id}` (JSON: süre, SQL ifadeleri
+ve süreleri, yığınlar) ve `GET /admin/profiles/{id}/collapsed` (flamegraph.pl / speedscope
+uyumlu "collapsed stacks") ile alınır.
+
+Modlar:
+    sample  (varsayılan) handler thread'inin yığını PROFILE_SAMPLE_INTERVAL_MS aralıkla örneklenir;
+            ek yük sabit ve küçüktür, ağırlık = örnek sayısı
+    trace   deterministik: her Python/C çağrısı sys.setprofile ile izlenir; kesin ama yavaş,
+            ağırlık = mikrosaniye (kendi süre)
+
+Tetiklenmeyen istekler için maliyet başlık taramasıyla bir ContextVar okumasıdır: SQL
+dinleyicileri sadece profil çalışırken bağlıdır, örnekleyici thread sadece o istek boyunca
+yaşar. Profil istekleri rate_limit'in token bucket'ından geçer (PROFILE_RATE_PER_MINUTE /
+PROFILE_BURST); kova boşsa 429 döner. Profiller süreç belleğinde son PROFILE_KEEP adet
+tutulur, PROFILE_DIR verilirse diske de yazılır (çok worker'lı kurulumda oradan okunur).
+
+Handler thread'ine girmek için router'lar `route_class=ProfiledRoute` ile kurulur; endpoint
+fonksiyonu, profil aktifken kendi thread'inde profiler'ı açan ince bir sarmalayıcıyla kaydedilir.
+"""
+import contextvars
+import datetime
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+import anyio
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from auth import token_subject
+from rate_limit import InMemoryBackend
+import models
+
+MODES = ("sample", "trace")
+HEADER = b"x-profile"
+QUERY_FLAG = b"_profile="
+SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "2"))
+RATE_PER_MINUTE = float(os.environ.get("PROFILE_RATE_PER_MINUTE", "2"))
+BURST = int(os.environ.get("PROFILE_BURST", "3"))
+KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+MAX_SQL_STATEMENTS = 1000
+MAX_STATEMENT_CHARS = 2000
+MAX_STACK_DEPTH = 128
+
+_active = contextvars.ContextVar("request_profile", default=None)
+_profiles = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def _label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+# --- Profil oturumu ---
+class ProfileSession:
+    def __init__(self, mode: str, method: str, path: str, user: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.mode = mode
+        self.meta = {"method": method, "path": path, "user": user,
+                     "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+        self.stacks = {}
+        self.sql = []
+        self.sql_dropped = 0
+        self.started = time.perf_counter()
+        self.status = None
+        # Yeniden girişli: trace modunda add_sql içindeki çağrılar da izlenip add_stack'e düşer
+        self._lock = threading.RLock()
+
+    def add_stack(self, frames: list, weight: float):
+        key = ";".join(frame.replace(";", ",") for frame in frames)
+        with self._lock:
+            self.stacks[key] = self.stacks.get(key, 0) + weight
+
+    def add_sql(self, statement: str, duration_ms: float, executemany: bool):
+        with self._lock:
+            if len(self.sql) >= MAX_SQL_STATEMENTS:
+                self.sql_dropped += 1
+                return
+            self.sql.append({"statement": statement[:MAX_STATEMENT_CHARS], "duration_ms": round(duration_ms, 3),
+                             "executemany": executemany})
+
+    def run(self, fn, args, kwargs):
+        """Endpoint'i (handler thread'inde) seçilen profiler altında çalıştırır."""
+        if self.mode == "trace":
+            return self._run_traced(fn, args, kwargs)
+        return self._run_sampled(fn, args, kwargs)
+
+    def _run_sampled(self, fn, args, kwargs):
+        target = threading.get_ident()
+        stop = threading.Event()
+        boundary = ProfileSession._run_sampled.__code__
+        interval = SAMPLE_INTERVAL_MS / 1000.0
+
+        def sample():
+            while not stop.wait(interval):
+                frame = sys._current_frames().get(target)
+                frames = []
+                # Sarmalayıcıya kadar yukarı: thread havuzu iç yığını profile girmez
+                while frame is not None and frame.f_code is not boundary and len(frames) < MAX_STACK_DEPTH:
+                    frames.append(_label(frame.f_code))
+                    frame = frame.f_back
+                if frames:
+                    self.add_stack(frames[::-1], 1)
+
+        sampler = threading.Thread(target=sample, name=f"profile-sampler:{self.id}", daemon=True)
+        sampler.start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stop.set()
+            sampler.join()
+
+    def _run_traced(self, fn, args, kwargs):
+        stack = [] # [etiket, başlangıç, çocukların süresi]
+        clock = time.perf_counter
+
+        def tracer(frame, event_name, arg):
+            now = clock()
+            if event_name == "call":
+                stack.append([_label(frame.f_code), now, 0.0])
+            elif event_name == "c_call":
+                stack.append([f"{getattr(arg, '__module__', None) or 'builtins'}:{getattr(arg, '__qualname__', repr(arg))}", now, 0.0])
+            elif stack and event_name in ("return", "c_return", "c_exception"):
+                label, started, children = stack[-1]
+                elapsed = now - started
+                self.add_stack([entry[0] for entry in stack], (elapsed - children) * 1e6)
+                stack.pop()
+                if stack:
+                    stack[-1][2] += elapsed
+
+        previous = sys.getprofile()
+        sys.setprofile(tracer)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sys.setprofile(previous)
+
+    def finish(self) -> dict:
+        sql_total = sum(item["duration_ms"] for item in self.sql)
+        unit = "microseconds" if self.mode == "trace" else "samples"
+        artifact = {
+            "id": self.id, "mode": self.mode, **self.meta,
+            "status": self.status,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "sql_count": len(self.sql) + self.sql_dropped, "sql_total_ms": round(sql_total, 3),
+            "sql": self.sql, "sql_dropped": self.sql_dropped,
+            "stack_unit": unit,
+            "sample_interval_ms": SAMPLE_INTERVAL_MS if self.mode == "sample" else None,
+            "stacks": {stack: round(weight) for stack, weight in self.stacks.items() if round(weight) > 0},
+        }
+        _store(artifact)
+        return artifact
+
+
+def _profiled_call(fn, args, kwargs):
+    session = _active.get()
+    if session is None:
+        return fn(*args, **kwargs)
+    return session.run(fn, args, kwargs)
+
+
+def wrap(endpoint):
+    """Senkron endpoint'i profil aktifse handler thread'inde profilleyen sarmalayıcı (imza korunur)."""
+    if getattr(endpoint, "__request_profiler__", False) or inspect.iscoroutinefunction(endpoint):
+        # async endpoint'ler event loop'ta çalışır; bunlarda sadece SQL ve toplam süre toplanır
+        return endpoint
+
+    @functools.wraps(endpoint)
+    def profiled(*args, **kwargs):
+        return _profiled_call(endpoint, args, kwargs)
+
+    profiled.__request_profiler__ = True
+    return profiled
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, wrap(endpoint), **kwargs)
+
+
+# --- SQL yakalama: sadece profil çalışırken bağlı ---
+_sql_attached = {"count": 0, "engines": ()}
+_sql_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get() is not None:
+        conn.info.setdefault("request_profiler_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    session = _active.get()
+    started = conn.info.get("request_profiler_started")
+    if session is not None and started:
+        session.add_sql(statement, (time.perf_counter() - started.pop()) * 1000, executemany)
+
+
+def _attach_sql(engines):
+    with _sql_lock:
+        if _sql_attached["count"] == 0:
+            for engine in set(engines):
+                event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+                event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+            _sql_attached["engines"] = tuple(set(engines))
+        _sql_attached["count"] += 1
+
+
+def _detach_sql():
+    with _sql_lock:
+        _sql_attached["count"] -= 1
+        if _sql_attached["count"] == 0:
+            for engine in _sql_attached["engines"]:
+                event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+                event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+            _sql_attached["engines"] = ()
+
+
+# --- Saklama ---
+def _store(artifact: dict):
+    with _profiles_lock:
+        _profiles[artifact["id"]] = artifact
+        while len(_profiles) > KEEP:
+            _profiles.popitem(last=False)
+    if PROFILE_DIR:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, f"{artifact['id']}.json"), "w", encoding="utf-8") as f:
+            json.dump(artifact, f, ensure_ascii=False)
+
+
+def get(profile_id: str) -> Optional[dict]:
+    artifact = _profiles.get(profile_id)
+    if artifact is None and PROFILE_DIR and profile_id.isalnum():
+        try:
+            with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), encoding="utf-8") as f:
+                artifact = json.load(f)
+        except FileNotFoundError:
+            return None
+    return artifact
+
+
+def recent() -> list:
+    summary_keys = ("id", "mode", "method", "path", "user", "created_at", "status", "duration_ms", "sql_count", "sql_total_ms")
+    with _profiles_lock:
+        artifacts = list(_profiles.values())
+    return [{k: a.get(k) for k in summary_keys} for a in reversed(artifacts)]
+
+
+def collapsed(artifact: dict) -> str:
+    """`çerçeve;çerçeve;... ağırlık` satırları (flamegraph.pl, speedscope, inferno)."""
+    return "".join(f"{stack} {weight}\n" for stack, weight in sorted(artifact["stacks"].items()))
+
+
+# --- Middleware ---
+def _requested_mode(scope) -> Optional[str]:
+    value = None
+    for name, raw in scope.get("headers", ()):
+        if name == HEADER:
+            value = raw.decode("latin-1").strip().lower()
+            break
+    if value is None:
+        query = scope.get("query_string", b"")
+        if QUERY_FLAG not in query:
+            return None
+        for part in query.split(b"&"):
+            if part.startswith(QUERY_FLAG):
+                value = part[len(QUERY_FLAG):].decode("latin-1").strip().lower()
+    if value is None or value in ("0", "false", "off"):
+        return None
+    return value if value in MODES else "sample"
+
+
+def _bearer_token(scope) -> Optional[str]:
+    for name, raw in scope.get("headers", ()):
+        if name == b"authorization":
+            return raw.decode("latin-1").partition(" ")[2] or None
+    return None
+
+
+def _admin_email(token: Optional[str]) -> Optional[str]:
+    if not token:
+        return None
+    email = token_subject(token)
+    if email is None:
+        return None
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        role = db.query(models.User.role).filter(models.User.email == email).scalar()
+    finally:
+        db.close()
+    return email if role == "admin" else None
+
+
+class RequestProfilerMiddleware:
+    def __init__(self, app, engines=(), backend=None, rate_per_minute: float = RATE_PER_MINUTE, burst: int = BURST):
+        self.app = app
+        self.engines = engines
+        self.backend = backend or InMemoryBackend()
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+
+    async def _reply(self, send, status: int, detail: str, retry_after: Optional[float] = None):
+        body = json.dumps({"detail": detail}, ensure_ascii=False).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if retry_after is not None:
+            headers.append((b"retry-after", str(max(1, int(retry_after + 0.999))).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        mode = _requested_mode(scope) if scope["type"] == "http" else None
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        user = await anyio.to_thread.run_sync(_admin_email, _bearer_token(scope))
+        if user is None:
+            await self._reply(send, 403, "Profil almak için admin yetkisi gerekiyor.")
+            return
+        allowed, retry_after = self.backend.take(f"profile:{user}", self.rate, self.burst)
+        if not allowed:
+            await self._reply(send, 429, "Profil limiti aşıldı, sonra tekrar deneyin.", retry_after)
+            return
+
+        session = ProfileSession(mode, scope["method"], scope["path"], user)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                session.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", session.id.encode())]}
+            await send(message)
+
+        token = _active.set(session)
+        _attach_sql(self.engines)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _detach_sql()
+            _active.reset(token)
+            session.finish()
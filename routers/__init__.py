@@ -0,0 +1,9 @@
+"""API route modules, mounted by main.py in this order:
+
+    auth         /auth/*
+    offers       /offers/, /admin/offers/*, /admin/approve_offer, /admin/reject_offer
+    catalog      /requests/*, /guaranteed-lots/match, /products/*, /market/*, /admin/cache/*
+    checkout     /checkout/*, /admin/exports/orders
+    messaging    /messages/*
+    diagnostics  /admin/profiles/*
+"""
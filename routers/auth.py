@@ -0,0 +1,72 @@
+"""Auth routes: register, login, current user."""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+import models, schemas, request_profiler
+from database import get_db
+from auth import get_password_hash, verify_password, create_access_token, require_auth
+
+router = APIRouter(tags=["auth"], route_class=request_profiler.ProfiledRoute)
+
+# --- AUTH ENDPOINTS ---
+@router.post("/auth/register")
+def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
+    """Yeni kullanıcı kaydı"""
+    existing = db.query(models.User).filter(models.User.email == user_data.email).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Bu e-posta adresi zaten kayıtlı")
+    
+    hashed = get_password_hash(user_data.password)
+    db_user = models.User(
+        company_name=user_data.company_name,
+        email=user_data.email,
+        role="user", # Rol istemciden alınmaz; admin yetkisi sadece DB'den verilir
+        hashed_password=hashed,
+        is_verified=False
+    )
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    
+    token = create_access_token(data={"sub": db_user.email})
+    return {
+        "access_token": token,
+        "token_type": "bearer",
+        "user": {
+            "id": db_user.id,
+            "email": db_user.email,
+            "company_name": db_user.company_name,
+            "role": db_user.role,
+            "is_verified": db_user.is_verified
+        }
+    }
+
+@router.post("/auth/login")
+def login_user(credentials: schemas.UserLogin, db: Session = Depends(get_db)):
+    """Kullanıcı girişi — JWT token döndürür"""
+    user = db.query(models.User).filter(models.User.email == credentials.email).first()
+    if not user or not verify_password(credentials.password, user.hashed_password):
+        raise HTTPException(status_code=401, detail="Geçersiz e-posta veya şifre")
+    
+    token = create_access_token(data={"sub": user.email})
+    return {
+        "access_token": token,
+        "token_type": "bearer",
+        "user": {
+            "id": user.id,
+            "email": user.email,
+            "company_name": user.company_name,
+            "role": user.role,
+            "is_verified": user.is_verified
+        }
+    }
+
+@router.get("/auth/me")
+def get_me(current_user: models.User = Depends(require_auth)):
+    """Mevcut kullanıcı bilgilerini döndürür"""
+    return {
+        "id": current_user.id,
+        "email": current_user.email,
+        "company_name": current_user.company_name,
+        "role": current_user.role,
+        "is_verified": current_user.is_verified
+    }
@@ -0,0 +1,185 @@
+"""Catalog routes: buyer requests, matching, products and market data."""
+from fastapi import APIRouter, Depends, HTTPException, Header
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import datetime
+import models, schemas, matching, allocation, geo, market_stats, price_history, cache_bus, compression, catalog_snapshot, request_profiler
+from database import get_db, get_read_db, SessionLocal
+from auth import require_admin
+
+router = APIRouter(tags=["catalog"], route_class=request_profiler.ProfiledRoute)
+
+def _buyer_origin(location: schemas.BuyerLocation):
+    try:
+        return geo.origin(location.lat, location.lon, location.near)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Konum bulunamadı: {location.near}")
+
+# --- BROKER LOGIC (TALEP YARAT - BUYER FLOW) ---
+@router.post("/requests/", response_model=schemas.PurchaseRequest)
+def create_buyer_request(req: schemas.PurchaseRequestCreate, db: Session = Depends(get_db)):
+    """ Alıcının listelerde kaybolmak yerine 'Bana şu maldan x Ton lazım' demesi """
+    new_req = models.PurchaseRequest(
+        **req.model_dump(),
+        buyer_id=2 # Mock Buyer ID
+    )
+    db.add(new_req)
+    db.commit()
+    db.refresh(new_req)
+    return new_req
+
+@router.get("/guaranteed-lots/match", response_model=List[schemas.GuaranteedLot])
+def match_guaranteed_lots(request_id: int, limit: int = matching.DEFAULT_LIMIT, offset: int = 0,
+                          weights: schemas.MatchWeights = Depends(), location: schemas.BuyerLocation = Depends(),
+                          db: Session = Depends(get_read_db)):
+    """ Alıcının talebine uygun olan ve bizzat EcoGrade Havuzunda bulunan onaylı malların getirilmesi (puana göre sıralı, ilk `limit` kadar) """
+    req = db.query(models.PurchaseRequest).filter(models.PurchaseRequest.id == request_id).first()
+    if not req:
+        raise HTTPException(status_code=404, detail="Talep bulunamadı")
+    
+    return matching.rank(db, req, limit, offset, weights.model_dump(), _buyer_origin(location), location.incoterms)
+
+@router.get("/requests/{request_id}/allocation")
+def get_request_allocation(request_id: int, min_quality: Optional[float] = None, target_tons: Optional[float] = None, db: Session = Depends(get_read_db)):
+    """ Talebin hedef tonajını en ucuza karşılayan lot kombinasyonu (gerekirse birden fazla lot, son lottan kısmi) """
+    req = db.query(models.PurchaseRequest).filter(models.PurchaseRequest.id == request_id).first()
+    if not req:
+        raise HTTPException(status_code=404, detail="Talep bulunamadı")
+    result = allocation.allocate(db, req, target_tons, min_quality)
+    result["request_id"] = request_id
+    return result
+
+# --- PRODUCTS (GUARANTEED LOTS) ENDPOINTS ---
+# Aktif katalog süreç içinde JSON'a çevrilmiş ve sıkıştırılmış halde tutulur; lot yazan her yol
+# "catalog" sürümünü artırır ve tüm worker'lardaki kopya cache_bus üzerinden boşalır
+products_cache = cache_bus.LocalCache("products", ("catalog",))
+
+def _load_products():
+    # Soğuk başlangıçta güncel mmap görüntüsü varsa DB'ye hiç gidilmez
+    snapshot = catalog_snapshot.current()
+    if snapshot is not None:
+        return compression.Precompressed(_product_rows(snapshot.lots()))
+    # Ana veritabanından okunur: replika gecikmesi eski listeyi yeni sürüm altında önbelleğe koymasın
+    db = SessionLocal()
+    try:
+        lots = db.query(models.GuaranteedLot).filter(models.GuaranteedLot.is_active == True).all()
+        return compression.Precompressed(_product_rows(lots))
+    finally:
+        db.close()
+
+def _product_rows(lots):
+    return [
+        {
+            "id": lot.id,
+            "material_type": lot.material_type,
+            "material_form": getattr(lot, 'material_form', None),
+            "mfi": lot.mfi,
+            "density": lot.density,
+            "quantity_tons": lot.quantity_tons,
+            "price_per_ton": lot.selling_price_usd,
+            "selling_price_usd": lot.selling_price_usd,
+            "carbon_score": lot.carbon_score,
+            "is_active": lot.is_active,
+            "original_offer_id": lot.original_offer_id,
+            "created_at": getattr(lot, 'created_at', None),
+            "manufacturer": "EcoGrade A.Ş.",
+            "seller_name": lot.seller_name,
+            "custom_fields": lot.custom_fields
+        }
+        for lot in lots
+    ]
+
+@router.get("/products/")
+def get_all_products(accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    """ Aktif katalog; sürüm başına bir kez sıkıştırılır (br/gzip), ETag ile değişmediyse 304 """
+    return products_cache.get("all", _load_products).response(accept_encoding, if_none_match)
+
+@router.put("/products/{product_id}")
+def update_product(product_id: int, update_data: schemas.GuaranteedLotUpdate, db: Session = Depends(get_db)):
+    lot = db.query(models.GuaranteedLot).filter(models.GuaranteedLot.id == product_id).first()
+    if not lot:
+        raise HTTPException(status_code=404, detail="Ürün bulunamadı")
+    before = market_stats.lot_state(lot)
+    
+    if update_data.selling_price_usd is not None:
+        if update_data.selling_price_usd != lot.selling_price_usd:
+            price_history.record_event(db, lot, "reprice", update_data.selling_price_usd)
+        lot.selling_price_usd = update_data.selling_price_usd
+    if update_data.is_active is not None:
+        lot.is_active = update_data.is_active
+    if update_data.custom_fields is not None:
+        current = lot.custom_fields or {}
+        new_fields = current.copy()
+        new_fields.update(update_data.custom_fields)
+        lot.custom_fields = new_fields
+        found = geo.lookup(geo.location_text(update_data.custom_fields))
+        if found:
+            geo.apply(lot, *found)
+        
+    market_stats.apply_lot_change(db, before, market_stats.lot_state(lot))
+    cache_bus.bump(db, "catalog")
+    db.commit()
+    db.refresh(lot)
+    return {"detail": f"Ürün #{product_id} başarıyla güncellendi", "custom_fields": lot.custom_fields, "seller_name": lot.seller_name}
+
+@router.delete("/products/{product_id}")
+def delete_product(product_id: int, db: Session = Depends(get_db)):
+    lot = db.query(models.GuaranteedLot).filter(models.GuaranteedLot.id == product_id).first()
+    if not lot:
+        raise HTTPException(status_code=404, detail="Ürün bulunamadı")
+    before = market_stats.lot_state(lot)
+    lot.is_active = False
+    market_stats.apply_lot_change(db, before, None)
+    cache_bus.bump(db, "catalog")
+    db.commit()
+    return {"detail": f"Ürün #{product_id} başarıyla gizlendi."}
+
+@router.post("/products/match", response_model=List[schemas.GuaranteedLot])
+def match_products_direct(req: schemas.PurchaseRequestCreate, limit: int = matching.DEFAULT_LIMIT, offset: int = 0,
+                          weights: schemas.MatchWeights = Depends(), location: schemas.BuyerLocation = Depends(),
+                          db: Session = Depends(get_read_db)):
+    # Veritabanına talep kaydetmeden eşleştirme listele (Market Hızlı Fitrelemesi için)
+    return matching.rank(db, req, limit, offset, weights.model_dump(), _buyer_origin(location), location.incoterms)
+
+@router.get("/products/nearby", response_model=List[schemas.GuaranteedLot])
+def get_products_nearby(radius_km: float = 50.0, material_type: Optional[str] = None, limit: int = 100,
+                        location: schemas.BuyerLocation = Depends(), db: Session = Depends(get_read_db)):
+    """ Alıcının tesisine X km içindeki aktif lotlar, yakından uzağa (geohash hücre indeksiyle) """
+    origin = _buyer_origin(location)
+    if origin is None:
+        raise HTTPException(status_code=400, detail="lat/lon veya near parametresi gerekli")
+    return geo.within(db, origin[0], origin[1], min(radius_km, geo.NEAREST_MAX_KM), material_type, max(1, min(limit, 500)))
+
+@router.get("/products/nearest", response_model=List[schemas.GuaranteedLot])
+def get_products_nearest(n: int = 10, material_type: Optional[str] = None,
+                         location: schemas.BuyerLocation = Depends(), db: Session = Depends(get_read_db)):
+    """ Alıcının tesisine en yakın N aktif lot """
+    origin = _buyer_origin(location)
+    if origin is None:
+        raise HTTPException(status_code=400, detail="lat/lon veya near parametresi gerekli")
+    return geo.nearest(db, origin[0], origin[1], max(1, min(n, 100)), material_type)
+
+# --- MARKET STATS ---
+@router.get("/market/stats")
+def get_market_stats(material_type: Optional[str] = None, db: Session = Depends(get_read_db)):
+    """ Malzeme tipi bazında artımlı tutulan pazar özeti (ham tablolar taranmaz) """
+    query = db.query(models.MarketStat)
+    if material_type:
+        stat = query.filter(models.MarketStat.material_type == material_type).first()
+        if not stat:
+            raise HTTPException(status_code=404, detail="Bu malzeme için pazar verisi yok")
+        return market_stats.to_dict(stat)
+    return [market_stats.to_dict(s) for s in query.order_by(models.MarketStat.material_type).all()]
+
+@router.get("/market/prices/{material_type}")
+def get_price_history(material_type: str, interval: str = "day", start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None, db: Session = Depends(get_read_db)):
+    """ Önceden hesaplanmış OHLC mumlarından fiyat geçmişi (ham olaylar taranmaz) """
+    if interval not in price_history.INTERVALS:
+        raise HTTPException(status_code=400, detail="Geçersiz aralık (hour veya day)")
+    return price_history.candles(db, material_type, interval, start, end)
+
+# --- CACHE ---
+@router.get("/admin/cache/metrics")
+def get_cache_metrics(current_user: models.User = Depends(require_admin)):
+    """ Süreç içi önbellekler ve invalidation bus'ı: isabet oranı, yayılma gecikmesi (p50/p95), dinleyici durumu, katalog görüntüsü """
+    return {**cache_bus.metrics(), "snapshot": catalog_snapshot.metrics()}
@@ -0,0 +1,80 @@
+"""Escrow checkout and the order ledger export."""
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import datetime
+import models, schemas, allocation, idempotency, ledger_export, cache_bus, request_profiler
+from database import get_db, get_read_db
+from auth import require_admin
+
+router = APIRouter(tags=["checkout"], route_class=request_profiler.ProfiledRoute)
+
+# --- ESCROW CHECKOUT ---
+@router.post("/checkout/", response_model=schemas.Order)
+def checkout_lot(order_data: schemas.OrderCreate, request: Request, db: Session = Depends(get_db), idempotency_key: Optional[str] = Header(None)):
+    """ Alıcının eşleşen lot için EcoGrade sistemine güvenli ödeme (Escrow) geçmesi """
+    scope = f"POST /checkout/ {idempotency.client_id(request)}"
+    with idempotency.guard(db, idempotency_key, scope, order_data.model_dump()) as guard:
+        if guard.replay is not None:
+            return guard.replay
+        
+        lot = db.query(models.GuaranteedLot).filter(models.GuaranteedLot.id == order_data.lot_id).first()
+        if not lot:
+            raise HTTPException(status_code=404, detail="Lot bulunamadı")
+            
+        if lot.quantity_tons < order_data.quantity_tons:
+            raise HTTPException(status_code=400, detail="Yetersiz stok")
+        
+        # Stok düşümü çoklu alımla aynı koşullu UPDATE'ten geçer: eşzamanlı alımlar stoğu eksiye
+        # düşüremez, yarışı kaybeden 409 alır
+        (new_order,) = allocation.checkout(
+            db, [(lot.id, order_data.quantity_tons)], order_data.incoterms, buyer_id=2, # Mock buyer
+        )
+        cache_bus.bump(db, "catalog")
+        db.flush()
+        db.refresh(new_order) # Saklanan yanıt DB'deki değerlerle birebir olsun
+        guard.store(schemas.Order.model_validate(new_order).model_dump(mode="json"))
+        db.commit()
+        db.refresh(new_order)
+        return new_order
+
+@router.post("/checkout/multi", response_model=List[schemas.Order])
+def checkout_multi(order_data: schemas.MultiOrderCreate, request: Request, db: Session = Depends(get_db), idempotency_key: Optional[str] = Header(None)):
+    """ Birden fazla lottan atomik alım: tüm lotlar birlikte rezerve edilir, biri yetmezse hiçbiri """
+    if not order_data.items:
+        raise HTTPException(status_code=400, detail="En az bir kalem gerekli")
+    scope = f"POST /checkout/multi {idempotency.client_id(request)}"
+    with idempotency.guard(db, idempotency_key, scope, order_data.model_dump()) as guard:
+        if guard.replay is not None:
+            return guard.replay
+
+        orders = allocation.checkout(
+            db, [(item.lot_id, item.quantity_tons) for item in order_data.items],
+            order_data.incoterms, buyer_id=2, # Mock buyer
+        )
+        cache_bus.bump(db, "catalog")
+        db.flush()
+        for order in orders:
+            db.refresh(order)
+        guard.store([schemas.Order.model_validate(order).model_dump(mode="json") for order in orders])
+        db.commit()
+        for order in orders:
+            db.refresh(order)
+        return orders
+
+@router.get("/admin/exports/orders")
+def export_orders(format: str = "csv", start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None, payment_status: Optional[str] = None, after_id: int = 0, include_archived: bool = False, db: Session = Depends(get_read_db), current_user: models.User = Depends(require_admin)):
+    """ Finans için escrow ledger export'u — sabit bellekle parça parça akıtılır, after_id ile devam edilir; include_archived ile arşive taşınmış siparişler de gelir """
+    if format not in ledger_export.FORMATS:
+        raise HTTPException(status_code=400, detail="Geçersiz format (csv veya ndjson)")
+    # Session yield bağımlılığıdır; FastAPI onu yanıt akışı bittikten sonra kapatır
+    body = ledger_export.stream(
+        db, format,
+        start=start, end=end, payment_status=payment_status, after_id=after_id, include_archived=include_archived,
+    )
+    return StreamingResponse(
+        body,
+        media_type=ledger_export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="orders_after_{after_id}.{format}"'},
+    )
@@ -0,0 +1,29 @@
+"""Admin diagnostics: stored per-request profiles."""
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+import models
+import request_profiler
+from auth import require_admin
+
+router = APIRouter(tags=["diagnostics"], route_class=request_profiler.ProfiledRoute)
+
+@router.get("/admin/profiles")
+def list_profiles(current_user: models.User = Depends(require_admin)):
+    """ Bu süreçte alınan son profillerin özeti (yeniden eskiye) """
+    return request_profiler.recent()
+
+@router.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, current_user: models.User = Depends(require_admin)):
+    """ Profilin tamamı: süre, SQL ifadeleri ve süreleri, yığınlar """
+    artifact = request_profiler.get(profile_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Profil bulunamadı")
+    return artifact
+
+@router.get("/admin/profiles/{profile_id}/collapsed", response_class=PlainTextResponse)
+def get_profile_collapsed(profile_id: str, current_user: models.User = Depends(require_admin)):
+    """ Flame graph araçları için collapsed stacks (flamegraph.pl, speedscope) """
+    artifact = request_profiler.get(profile_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Profil bulunamadı")
+    return PlainTextResponse(request_profiler.collapsed(artifact))
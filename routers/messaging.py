@@ -0,0 +1,125 @@
+"""Buyer/seller messaging routes."""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+import models, schemas, messaging, write_behind, archive, request_profiler
+from database import get_db, get_read_db
+from auth import require_auth
+
+router = APIRouter(tags=["messaging"], route_class=request_profiler.ProfiledRoute)
+
+# --- MESSAGING ENDPOINTS ---
+@router.post("/messages/")
+def send_message(msg: schemas.MessageCreate, db: Session = Depends(get_db), current_user: models.User = Depends(require_auth)):
+    """Mesaj gönder — konuşma yoksa otomatik oluşturur"""
+    conv_id = msg.conversation_id
+    
+    if not conv_id:
+        # Kanonik çift anahtarıyla tek ifadede bul-ya-da-yarat; mesajla aynı transaction'da commit edilir
+        conv_id = messaging.find_or_create_conversation(db, current_user.id, msg.receiver_id, msg.lot_id)
+    
+    if write_behind.enabled():
+        # Grup commit: satır kısa süre tamponlanıp diğer mesajlarla tek INSERT ... RETURNING'de yazılır.
+        # Yeni konuşma önce commit edilir (upsert olduğu için tekrarında yeni oda açılmaz)
+        db.commit()
+        row = {"conversation_id": conv_id, "sender_id": current_user.id, "text": msg.text}
+        written = write_behind.write(write_behind.messages, row, db.info.get("client_key"))
+        return {
+            "id": written["id"] if written else None,
+            "conversation_id": conv_id,
+            "sender_id": current_user.id,
+            "text": msg.text,
+            "created_at": str(written["created_at"]) if written else None
+        }
+    
+    new_msg = models.Message(
+        conversation_id=conv_id,
+        sender_id=current_user.id,
+        text=msg.text
+    )
+    db.add(new_msg)
+    db.commit()
+    db.refresh(new_msg)
+    
+    return {
+        "id": new_msg.id,
+        "conversation_id": conv_id,
+        "sender_id": new_msg.sender_id,
+        "text": new_msg.text,
+        "created_at": str(new_msg.created_at)
+    }
+
+@router.get("/messages/{conversation_id}")
+def get_messages(conversation_id: int, include_archived: bool = False, db: Session = Depends(get_read_db), current_user: models.User = Depends(require_auth)):
+    """Bir konuşmadaki tüm mesajları getir (include_archived ile arşivlenmiş konuşmalar da)"""
+    conv = db.query(models.Conversation).filter(models.Conversation.id == conversation_id).first()
+    archived = False
+    if not conv and include_archived:
+        conv = archive.archived_conversation(db, conversation_id)
+        archived = conv is not None
+    if not conv:
+        raise HTTPException(status_code=404, detail="Konuşma bulunamadı")
+    if conv.buyer_id != current_user.id and conv.seller_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Bu konuşmaya erişim yetkiniz yok")
+    
+    if archived:
+        msgs = archive.archived_messages(db, conversation_id)
+    else:
+        msgs = db.query(models.Message).filter(
+            models.Message.conversation_id == conversation_id
+        ).order_by(models.Message.created_at).all()
+    
+    return [
+        {
+            "id": m.id,
+            "sender_id": m.sender_id,
+            "text": m.text,
+            "created_at": str(m.created_at),
+            "is_me": m.sender_id == current_user.id
+        }
+        for m in msgs
+    ]
+
+@router.get("/messages/inbox/list")
+def get_inbox(include_archived: bool = False, db: Session = Depends(get_read_db), current_user: models.User = Depends(require_auth)):
+    """Kullanıcının tüm konuşmalarını getir (include_archived ile arşivdekiler de, "archived": true olarak)"""
+    convs = db.query(models.Conversation).filter(
+        (models.Conversation.user_low_id == current_user.id) | 
+        (models.Conversation.user_high_id == current_user.id)
+    ).all()
+    
+    result = []
+    for conv in convs:
+        last_msg = db.query(models.Message).filter(
+            models.Message.conversation_id == conv.id
+        ).order_by(models.Message.created_at.desc()).first()
+        
+        other_id = conv.seller_id if conv.buyer_id == current_user.id else conv.buyer_id
+        other_user = db.query(models.User).filter(models.User.id == other_id).first()
+        
+        result.append({
+            "id": conv.id,
+            "lot_id": conv.lot_id,
+            "buyer_id": conv.buyer_id,
+            "seller_id": conv.seller_id,
+            "created_at": str(conv.created_at),
+            "last_message": last_msg.text if last_msg else None,
+            "other_user_name": other_user.company_name if other_user else "Bilinmiyor"
+        })
+    
+    if include_archived:
+        for conv in archive.archived_conversations_for(db, current_user.id):
+            msgs = archive.archived_messages(db, conv.id)
+            other_id = conv.seller_id if conv.buyer_id == current_user.id else conv.buyer_id
+            other_user = db.query(models.User).filter(models.User.id == other_id).first()
+            result.append({
+                "id": conv.id,
+                "lot_id": conv.lot_id,
+                "buyer_id": conv.buyer_id,
+                "seller_id": conv.seller_id,
+                "created_at": str(conv.created_at),
+                "last_message": msgs[-1].text if msgs else None,
+                "other_user_name": other_user.company_name if other_user else "Bilinmiyor",
+                "archived": True
+            })
+    
+    return result
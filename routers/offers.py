@@ -0,0 +1,217 @@
+"""Seller offers and the exper/admin review queue."""
+from fastapi import APIRouter, Depends, HTTPException, Response, Header
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import models, schemas, geo, market_stats, price_history, price_model, offer_queue, idempotency, offer_lifecycle, cache_bus, request_profiler
+from database import get_db, get_read_db
+from auth import require_auth, require_admin
+
+router = APIRouter(tags=["offers"], route_class=request_profiler.ProfiledRoute)
+
+# --- BROKER LOGIC (TRINK SAT - SELLER FLOW) ---
+def estimate_price(material_type: str, mfi: float, density: float, market_price: Optional[float] = None) -> float:
+    # AI tabanlı fiyat tahmini - MFI ve yoğunluk faktörleniyor
+    # market_price: fiyat geçmişindeki son günlük kapanış (marj dahil satış fiyatı)
+    if market_price:
+        base_price = market_price / 1.05 # EcoGrade broker marjını düş
+    else:
+        base_price = {
+            "PP": 1200, "PP-H": 1250, "PP-C": 1220, "PP-R": 1230,
+            "PE": 1100, "LDPE": 1080, "LLDPE": 1120, "HDPE": 1150, "MDPE": 1100,
+            "PVC": 900, "PVC-S": 920, "PVC-P": 880,
+            "ABS": 1500, "SAN": 1350, "ASA": 1400,
+            "PET": 1050, "PBT": 1600, "PC": 2200, "PC-ABS": 1900,
+            "POM": 1700, "PA6": 1800, "PA66": 2100,
+            "PS-GP": 1000, "PS-HI": 1050, "PMMA": 2000,
+            "rPP": 800, "rHDPE": 750, "rPET": 700,
+            "TPU": 2500, "TPE-S": 1800, "POE": 1600, "EPDM": 1900,
+            "EVA": 1300,
+            "MB-WHT": 1400, "MB-BLK": 1200, "MB-COL": 1500,
+            "CACO3": 600, "TALK": 700, "GF": 1800,
+        }.get(material_type, 1000)
+    
+    # MFI etkisi: düşük MFI = daha sert = %3 prim, yüksek MFI = %2 indirim
+    mfi_factor = 1.0
+    if mfi < 5:
+        mfi_factor = 1.03
+    elif mfi > 20:
+        mfi_factor = 0.98
+    
+    # Yoğunluk etkisi: yüksek yoğunluk = daha ağır = %2 prim
+    density_factor = 1.0
+    if density > 1.0:
+        density_factor = 1.02
+    elif density < 0.9:
+        density_factor = 0.97
+    
+    # Rastgele varyasyon (%±3) ile fiyat çeşitliliği
+    import random
+    variation = random.uniform(0.97, 1.03)
+    
+    return round(base_price * mfi_factor * density_factor * variation, 2)
+
+@router.post("/offers/", response_model=schemas.Offer)
+def create_offer(offer: schemas.OfferCreate, db: Session = Depends(get_db), current_user: models.User = Depends(require_auth), idempotency_key: Optional[str] = Header(None)):
+    """ Satıcının elindeki malı EcoGrade'e satmak için form doldurması """
+    import traceback
+    with idempotency.guard(db, idempotency_key, f"POST /offers/ user:{current_user.id}", offer.model_dump()) as guard:
+        if guard.replay is not None:
+            return guard.replay
+        try:
+            # Öncelik geçmiş lot/siparişlerden öğrenilmiş modelde; bilinmeyen malzemede tablo tahmini
+            estimated_price = price_model.predict(offer.material_type, offer.declared_mfi, offer.declared_density, offer.quantity_tons)
+            if estimated_price is None:
+                market_price = price_history.reference_price(db, offer.material_type)
+                estimated_price = estimate_price(offer.material_type, offer.declared_mfi, offer.declared_density, market_price)
+            
+            new_offer = models.Offer(
+                **offer.model_dump(), 
+                seller_id=current_user.id,
+                ai_estimated_price_usd=estimated_price,
+                status=offer_lifecycle.AWAITING_SAMPLE
+            )
+            new_offer.estimated_value_usd = offer_queue.estimated_value(new_offer)
+            geo.apply(new_offer) # custom_fields'taki konum metninden koordinat
+            db.add(new_offer)
+            offer_queue.bump_status_count(db, None, new_offer.status)
+            db.flush()
+            db.refresh(new_offer) # Saklanan yanıt DB'deki değerlerle birebir olsun
+            guard.store(schemas.Offer.model_validate(new_offer).model_dump(mode="json"))
+            db.commit()
+            db.refresh(new_offer)
+            return new_offer
+        except HTTPException:
+            raise # Kiralaması düşen istek 409 almalı, 500'e çevrilmez
+        except Exception as e:
+            with open("create_err.txt", "w") as f:
+                f.write(traceback.format_exc())
+            raise HTTPException(status_code=500, detail=str(e))
+
+# --- ADMIN / EXPER PANEL ENDPOINTS ---
+@router.get("/admin/offers/", response_model=List[schemas.Offer])
+def get_pending_offers(response: Response, order: str = "age", limit: int = offer_queue.DEFAULT_PAGE_SIZE, cursor: Optional[str] = None, unclaimed_only: bool = False, db: Session = Depends(get_read_db), current_user: models.User = Depends(require_admin)):
+    """ Exper'in test etmeyi beklediği numuneleri (ilanları) listeler — sayfalı; sonraki sayfa X-Next-Cursor başlığında """
+    if order not in offer_queue.ORDERINGS:
+        raise HTTPException(status_code=400, detail="Geçersiz sıralama (age veya value)")
+    try:
+        offers, next_cursor = offer_queue.page(db, offer_lifecycle.AWAITING_SAMPLE, order, limit, cursor, unclaimed_only)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Geçersiz cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return offers
+
+@router.get("/admin/offers/counts")
+def get_offer_counts(db: Session = Depends(get_read_db), current_user: models.User = Depends(require_admin)):
+    """ Durum bazında ilan sayıları (bakımı yapılan sayaç tablosundan) """
+    return offer_queue.status_counts(db)
+
+@router.post("/admin/offers/claim", response_model=List[schemas.Offer])
+def claim_offers(limit: int = 1, order: str = "age", db: Session = Depends(get_db), current_user: models.User = Depends(require_admin)):
+    """ Exper'in kuyruktan başka experlerle çakışmadan numune üstlenmesi (süreli kiralama) """
+    if order not in offer_queue.ORDERINGS:
+        raise HTTPException(status_code=400, detail="Geçersiz sıralama (age veya value)")
+    return offer_queue.claim(db, current_user.id, max(1, min(limit, 50)), order=order)
+
+@router.post("/admin/offers/{offer_id}/release")
+def release_offer(offer_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(require_admin)):
+    """ Üstlenilen numuneyi kuyruğa geri bırakır """
+    if not offer_queue.release(db, offer_id, current_user.id):
+        raise HTTPException(status_code=409, detail="Bu ilan sizin üzerinizde değil.")
+    return {"detail": f"İlan #{offer_id} kuyruğa geri bırakıldı."}
+
+def _transition_failed(db: Session, offer: models.Offer):
+    """Koşullu geçiş tutmadı: durum değiştiyse 400, ilan başka experin kiralamasındaysa 409."""
+    status = offer.status
+    db.rollback()
+    db.refresh(offer)
+    if offer.status == status:
+        raise HTTPException(status_code=409, detail="Bu ilan başka bir exper tarafından üstlenilmiş.")
+    raise HTTPException(status_code=400, detail="Bu ilan halihazırda onaylanmış veya reddedilmiş.")
+
+@router.post("/admin/approve_offer/{offer_id}", response_model=schemas.GuaranteedLot)
+def approve_offer(offer_id: int, lab_data: schemas.AdminApproveOffer, db: Session = Depends(get_db), current_user: models.User = Depends(require_admin)):
+    """ Exper'in test sonucunu girip ilanı onaylayarak Pazaryerine (GuaranteedLot) düşürmesi """
+    offer = db.query(models.Offer).filter(models.Offer.id == offer_id).first()
+    if not offer:
+        raise HTTPException(status_code=404, detail="İlan bulunamadı.")
+    
+    if offer.status != offer_lifecycle.AWAITING_SAMPLE:
+        raise HTTPException(status_code=400, detail="Bu ilan halihazırda onaylanmış veya reddedilmiş.")
+        
+    # Kriter Ağırlıkları (Toplam 53 Önem Puanı -> Maks 5300 skor)
+    WEIGHTS = {
+        "mfi": 5, "nem": 5, "katki": 5, "gorsel": 5, "koku": 5,
+        "yogunluk": 3, "renk": 3, "fiziksel": 3, "kirilma": 3, "cekme": 3, "dsc": 3,
+        "ambalaj": 2, "mensei": 2, "parti": 2, "cevre": 2, "yuzey": 2
+    }
+    
+    # Gelen puanlar (100 üzerinden varsayılarak) ağırlıklı olarak hesaplanıyor
+    total_weighted_score = 0
+    max_possible_weighted = 5300 # Toplam Ağırlık 53 * 100
+    
+    for key, weight in WEIGHTS.items():
+        score_val = lab_data.criteria_scores.get(key, 0)
+        total_weighted_score += (score_val * weight)
+        
+    # 0-100 Formunda Quality Score
+    final_quality_score = (total_weighted_score / max_possible_weighted) * 100 if max_possible_weighted > 0 else 0
+    
+    # Karbon / Kalite Skor A+, A, B, C hesaplama
+    if final_quality_score >= 90:
+        score_letter = "A+"
+    elif final_quality_score >= 80:
+        score_letter = "A"
+    elif final_quality_score >= 60:
+        score_letter = "B"
+    else:
+        score_letter = "C"
+        
+    # İlanı güncelle (Geçmiş versiyonla uyumlu alan güncellemeleri, veya null bırakılabilir)
+    # offer'ın kendi içindeki lab_mfi, lab_density alanları eski yapıda kaldı o yüzden opsiyonellerse geçelim
+    # Şimdilik enjekte edebileceğim lab_mfi ve lab_density null olarak kalabilir, ana olan criteria scores oldu.
+    # Koşullu UPDATE: eşzamanlı ikinci onay (ya da tekrar denenen istek) ve başka experin
+    # üstlendiği numune burada elenir, lot iki kez yayınlanmaz
+    if not offer_lifecycle.approve(db, offer.id, current_user.id):
+        _transition_failed(db, offer)
+    
+    # Satış Havuzuna Orijinal olarak düşür
+    selling_price = (offer.ai_estimated_price_usd or 1000.0) * 1.05 # EcoGrade broker marjı (%5)
+    
+    new_lot = models.GuaranteedLot(
+        original_offer_id=offer.id,
+        material_type=offer.material_type,
+        mfi=offer.declared_mfi,  # Öncül MFI, artık esas puan skor oldu.
+        density=offer.declared_density,
+        quantity_tons=offer.quantity_tons,
+        selling_price_usd=selling_price,
+        carbon_score=score_letter,
+        quality_score_numeric=final_quality_score,
+        is_active=True
+    )
+    geo.apply(new_lot, offer.latitude, offer.longitude)
+    
+    db.add(new_lot)
+    market_stats.apply_lot_change(db, None, market_stats.lot_state(new_lot))
+    price_history.record_event(db, new_lot, "listing", selling_price)
+    cache_bus.bump(db, "catalog")
+    db.commit()
+    db.refresh(new_lot)
+    return new_lot
+
+@router.post("/admin/reject_offer/{offer_id}")
+def reject_offer(offer_id: int, data: schemas.AdminRejectOffer = None, db: Session = Depends(get_db), current_user: models.User = Depends(require_admin)):
+    """ Exper'in numuneyi uygun bulmayıp ilanı reddetmesi """
+    offer = db.query(models.Offer).filter(models.Offer.id == offer_id).first()
+    if not offer:
+        raise HTTPException(status_code=404, detail="İlan bulunamadı.")
+    if not offer_lifecycle.can_transition(offer.status, offer_lifecycle.REJECTED):
+        raise HTTPException(status_code=400, detail="Bu ilan halihazırda onaylanmış veya reddedilmiş.")
+    
+    if not offer_lifecycle.reject(db, offer.id, offer.status, current_user.id):
+        _transition_failed(db, offer)
+    if data and data.reason:
+        db.refresh(offer)
+        offer.custom_fields = {**(offer.custom_fields or {}), "rejection_reason": data.reason}
+    db.commit()
+    return {"detail": f"İlan #{offer_id} reddedildi."}
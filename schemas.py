@@ -59,6 +59,11 @@ class Offer(OfferBase):
     ai_estimated_price_usd: Optional[float] = None
     lab_mfi: Optional[float] = None
     lab_density: Optional[float] = None
+    estimated_value_usd: Optional[float] = None
+    claimed_by: Optional[int] = None
+    lease_expires_at: Optional[datetime] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     created_at: datetime
 
     class Config:
@@ -67,6 +72,9 @@ class Offer(OfferBase):
 class AdminApproveOffer(BaseModel):
     criteria_scores: dict[str, int]  # 16 Kriterli test tablosu puanları (0-100 arası)
 
+class AdminRejectOffer(BaseModel):
+    reason: Optional[str] = None
+
 # GUARANTEED LOT SCHEMAS
 class GuaranteedLotBase(BaseModel):
     material_type: str
@@ -86,6 +94,10 @@ class GuaranteedLot(GuaranteedLotBase):
     original_offer_id: int
     is_active: bool
     seller_name: Optional[str] = None
+    match_score: Optional[float] = None # Sadece eşleştirme uçlarında dolu (0-100)
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    distance_km: Optional[float] = None # Sadece konum bazlı sorgularda dolu
 
     class Config:
         from_attributes = True
@@ -115,6 +127,21 @@ class PurchaseRequest(RequestBase):
     class Config:
         from_attributes = True
 
+class MatchWeights(BaseModel):
+    """Eşleştirme puanı ağırlıkları (query parametresi); boş bırakılan varsayılanı kullanır."""
+    w_mfi: Optional[float] = None
+    w_density: Optional[float] = None
+    w_price: Optional[float] = None
+    w_quality: Optional[float] = None
+    w_quantity: Optional[float] = None
+
+class BuyerLocation(BaseModel):
+    """Alıcının tesis konumu (query parametresi): koordinat ya da yer adı ("Gebze / Kocaeli")."""
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    near: Optional[str] = None
+    incoterms: Optional[str] = "EXW"
+
 # ORDER (ESCROW) SCHEMAS
 class OrderBase(BaseModel):
     lot_id: int
@@ -134,6 +161,15 @@ class Order(OrderBase):
     class Config:
         from_attributes = True
 
+class MultiOrderItem(BaseModel):
+    lot_id: int
+    quantity_tons: float
+
+class MultiOrderCreate(BaseModel):
+    """Birden fazla lottan tek seferde (hepsi ya da hiçbiri) alım; kalemler /requests/{id}/allocation çıktısından gelebilir."""
+    items: List[MultiOrderItem]
+    incoterms: Optional[str] = "EXW"
+
 # MESSAGE SCHEMAS
 class MessageCreate(BaseModel):
     conversation_id: Optional[int] = None
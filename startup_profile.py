@@ -0,0 +1,90 @@
+"""Import-time / cold-start profiler for the app entry point.
+
+Giriş modülü (varsayılan `main`) temiz bir alt süreçte `python -X importtime` ile import
+edilir; modül başına kendi ve kümülatif import süresi raporlanır. İlk kullanımda yüklenmesi
+gereken ağır bağımlılıklar (jose, passlib, numpy, pandas ...) import sırasında yüklenmişse
+ya da toplam süre bütçeyi aşarsa sıfırdan farklı kodla çıkar — CI'da kontrol olarak çalışır:
+
+    python startup_profile.py --budget-ms 1500
+    python startup_profile.py --module main --top 40
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from typing import List, Tuple
+
+# Giriş modülü import edilirken yüklenmemesi gereken paketler (ilk kullanımda yüklenirler)
+LAZY_MODULES = ("jose", "passlib", "bcrypt", "numpy", "pandas", "openpyxl")
+DEFAULT_TOP = 25
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(module: str = "main") -> Tuple[List[dict], float]:
+    """(importtime satırları, toplam ms). Her satır: name, depth, self_ms, cumulative_ms."""
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+    # Lokal SQLite dosyası (init_db) depoyu kirletmesin diye geçici dizinde çalışır
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))}
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=workdir, env=env, capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        raise SystemExit(f"{module} import edilemedi:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append({
+            "name": name.strip(), "depth": depth,
+            "self_ms": int(self_us) / 1000.0, "cumulative_ms": int(cumulative_us) / 1000.0,
+        })
+    total_ms = float(proc.stdout.strip().splitlines()[-1])
+    return rows, total_ms
+
+
+def by_package(rows: List[dict]) -> List[Tuple[str, float]]:
+    """Kendi sürelerin üst paket bazında toplamı (sqlalchemy, fastapi, pydantic, models ...)."""
+    totals = {}
+    for row in rows:
+        package = row["name"].split(".")[0]
+        totals[package] = totals.get(package, 0.0) + row["self_ms"]
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def report(module: str, rows: List[dict], total_ms: float, top: int):
+    print(f"`import {module}`: {total_ms:.1f} ms, {len(rows)} modül")
+    print(f"\nEn pahalı {top} modül (kümülatif):")
+    print(f"{'kümülatif ms':>13} {'kendi ms':>9}  modül")
+    for row in sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]:
+        print(f"{row['cumulative_ms']:13.1f} {row['self_ms']:9.1f}  {'  ' * row['depth']}{row['name']}")
+    print("\nPaket bazında (kendi süre toplamı):")
+    for package, ms in by_package(rows)[:top]:
+        print(f"{ms:13.1f}  {package}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Giriş modülünün import süresi profili")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP)
+    parser.add_argument("--budget-ms", type=float, help="Toplam import süresi bunu aşarsa çıkış kodu 1")
+    parser.add_argument("--allow-eager", action="store_true", help="LAZY_MODULES import edilse de hata verme")
+    args = parser.parse_args()
+
+    rows, total_ms = measure(args.module)
+    report(args.module, rows, total_ms, args.top)
+
+    failed = False
+    loaded = {row["name"].split(".")[0] for row in rows}
+    eager = [name for name in LAZY_MODULES if name in loaded]
+    if eager and not args.allow_eager:
+        print(f"\nHATA: ilk kullanımda yüklenmesi gereken modüller import sırasında yüklendi: {', '.join(eager)}")
+        failed = True
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"\nHATA: import süresi {total_ms:.1f} ms, bütçe {args.budget_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,120 @@
+"""Ortak test fixture'ları: geçici dizinde izole SQLite veritabanı ve TestClient.
+
+database.py lokal modda `./broker.db` yolunu engine oluşturulurken çalışma dizinine göre
+çözer; bu yüzden `database` geçici dizindeyken import edilir. Katalog görüntüsü ve fiyat modeli
+dosyası da aynı dizine yazılır.
+"""
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WORKDIR = tempfile.mkdtemp(prefix="broker-tests-")
+os.environ["CATALOG_SNAPSHOT_PATH"] = os.path.join(WORKDIR, "catalog.snap")
+os.environ["PRICE_MODEL_PATH"] = os.path.join(WORKDIR, "price_model.json")
+
+_cwd = os.getcwd()
+os.chdir(WORKDIR)
+try:
+    from database import Base, SessionLocal, engine, init_db
+finally:
+    os.chdir(_cwd)
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+import cache_bus
+import catalog_snapshot
+import models
+import offer_lifecycle
+import rate_limit
+
+# Uygulama genelindeki limitler testleri kısmasın; 429 davranışı ayrı test edilir
+os.environ["RATE_LIMITS"] = json.dumps({rule: [1000.0, 1000] for rule in [*rate_limit.ROUTE_LIMITS, "* /"]})
+init_db()
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """Her test boş tablolarla ve sıfırlanmış süreç içi önbelleklerle başlar."""
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+        has_sequence = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'")).first()
+        if has_sequence:
+            conn.execute(text("DELETE FROM sqlite_sequence"))
+    cache_bus._versions.clear()
+    for cache in cache_bus._caches.values():
+        cache._data.clear()
+    catalog_snapshot._state.update(snapshot=None, key=None, checked=0.0)
+    if os.path.exists(catalog_snapshot.SNAPSHOT_PATH):
+        os.remove(catalog_snapshot.SNAPSHOT_PATH)
+    yield
+
+
+@pytest.fixture(scope="session")
+def client():
+    import main
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def register(client):
+    """Kullanıcı kaydeder, (Authorization başlığı, kullanıcı id) döndürür; role verilirse DB'de atanır."""
+    def _register(email: str, role: str = None):
+        response = client.post("/auth/register", json={
+            "company_name": email.split("@")[0], "email": email, "password": "secret123",
+        })
+        assert response.status_code == 200, response.text
+        user_id = response.json()["user"]["id"]
+        if role is not None:
+            with SessionLocal() as session:
+                session.query(models.User).filter(models.User.id == user_id).update({"role": role})
+                session.commit()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}, user_id
+    return _register
+
+
+@pytest.fixture
+def admin(register):
+    """DB'de admin rolü verilmiş exper: (Authorization başlığı, kullanıcı id)."""
+    return register("expert@example.com", role="admin")
+
+
+@pytest.fixture
+def make_lot(db):
+    """Doğrudan DB'ye aktif bir GuaranteedLot yazar (istatistik delta'ları olmadan).
+
+    original_offer_id verilmezse lotun arkasına onaylanmış bir ilan eklenir; lot yanıt
+    şeması bu alanı zorunlu tutar.
+    """
+    def _make_lot(**values):
+        values = {"mfi": 10.0, "density": 0.9, **values}
+        if "original_offer_id" not in values:
+            offer = models.Offer(
+                material_type=values.get("material_type", "PP"), material_form="Granül",
+                declared_mfi=values.get("mfi"), declared_density=values.get("density"),
+                quantity_tons=values.get("quantity_tons", 10.0), status=offer_lifecycle.APPROVED,
+            )
+            db.add(offer)
+            db.flush()
+            values["original_offer_id"] = offer.id
+        lot = models.GuaranteedLot(**{
+            "material_type": "PP", "material_form": "Granül", "quantity_tons": 10.0,
+            "selling_price_usd": 1000.0, "carbon_score": "B", "is_active": True, **values,
+        })
+        db.add(lot)
+        db.commit()
+        db.refresh(lot)
+        return lot
+    return _make_lot
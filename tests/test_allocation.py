@@ -0,0 +1,130 @@
+import threading
+import market_stats
+import models
+
+REQUEST = {
+    "material_type": "PP", "min_mfi": 8.0, "max_mfi": 12.0,
+    "min_density": 0.85, "max_density": 0.95, "target_quantity_tons": 12.0,
+}
+
+
+def _lot(make_lot, price, tons, quality=80.0):
+    return make_lot(mfi=10.0, density=0.9, selling_price_usd=price, quantity_tons=tons, quality_score_numeric=quality).id
+
+
+def _stored_request(db, **overrides):
+    request = models.PurchaseRequest(buyer_id=1, **dict(REQUEST, **overrides))
+    db.add(request)
+    db.commit()
+    return request.id
+
+
+def test_allocation_fills_cheapest_first_with_partial_last(client, db, make_lot):
+    expensive = _lot(make_lot, 1500.0, 20.0)
+    cheap = _lot(make_lot, 900.0, 5.0)
+    middle = _lot(make_lot, 1100.0, 4.0)
+    request_id = _stored_request(db)
+
+    result = client.get(f"/requests/{request_id}/allocation").json()
+    assert [(p["lot_id"], p["quantity_tons"]) for p in result["lots"]] == [(cheap, 5.0), (middle, 4.0), (expensive, 3.0)]
+    assert result["allocated_tons"] == 12.0
+    assert result["shortfall_tons"] == 0.0
+    assert result["total_usd"] == 5 * 900.0 + 4 * 1100.0 + 3 * 1500.0
+    assert result["request_id"] == request_id
+
+
+def test_allocation_reports_shortfall_and_quality_filter(client, db, make_lot):
+    _lot(make_lot, 900.0, 5.0, quality=50.0)
+    good = _lot(make_lot, 1100.0, 4.0, quality=90.0)
+    request_id = _stored_request(db)
+
+    result = client.get(f"/requests/{request_id}/allocation", params={"min_quality": 70}).json()
+    assert [p["lot_id"] for p in result["lots"]] == [good]
+    assert result["shortfall_tons"] == 8.0
+    assert client.get("/requests/999/allocation").status_code == 404
+
+
+def test_multi_checkout_reserves_all_lots_together(client, db, make_lot):
+    first, second = _lot(make_lot, 1000.0, 10.0), _lot(make_lot, 1200.0, 2.0)
+    response = client.post("/checkout/multi", json={"items": [
+        {"lot_id": first, "quantity_tons": 4.0}, {"lot_id": second, "quantity_tons": 2.0},
+    ]})
+    assert response.status_code == 200, response.text
+    assert sorted(o["lot_id"] for o in response.json()) == [first, second]
+    assert db.get(models.GuaranteedLot, first).quantity_tons == 6.0
+    # Tamamı alınan lot katalogdan düşer
+    assert db.get(models.GuaranteedLot, second).is_active is False
+
+
+def test_multi_checkout_shortfall_reserves_nothing(client, db, make_lot):
+    first, second = _lot(make_lot, 1000.0, 10.0), _lot(make_lot, 1200.0, 2.0)
+    body = {"items": [{"lot_id": first, "quantity_tons": 5.0}, {"lot_id": second, "quantity_tons": 3.0}]}
+
+    response = client.post("/checkout/multi", json=body, headers={"Idempotency-Key": "multi-1"})
+    assert response.status_code == 409
+    assert f"Lot #{second}" in response.json()["detail"]
+    # İlk lotun düşümü de geri alınmış olmalı
+    db.expire_all()
+    assert db.get(models.GuaranteedLot, first).quantity_tons == 10.0
+    assert db.get(models.GuaranteedLot, second).quantity_tons == 2.0
+    assert db.query(models.Order).count() == 0
+    assert db.query(models.MarketStat).count() == 0
+
+    # Başarısız istek anahtarı tüketmez: stok gelince aynı anahtarla tekrar denenebilir
+    db.query(models.GuaranteedLot).filter(models.GuaranteedLot.id == second).update({"quantity_tons": 3.0})
+    db.commit()
+    retry = client.post("/checkout/multi", json=body, headers={"Idempotency-Key": "multi-1"})
+    assert retry.status_code == 200, retry.text
+    assert db.query(models.Order).count() == 2
+
+
+def test_multi_checkout_rejects_unknown_lot(client, make_lot):
+    lot_id = _lot(make_lot, 1000.0, 10.0)
+    response = client.post("/checkout/multi", json={"items": [
+        {"lot_id": lot_id, "quantity_tons": 1.0}, {"lot_id": 999, "quantity_tons": 1.0},
+    ]})
+    assert response.status_code == 404
+
+
+def test_concurrent_single_lot_checkouts_never_oversell(client, db, make_lot):
+    lot_id = _lot(make_lot, 1000.0, 10.0)
+    market_stats.rebuild(db)
+    barrier = threading.Barrier(8)
+    statuses = []
+
+    def buy():
+        barrier.wait()
+        statuses.append(client.post("/checkout/", json={"lot_id": lot_id, "quantity_tons": 2.0}).status_code)
+
+    threads = [threading.Thread(target=buy) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses.count(200) == 5
+    assert set(statuses) <= {200, 400, 409}
+    db.expire_all()
+    lot = db.get(models.GuaranteedLot, lot_id)
+    assert lot.quantity_tons == 0.0 and lot.is_active is False
+    assert db.query(models.Order).count() == 5
+    assert market_stats.verify(db) == []
+
+
+def test_multi_checkout_locks_stats_in_material_order(client, db, make_lot, monkeypatch):
+    # Lot id sırası PP, PE; istatistik kilitleri yine de malzeme adına göre PE, PP alınmalı
+    pp = make_lot(material_type="PP", quantity_tons=10.0).id
+    pe = make_lot(material_type="PE", quantity_tons=10.0).id
+    locked = []
+    original = market_stats._get_stat
+
+    def spy(session, material_type):
+        locked.append(material_type)
+        return original(session, material_type)
+
+    monkeypatch.setattr(market_stats, "_get_stat", spy)
+    response = client.post("/checkout/multi", json={"items": [
+        {"lot_id": pp, "quantity_tons": 1.0}, {"lot_id": pe, "quantity_tons": 1.0},
+    ]})
+    assert response.status_code == 200, response.text
+    assert locked[:2] == ["PE", "PP"]
@@ -0,0 +1,72 @@
+import datetime
+from sqlalchemy import select
+import archive
+import market_stats
+import models
+
+LONG_AGO = datetime.datetime(2000, 1, 1)
+
+
+def _settle_all(db):
+    db.query(models.Order).update({"payment_status": "Released_to_Seller", "created_at": LONG_AGO})
+    db.commit()
+
+
+def test_archive_round_trip(db, make_lot):
+    sold_out = make_lot(quantity_tons=0.0, is_active=False)
+    live = make_lot()
+    db.add(models.Order(buyer_id=1, lot_id=sold_out.id, quantity_tons=5.0, total_amount_usd=5000.0,
+                        payment_status="Released_to_Seller", created_at=LONG_AGO))
+    db.add(models.Order(buyer_id=1, lot_id=live.id, quantity_tons=1.0, total_amount_usd=1000.0,
+                        payment_status="Escrow_Funded", created_at=LONG_AGO))
+    conversation = models.Conversation(buyer_id=1, seller_id=2, user_low_id=1, user_high_id=2, lot_key=0, created_at=LONG_AGO)
+    db.add(conversation)
+    db.flush()
+    db.add(models.Message(conversation_id=conversation.id, sender_id=1, text="Merhaba", created_at=LONG_AGO))
+    db.commit()
+    conversation_id, sold_out_id, live_id = conversation.id, sold_out.id, live.id
+
+    assert archive.run(db, dry_run=True) == {"orders": 1, "conversations": 1, "lots": 0}
+    assert archive.run(db) == {"orders": 1, "conversations": 1, "lots": 1}
+
+    # Açık sipariş ve aktif lot sıcak tabloda kalır
+    assert [o.payment_status for o in db.query(models.Order).all()] == ["Escrow_Funded"]
+    assert [lot.id for lot in db.query(models.GuaranteedLot).all()] == [live_id]
+    assert db.query(models.Conversation).count() == 0
+
+    all_orders = archive.orders_source(include_archived=True)
+    assert db.execute(select(all_orders.c.total_amount_usd).order_by(all_orders.c.id)).scalars().all() == [5000.0, 1000.0]
+    all_lots = archive.lots_source(include_archived=True)
+    assert sorted(db.execute(select(all_lots.c.id)).scalars()) == [sold_out_id, live_id]
+    assert archive.archived_conversation(db, conversation_id).id == conversation_id
+    assert [m.text for m in archive.archived_messages(db, conversation_id)] == ["Merhaba"]
+
+    # İkinci çalıştırma taşıyacak satır bulmaz
+    assert archive.run(db) == {"orders": 0, "conversations": 0, "lots": 0}
+
+
+def test_archived_ids_are_not_reused(db, make_lot):
+    first_id = make_lot(is_active=False).id
+    assert archive.archive_lots(db) == 1
+    # En büyük id arşive taşındı; yeni lot aynı id'yi almamalı
+    assert make_lot(is_active=False).id > first_id
+    assert archive.archive_lots(db) == 1
+    assert db.query(models.guaranteed_lots_archive).count() == 2
+
+
+def test_market_stats_survive_archiving(client, db, make_lot):
+    lot = make_lot(quantity_tons=10.0, selling_price_usd=1000.0)
+    market_stats.rebuild(db)
+    for tons in (4.0, 6.0):
+        response = client.post("/checkout/", json={"lot_id": lot.id, "quantity_tons": tons})
+        assert response.status_code == 200, response.text
+    _settle_all(db)
+    assert market_stats.verify(db) == []
+
+    assert archive.run(db) == {"orders": 2, "conversations": 0, "lots": 1}
+    assert market_stats.verify(db) == []
+
+    market_stats.rebuild(db)
+    stat = db.query(models.MarketStat).filter(models.MarketStat.material_type == "PP").one()
+    assert (stat.order_count, stat.sold_tons, stat.sold_amount_usd) == (2, 10.0, 10000.0)
+    assert stat.active_lot_count == 0
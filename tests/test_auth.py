@@ -0,0 +1,56 @@
+import models
+import request_profiler
+
+
+def test_register_ignores_client_supplied_role(client, db):
+    response = client.post("/auth/register", json={
+        "company_name": "Mallory", "email": "mallory@example.com", "password": "secret123", "role": "admin",
+    })
+    assert response.status_code == 200
+    assert response.json()["user"]["role"] == "user"
+    assert db.query(models.User).filter(models.User.email == "mallory@example.com").one().role == "user"
+
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/admin/profiles", headers=headers).status_code == 403
+    # Profil istemek de admin yetkisi ister
+    assert client.get("/auth/me", headers={**headers, "X-Profile": "sample"}).status_code == 403
+
+
+def test_admin_role_granted_in_db_opens_admin_endpoints(client, register):
+    headers, _ = register("ops@example.com", role="admin")
+    assert client.get("/admin/profiles", headers=headers).status_code == 200
+    response = client.get("/auth/me", headers={**headers, "X-Profile": "sample"})
+    assert "X-Profile-Id" in response.headers
+
+
+def test_profile_records_sql_and_stacks_then_rate_limits(client, register):
+    headers, _ = register("profiler@example.com", role="admin")
+
+    sampled = client.get("/auth/me", headers={**headers, "X-Profile": "sample"})
+    assert sampled.status_code == 200
+    artifact = client.get(f"/admin/profiles/{sampled.headers['X-Profile-Id']}", headers=headers).json()
+    assert artifact["mode"] == "sample"
+    assert artifact["sql_count"] > 0
+    assert all(item["statement"] and item["duration_ms"] >= 0 for item in artifact["sql"])
+
+    traced = client.get("/auth/me", params={"_profile": "trace"}, headers=headers)
+    assert traced.status_code == 200
+    profile_id = traced.headers["X-Profile-Id"]
+    artifact = client.get(f"/admin/profiles/{profile_id}", headers=headers).json()
+    assert (artifact["mode"], artifact["stack_unit"]) == ("trace", "microseconds")
+    assert artifact["sql_count"] > 0
+    lines = client.get(f"/admin/profiles/{profile_id}/collapsed", headers=headers).text.splitlines()
+    assert lines
+    for line in lines:
+        stack, _, weight = line.rpartition(" ")
+        assert stack and int(weight) > 0
+    assert any(";" in line for line in lines)
+    assert profile_id in [p["id"] for p in client.get("/admin/profiles", headers=headers).json()]
+
+    # Profilsiz istekler kovadan yemez; profilli istekler PROFILE_BURST'ten sonra 429 alır
+    assert "X-Profile-Id" not in client.get("/auth/me", headers=headers).headers
+    for _ in range(request_profiler.BURST - 2):
+        assert client.get("/auth/me", headers={**headers, "X-Profile": "sample"}).status_code == 200
+    limited = client.get("/auth/me", headers={**headers, "X-Profile": "sample"})
+    assert limited.status_code == 429
+    assert "Retry-After" in limited.headers
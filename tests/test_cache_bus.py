@@ -0,0 +1,77 @@
+import datetime
+import time
+import cache_bus
+import models
+from database import engine
+
+
+def _counting_cache(name):
+    calls = []
+    cache = cache_bus.LocalCache(name, ("catalog",))
+
+    def load():
+        calls.append(1)
+        return len(calls)
+
+    return cache, load, calls
+
+
+def test_bump_is_applied_locally_only_after_commit(db):
+    assert cache_bus.bump(db, "catalog") == 1
+    assert cache_bus.version("catalog") is None
+    db.commit()
+    assert cache_bus.version("catalog") == 1
+    assert db.query(models.ChangeLog).filter(models.ChangeLog.version == 1).count() == 1
+
+    cache_bus.bump(db, "catalog")
+    db.rollback()
+    # Geri alınan yazım ne sürümü artırır ne de olay bırakır
+    assert cache_bus.version("catalog") == 1
+    assert db.get(models.EntityVersion, "catalog").version == 1
+
+
+def test_local_cache_reloads_after_bump(db):
+    cache, load, calls = _counting_cache("test-reload")
+    assert cache.get("k", load) == 1
+    assert cache.get("k", load) == 1
+    cache_bus.bump(db, "catalog")
+    db.commit()
+    assert cache.get("k", load) == 2
+    assert cache.hits == 1 and cache.evictions == 1
+
+
+def test_stale_and_duplicate_events_are_ignored():
+    seen = []
+    cache_bus.subscribe("test-entity", lambda entity, version: seen.append(version))
+    for version in (3, 3, 2, 4):
+        cache_bus._dispatch("test-entity", version)
+    assert seen == [3, 4]
+
+
+def test_other_workers_writes_arrive_through_change_log():
+    cache, load, calls = _counting_cache("test-remote")
+    cache_bus.ensure_started()
+    assert cache.get("k", load) == 1
+
+    # Başka bir worker'ın commit'i: bu süreçte after_commit çalışmaz, olay sadece change_log'dan gelir.
+    # Dinleyicinin son gördüğü id önceki testlerden yüksek kalmış olabilir, bu yüzden id büyük seçilir
+    with engine.begin() as conn:
+        conn.execute(models.EntityVersion.__table__.insert().values(entity="catalog", version=7))
+        conn.execute(models.ChangeLog.__table__.insert().values(
+            id=10 ** 9, entity="catalog", version=7, created_at=datetime.datetime.now(datetime.timezone.utc),
+        ))
+    deadline = time.monotonic() + 5
+    while cache_bus.version("catalog") != 7 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert cache_bus.version("catalog") == 7
+    assert cache.get("k", load) == 2
+    assert cache_bus.metrics()["received"] >= 1
+
+
+def test_cache_metrics_require_admin(client, register, admin):
+    headers, _ = register("buyer@example.com")
+    assert client.get("/admin/cache/metrics").status_code == 401
+    assert client.get("/admin/cache/metrics", headers=headers).status_code == 403
+    response = client.get("/admin/cache/metrics", headers=admin[0])
+    assert response.status_code == 200
+    assert "snapshot" in response.json()
@@ -0,0 +1,62 @@
+import catalog_import
+import models
+
+OFFER_MAPPING = {
+    "target": "offers",
+    "columns": {"Kod": "product_code", "Malzeme": "material_type", "Ton": "quantity_tons",
+                "Fiyat": "ai_estimated_price_usd", "Satıcı": "seller_id", "MFI": "declared_mfi",
+                "Yoğunluk": "declared_density"},
+}
+LOT_MAPPING = {
+    "target": "lots",
+    "columns": {"Kod": "product_code", "Malzeme": "material_type", "Ton": "quantity_tons",
+                "Fiyat": "selling_price_usd"},
+}
+
+
+def _import(db, rows, mapping):
+    return catalog_import.run_import(db, iter(rows), mapping=mapping, progress=lambda message: None)
+
+
+def test_reimport_keeps_approved_offer_approved(client, db, register, admin):
+    headers, _ = admin
+    _, seller_id = register("seller@example.com")
+    row = {"Kod": "SUP-1", "Malzeme": "PP", "Ton": "12", "Fiyat": "900", "Satıcı": str(seller_id),
+           "MFI": "12", "Yoğunluk": "0.91"}
+    _import(db, [row], OFFER_MAPPING)
+    offer = db.query(models.Offer).filter(models.Offer.product_code == "SUP-1").one()
+    assert offer.status == "AwaitingSample"
+
+    response = client.post(f"/admin/approve_offer/{offer.id}", json={"criteria_scores": {"mfi": 90}}, headers=headers)
+    assert response.status_code == 200, response.text
+
+    _import(db, [dict(row, Ton="15")], OFFER_MAPPING)
+    db.expire_all()
+    offer = db.query(models.Offer).filter(models.Offer.product_code == "SUP-1").one()
+    assert offer.status == "Approved"
+    assert offer.quantity_tons == 15.0
+
+    # Yeniden onay denemesi ikinci bir lot üretmez
+    response = client.post(f"/admin/approve_offer/{offer.id}", json={"criteria_scores": {"mfi": 90}}, headers=headers)
+    assert response.status_code == 400
+    assert db.query(models.GuaranteedLot).filter(models.GuaranteedLot.original_offer_id == offer.id).count() == 1
+
+
+def test_reimport_upserts_without_nulling_missing_columns(db):
+    report = _import(db, [
+        {"Kod": "LOT-1", "Malzeme": "PE", "Ton": "5", "Fiyat": "1200"},
+        {"Kod": "LOT-2", "Malzeme": "PP", "Ton": "8", "Fiyat": "950"},
+    ], LOT_MAPPING)
+    assert report["written"] == 2
+    lot = db.query(models.GuaranteedLot).filter(models.GuaranteedLot.product_code == "LOT-1").one()
+    lot.is_active = False # satılıp kapanmış lot
+    db.commit()
+
+    # Fiyat kolonu boş gelen satır mevcut fiyatı silmez, durum kolonu geri açılmaz
+    _import(db, [{"Kod": "LOT-1", "Malzeme": "PE", "Ton": "7", "Fiyat": ""}], LOT_MAPPING)
+    db.expire_all()
+    lots = db.query(models.GuaranteedLot).order_by(models.GuaranteedLot.product_code).all()
+    assert [lot.product_code for lot in lots] == ["LOT-1", "LOT-2"]
+    assert lots[0].quantity_tons == 7.0
+    assert lots[0].selling_price_usd == 1200.0
+    assert lots[0].is_active is False
@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import event
+import cache_bus
+import catalog_snapshot
+import database
+
+
+@pytest.fixture
+def cold_instance(monkeypatch):
+    """Bus henüz senkronize olmamış (soğuk başlamış) instance."""
+    monkeypatch.setattr(cache_bus, "started", lambda: False)
+    monkeypatch.setattr(cache_bus, "start_in_background", lambda: None)
+
+
+def test_snapshot_round_trip(db, make_lot):
+    lot = make_lot(material_type="PE", selling_price_usd=1234.5, mfi=None)
+    cache_bus.bump(db, "catalog")
+    db.commit()
+    report = catalog_snapshot.export(db)
+    assert not report.get("skipped")
+
+    snapshot = catalog_snapshot.Snapshot(catalog_snapshot.SNAPSHOT_PATH)
+    assert snapshot.count == 1
+    (row,) = list(snapshot.lots())
+    assert (row.id, row.material_type, row.selling_price_usd, row.mfi) == (lot.id, "PE", 1234.5, None)
+    assert catalog_snapshot.export(db)["skipped"] is True
+
+
+def _exported(db, make_lot):
+    make_lot()
+    cache_bus.bump(db, "catalog")
+    db.commit()
+    catalog_snapshot.export(db)
+
+
+def test_cold_instance_serves_recent_snapshot_without_touching_db(db, make_lot, cold_instance):
+    _exported(db, make_lot)
+    connects = []
+    record = lambda connection: connects.append(connection)
+    event.listen(database.engine, "engine_connect", record)
+    try:
+        snapshot = catalog_snapshot.current()
+    finally:
+        event.remove(database.engine, "engine_connect", record)
+    assert snapshot is not None and snapshot.count == 1
+    assert connects == [] # soğuk istek yolunda DB'ye gidilmez
+
+
+def test_cold_instance_ignores_snapshot_older_than_max_age(db, make_lot, cold_instance, monkeypatch):
+    _exported(db, make_lot)
+    monkeypatch.setattr(catalog_snapshot, "MAX_AGE_SECONDS", -1.0)
+    assert catalog_snapshot.current() is None
+    assert catalog_snapshot.metrics()["stale"] >= 1
+
+
+def test_snapshot_dropped_once_bus_knows_newer_version(db, make_lot, monkeypatch):
+    _exported(db, make_lot)
+    monkeypatch.setattr(cache_bus, "started", lambda: True)
+    assert catalog_snapshot.current() is not None
+
+    # Başka bir instance katalogu değiştirdi; bus sürümü yükleyince görüntü bırakılır
+    cache_bus._dispatch("catalog", cache_bus.version("catalog") + 1)
+    assert catalog_snapshot.current() is None
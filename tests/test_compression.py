@@ -0,0 +1,54 @@
+import gzip
+import json
+import pytest
+import compression
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("deflate, gzip;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("*", compression.encodings()[0]),
+    ("identity", None),
+])
+def test_negotiate(header, expected):
+    assert compression.negotiate(header) == expected
+
+
+def test_precompressed_serves_stable_variants():
+    payload = compression.Precompressed([{"id": i, "name": "PP Granül"} for i in range(200)])
+    response = payload.response("gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(response.body) == payload.body
+    # Aynı gövde bir kez sıkıştırılır ve her istekte aynı baytlar döner
+    assert payload.response("gzip").body is response.body
+    assert payload.sizes()["gzip"] < payload.sizes()["identity"]
+
+    assert payload.response("gzip", if_none_match=payload.etag).status_code == 304
+    small = compression.Precompressed({"ok": True})
+    assert "content-encoding" not in small.response("gzip").headers
+
+
+def test_products_endpoint_is_compressed_and_revalidated(client, make_lot):
+    for i in range(30):
+        make_lot(custom_fields={"Konum": "Gebze / Kocaeli", "not": f"lot {i}"})
+
+    response = client.get("/products/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()) == 30
+    etag = response.headers["etag"]
+
+    assert client.get("/products/", headers={"If-None-Match": etag}).status_code == 304
+
+    # Katalog değişince ETag değişir, eski ETag artık 304 almaz
+    lot_id = response.json()[0]["id"]
+    assert client.put(f"/products/{lot_id}", json={"selling_price_usd": 1234.0}).status_code == 200
+    fresh = client.get("/products/", headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert fresh.status_code == 200
+    assert "content-encoding" not in fresh.headers
+    assert fresh.headers["etag"] != etag
+    assert next(p for p in json.loads(fresh.content) if p["id"] == lot_id)["selling_price_usd"] == 1234.0
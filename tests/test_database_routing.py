@@ -0,0 +1,61 @@
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import database
+import models
+
+
+@pytest.fixture
+def broken_replica(monkeypatch, tmp_path):
+    """Erişilemeyen bir replika (var olmayan dizindeki SQLite dosyası)."""
+    replica = create_engine(f"sqlite:///{tmp_path}/yok/replica.db")
+    monkeypatch.setattr(database, "read_engine", replica)
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=replica))
+    monkeypatch.setattr(database, "_replica_down_until", 0.0)
+    return replica
+
+
+class _Request:
+    def __init__(self, token=None, host="10.0.0.1"):
+        self.headers = {"authorization": f"Bearer {token}"} if token else {}
+        self.client = type("Client", (), {"host": host})()
+
+
+def test_replica_session_rejects_writes():
+    db = database.ReadSessionLocal()
+    try:
+        db.add(models.User(email="x@example.com", company_name="x", hashed_password="x"))
+        with pytest.raises(RuntimeError):
+            db.flush()
+    finally:
+        db.close()
+
+
+def test_unreachable_replica_falls_back_to_primary(broken_replica):
+    db = database._open_read_session()
+    try:
+        assert db.get_bind() is database.engine
+    finally:
+        db.close()
+    # Bir süre tekrar denenmez
+    assert database._replica_down_until > time.monotonic()
+
+
+def test_recent_writer_reads_from_primary(broken_replica, monkeypatch):
+    request = _Request(token="abc")
+    database.mark_written(database._client_key(request))
+    monkeypatch.setattr(database, "_open_read_session", lambda: pytest.fail("replika denenmemeli"))
+    session = next(database.get_read_db(request))
+    assert session.get_bind() is database.engine
+    session.close()
+
+    monkeypatch.setattr(database, "STICKY_SECONDS", 0.0)
+    assert database._is_sticky(database._client_key(request)) is False
+
+
+def test_commit_with_writes_marks_client_sticky(db):
+    db.info["client_key"] = "ip:10.9.9.9"
+    db.add(models.User(email="writer@example.com", company_name="w", hashed_password="x"))
+    db.commit()
+    assert database._is_sticky("ip:10.9.9.9")
@@ -0,0 +1,57 @@
+import random
+import pytest
+import geo
+
+
+def _located_lot(make_lot, lat, lon, **values):
+    return make_lot(latitude=lat, longitude=lon, geo_cell=geo.encode(lat, lon), **values)
+
+
+def _brute_force(lots, lat, lon):
+    return sorted((geo.haversine_km(lat, lon, l.latitude, l.longitude), l.id) for l in lots)
+
+
+def test_lookup_resolves_free_text_locations():
+    assert geo.lookup("Gebze / Kocaeli") == geo.DISTRICTS["gebze"]
+    assert geo.lookup("Aliağa OSB, İzmir") == geo.DISTRICTS["aliaga"]
+    # İlçe bilinmiyorsa il merkezine düşer
+    assert geo.lookup("Bilinmeyen Sokak, Konya") == geo.PROVINCES["konya"]
+    assert geo.lookup("Atlantis") is None
+
+    offer = {"custom_fields": {"Konum": "Çerkezköy / Tekirdağ"}}
+    geo.apply(offer)
+    assert (offer["latitude"], offer["longitude"]) == geo.DISTRICTS["cerkezkoy"]
+    assert offer["geo_cell"] == geo.encode(*geo.DISTRICTS["cerkezkoy"])
+
+
+@pytest.mark.parametrize("radius_km", [5.0, 40.0, 150.0])
+def test_within_matches_brute_force(db, make_lot, radius_km):
+    rng = random.Random(7)
+    center = geo.DISTRICTS["gebze"]
+    lots = [_located_lot(make_lot, center[0] + rng.uniform(-1.5, 1.5), center[1] + rng.uniform(-1.5, 1.5)) for _ in range(60)]
+    expected = [(round(d, 1), i) for d, i in _brute_force(lots, *center) if d <= radius_km]
+
+    found = geo.within(db, center[0], center[1], radius_km, limit=500)
+    assert [(lot.distance_km, lot.id) for lot in found] == expected
+
+
+def test_nearest_expands_radius_and_filters(db, make_lot):
+    center = geo.DISTRICTS["aliaga"]
+    far = [_located_lot(make_lot, *geo.PROVINCES[name]) for name in ("ankara", "adana", "bursa", "manisa")]
+    _located_lot(make_lot, *geo.PROVINCES["manisa"], material_type="PE")
+    _located_lot(make_lot, *geo.DISTRICTS["aliaga"], is_active=False)
+
+    found = geo.nearest(db, center[0], center[1], n=2, material_type="PP")
+    assert [lot.id for lot in found] == [i for _, i in _brute_force(far, *center)[:2]]
+
+
+def test_nearby_endpoint(client, make_lot):
+    near = _located_lot(make_lot, *geo.DISTRICTS["dilovasi"])
+    _located_lot(make_lot, *geo.PROVINCES["ankara"])
+
+    response = client.get("/products/nearby", params={"near": "Gebze", "radius_km": 30})
+    assert response.status_code == 200, response.text
+    assert [(lot["id"], lot["distance_km"] < 30) for lot in response.json()] == [(near.id, True)]
+    assert client.get("/products/nearest", params={"lat": 39.9, "lon": 32.8, "n": 1}).json()[0]["id"] != near.id
+    assert client.get("/products/nearby").status_code == 400
+    assert client.get("/products/nearby", params={"near": "Atlantis"}).status_code == 400
@@ -0,0 +1,81 @@
+import datetime
+import pytest
+from fastapi import HTTPException
+import idempotency
+import models
+import price_model
+from database import SessionLocal
+
+
+def test_retry_with_same_key_replays_first_response(client, db, make_lot):
+    lot = make_lot(quantity_tons=10.0)
+    body = {"lot_id": lot.id, "quantity_tons": 2.0}
+    first = client.post("/checkout/", json=body, headers={"Idempotency-Key": "order-1"})
+    second = client.post("/checkout/", json=body, headers={"Idempotency-Key": "order-1"})
+    assert first.status_code == second.status_code == 200
+    assert second.headers.get("Idempotent-Replayed") == "true"
+    assert second.json() == first.json()
+    assert db.query(models.Order).count() == 1
+
+    conflict = client.post("/checkout/", json=dict(body, quantity_tons=3.0), headers={"Idempotency-Key": "order-1"})
+    assert conflict.status_code == 422
+
+
+def test_same_key_from_different_clients_does_not_collide(client, db, register, make_lot):
+    lot = make_lot(quantity_tons=10.0)
+    body = {"lot_id": lot.id, "quantity_tons": 1.0}
+    for email in ("a@example.com", "b@example.com"):
+        headers, _ = register(email)
+        response = client.post("/checkout/", json=body, headers={**headers, "Idempotency-Key": "retry-1"})
+        assert response.status_code == 200
+        assert "Idempotent-Replayed" not in response.headers
+    assert db.query(models.Order).count() == 2
+
+
+def test_stale_in_progress_lease_is_taken_over(client, db, register, make_lot):
+    lot = make_lot(quantity_tons=10.0)
+    headers, _ = register("crashed@example.com")
+    body = {"lot_id": lot.id, "quantity_tons": 1.0}
+    # Yanıtı saklayamadan çökmüş bir istek: kiralaması dolmuş in_progress kaydı
+    db.add(models.IdempotencyRecord(
+        scope="POST /checkout/ user:crashed@example.com", key="k1", request_hash=idempotency.request_hash(body),
+        status="in_progress", expires_at=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=1),
+    ))
+    db.commit()
+
+    response = client.post("/checkout/", json=body, headers={**headers, "Idempotency-Key": "k1"})
+    assert response.status_code == 200
+    assert db.query(models.Order).count() == 1
+    db.expire_all()
+    record = db.query(models.IdempotencyRecord).one()
+    assert record.status == "completed"
+    assert record.expires_at > datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(hours=23)
+
+
+def test_request_that_lost_its_lease_cannot_store(db):
+    with pytest.raises(HTTPException) as excinfo:
+        with idempotency.guard(db, "k2", "test", {"a": 1}) as guard:
+            # Kiralama doldu ve bir tekrar deneme kaydı devralıp sildi
+            db.query(models.IdempotencyRecord).delete()
+            db.commit()
+            guard.store({"ok": True})
+    assert excinfo.value.status_code == 409
+
+
+def test_offer_creation_surfaces_lost_lease_as_conflict(client, db, register, monkeypatch):
+    headers, _ = register("seller@example.com")
+
+    def lose_lease(*args, **kwargs):
+        with SessionLocal() as other:
+            other.query(models.IdempotencyRecord).delete()
+            other.commit()
+        return None
+
+    # Tahmin guard içinde çağrılır: o sırada kaydı başka bir istek devralıp silmiş olsun
+    monkeypatch.setattr(price_model, "predict", lose_lease)
+    response = client.post("/offers/", json={
+        "material_type": "PP", "material_form": "Granül", "quantity_tons": 5.0,
+        "declared_mfi": 12.0, "declared_density": 0.9,
+    }, headers={**headers, "Idempotency-Key": "offer-1"})
+    assert response.status_code == 409
+    assert db.query(models.Offer).count() == 0
@@ -0,0 +1,76 @@
+import datetime
+import jobs
+import models
+
+
+def _claim_all(db):
+    return jobs.claim(db, "worker-1", limit=10)
+
+
+def test_enqueue_is_part_of_the_callers_transaction(db):
+    jobs.enqueue(db, "test.noop")
+    db.rollback()
+    assert db.query(models.Job).count() == 0
+
+    jobs.enqueue(db, "test.noop", unique=True)
+    db.commit()
+    assert jobs.enqueue(db, "test.noop", unique=True) is None
+    db.commit()
+    assert db.query(models.Job).count() == 1
+
+
+def test_jobs_run_in_priority_order_and_finish(db, monkeypatch):
+    seen = []
+    monkeypatch.setitem(jobs.HANDLERS, "test.record", lambda session, payload: seen.append(payload["n"]))
+    jobs.enqueue(db, "test.record", {"n": "low"}, priority=200)
+    jobs.enqueue(db, "test.record", {"n": "high"}, priority=10)
+    jobs.enqueue(db, "test.record", {"n": "later"}, delay_seconds=3600)
+    db.commit()
+
+    ids = _claim_all(db)
+    assert len(ids) == 2 # gecikmeli iş henüz alınmaz
+    for job_id in ids:
+        assert jobs.run_job(job_id, "worker-1")
+    assert seen == ["high", "low"]
+    db.expire_all()
+    assert sorted(job.status for job in db.query(models.Job).all()) == ["done", "done", "queued"]
+
+
+def test_failing_job_backs_off_then_goes_dead(db, monkeypatch):
+    def explode(session, payload):
+        raise ValueError("boom")
+
+    monkeypatch.setitem(jobs.HANDLERS, "test.explode", explode)
+    jobs.enqueue(db, "test.explode", max_attempts=2)
+    db.commit()
+
+    (job_id,) = _claim_all(db)
+    assert jobs.run_job(job_id, "worker-1") is False
+    db.expire_all()
+    job = db.get(models.Job, job_id)
+    assert job.status == "queued" and "boom" in job.last_error
+    assert job.run_at > datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) # geri çekilme
+    assert _claim_all(db) == []
+
+    job.run_at = datetime.datetime(2000, 1, 1)
+    db.commit()
+    (job_id,) = _claim_all(db)
+    assert jobs.run_job(job_id, "worker-1") is False
+    db.expire_all()
+    assert db.get(models.Job, job_id).status == "dead"
+
+
+def test_expired_lease_is_reclaimed(db, monkeypatch):
+    jobs.enqueue(db, "test.noop")
+    db.commit()
+    (job_id,) = jobs.claim(db, "crashed-worker")
+    db.query(models.Job).update({"locked_until": datetime.datetime(2000, 1, 1)})
+    db.commit()
+    assert jobs.claim(db, "worker-2") == [job_id]
+
+
+def test_checkout_enqueues_model_refresh_with_the_order(client, db, make_lot):
+    lot = make_lot()
+    assert client.post("/checkout/", json={"lot_id": lot.id, "quantity_tons": 1.0}).status_code == 200
+    kinds = {job.kind for job in db.query(models.Job).all()}
+    assert {"price_model.refresh", "price_history.compact"} <= kinds
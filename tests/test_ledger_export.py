@@ -0,0 +1,33 @@
+import csv
+import io
+import json
+from sqlalchemy import insert
+import ledger_export
+import models
+
+
+def test_export_requires_admin(client, register):
+    assert client.get("/admin/exports/orders").status_code == 401
+    headers, _ = register("buyer@example.com")
+    assert client.get("/admin/exports/orders", headers=headers).status_code == 403
+
+
+def test_export_streams_every_order_across_chunks(client, db, register, make_lot):
+    headers, _ = register("finance@example.com", role="admin")
+    lot = make_lot()
+    count = ledger_export.CHUNK_SIZE * 2 + 5
+    db.execute(insert(models.Order), [
+        {"buyer_id": 1, "lot_id": lot.id, "quantity_tons": 1.0, "total_amount_usd": 1000.0, "payment_status": "Escrow_Funded"}
+        for _ in range(count)
+    ])
+    db.commit()
+
+    response = client.get("/admin/exports/orders", headers=headers)
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == count
+    assert [int(row["order_id"]) for row in rows] == sorted(int(row["order_id"]) for row in rows)
+
+    last_id = int(rows[-10]["order_id"])
+    response = client.get("/admin/exports/orders", params={"format": "ndjson", "after_id": last_id}, headers=headers)
+    assert [json.loads(line)["order_id"] for line in response.text.splitlines()] == [int(r["order_id"]) for r in rows[-9:]]
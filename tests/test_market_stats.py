@@ -0,0 +1,64 @@
+import market_stats
+import models
+from database import SessionLocal
+
+
+def test_deltas_match_full_recompute_through_write_endpoints(client, db, make_lot, admin):
+    cheap = make_lot(selling_price_usd=800.0, quantity_tons=5.0, carbon_score="A")
+    pricey = make_lot(selling_price_usd=1200.0, quantity_tons=10.0, carbon_score="B")
+    make_lot(material_type="PE", selling_price_usd=900.0)
+    market_stats.rebuild(db)
+
+    offer = models.Offer(seller_id=1, material_type="PP", declared_mfi=12.0, declared_density=0.91,
+                         quantity_tons=8.0, ai_estimated_price_usd=1000.0, status="AwaitingSample")
+    db.add(offer)
+    db.commit()
+    assert client.post(f"/admin/approve_offer/{offer.id}", json={"criteria_scores": {"mfi": 100}}, headers=admin[0]).status_code == 200
+    assert client.post("/checkout/", json={"lot_id": cheap.id, "quantity_tons": 5.0}).status_code == 200 # lot kapanır
+    assert client.post("/checkout/", json={"lot_id": pricey.id, "quantity_tons": 4.0}).status_code == 200
+    assert client.put(f"/products/{pricey.id}", json={"selling_price_usd": 1500.0}).status_code == 200
+    assert market_stats.verify(db) == []
+
+    stats = client.get("/market/stats", params={"material_type": "PP"}).json()
+    assert stats["active_lot_count"] == 2 # pricey + onaylanan
+    assert stats["available_tons"] == 14.0
+    assert stats["max_price_usd"] == 1500.0
+    assert stats["order_count"] == 2
+    assert stats["sold_amount_usd"] == 5 * 800.0 + 4 * 1200.0
+
+    # En yüksek fiyatlı lot gizlenince sınırlar yeniden bulunur
+    assert client.delete(f"/products/{pricey.id}").status_code == 200
+    assert market_stats.verify(db) == []
+    stats = client.get("/market/stats", params={"material_type": "PP"}).json()
+    assert stats["active_lot_count"] == 1
+    assert stats["max_price_usd"] == 1050.0 # onaylanan lot: ai fiyatı + %5
+    assert client.get("/market/stats", params={"material_type": "PET"}).status_code == 404
+
+
+def test_verify_reports_drift(db, make_lot):
+    make_lot()
+    market_stats.rebuild(db)
+    db.query(models.MarketStat).update({"active_lot_count": 7})
+    db.commit()
+    assert market_stats.verify(db) == ["PP.active_lot_count: 7 != 1"]
+
+
+def test_concurrent_first_write_for_new_material_does_not_conflict(db, monkeypatch):
+    real_insert = market_stats.dialect_insert
+    raced = []
+
+    def racing_insert(session):
+        # Bu transaction satırı göremedikten sonra başka bir istek aynı malzemeyi ekleyip commit eder
+        if not raced:
+            raced.append(True)
+            with SessionLocal() as other:
+                market_stats.record_fill(other, "PA6", 1.0, 100.0)
+                other.commit()
+        return real_insert(session)
+
+    monkeypatch.setattr(market_stats, "dialect_insert", racing_insert)
+    market_stats.record_fill(db, "PA6", 2.0, 300.0)
+    db.commit()
+
+    stat = db.get(models.MarketStat, "PA6")
+    assert (stat.order_count, stat.sold_tons, stat.sold_amount_usd) == (2, 3.0, 400.0)
@@ -0,0 +1,62 @@
+import market_stats
+import models
+
+REQUEST = {
+    "material_type": "PP", "min_mfi": 8.0, "max_mfi": 12.0,
+    "min_density": 0.85, "max_density": 0.95, "target_quantity_tons": 10.0,
+}
+
+
+def _seed(make_lot):
+    # MFI talep aralığının merkezine (10) yaklaştıkça daha iyi eşleşme
+    ids = {}
+    for mfi in (8.0, 9.0, 10.0, 11.0, 11.5, 12.0):
+        ids[mfi] = make_lot(mfi=mfi, density=0.9, quality_score_numeric=80.0).id
+    make_lot(mfi=15.0, density=0.9)                      # MFI aralığı dışında
+    make_lot(mfi=10.0, density=0.9, is_active=False)     # pasif
+    make_lot(material_type="PE", mfi=10.0, density=0.9)  # başka malzeme
+    return ids
+
+
+def test_match_returns_best_lots_first_within_limit(client, make_lot):
+    ids = _seed(make_lot)
+    response = client.post("/products/match", params={"limit": 3}, json=REQUEST)
+    assert response.status_code == 200, response.text
+    lots = response.json()
+    assert [lot["id"] for lot in lots] == [ids[10.0], ids[9.0], ids[11.0]]
+    scores = [lot["match_score"] for lot in lots]
+    assert scores == sorted(scores, reverse=True)
+    assert all(0 <= score <= 100 for score in scores)
+
+
+def test_match_pages_do_not_overlap(client, make_lot):
+    ids = _seed(make_lot)
+    pages = [
+        client.post("/products/match", params={"limit": 2, "offset": offset}, json=REQUEST).json()
+        for offset in (0, 2, 4, 6)
+    ]
+    seen = [lot["id"] for page in pages for lot in page]
+    assert sorted(seen) == sorted(ids.values())
+    assert pages[-1] == []
+
+
+def test_weights_change_ranking(client, db, make_lot):
+    centered = make_lot(mfi=10.0, density=0.9, quality_score_numeric=80.0, selling_price_usd=2000.0).id
+    cheap = make_lot(mfi=11.8, density=0.9, quality_score_numeric=80.0, selling_price_usd=600.0).id
+    market_stats.rebuild(db) # Fiyat terimi pazar ortalamasına göre hesaplanır
+
+    by_fit = client.post("/products/match", params={"w_price": 0}, json=REQUEST).json()
+    assert by_fit[0]["id"] == centered
+    by_price = client.post("/products/match", params={"w_price": 10, "w_mfi": 0.1}, json=REQUEST).json()
+    assert by_price[0]["id"] == cheap
+
+
+def test_stored_request_match(client, db, make_lot):
+    ids = _seed(make_lot)
+    request = models.PurchaseRequest(buyer_id=1, **REQUEST)
+    db.add(request)
+    db.commit()
+
+    response = client.get("/guaranteed-lots/match", params={"request_id": request.id, "limit": 1})
+    assert [lot["id"] for lot in response.json()] == [ids[10.0]]
+    assert client.get("/guaranteed-lots/match", params={"request_id": 999}).status_code == 404
@@ -0,0 +1,43 @@
+import threading
+import messaging
+import models
+
+
+def test_pair_key_is_order_independent():
+    assert messaging.pair_key(7, 3) == messaging.pair_key(3, 7) == (3, 7, 0)
+    assert messaging.pair_key(3, 7, 12) == (3, 7, 12)
+
+
+def test_find_or_create_reuses_conversation_for_either_direction(db):
+    first = messaging.find_or_create_conversation(db, 1, 2)
+    assert messaging.find_or_create_conversation(db, 2, 1) == first
+    # Lot bazlı konuşma ayrı bir odadır
+    assert messaging.find_or_create_conversation(db, 1, 2, lot_id=5) != first
+    db.commit()
+    conversation = db.get(models.Conversation, first)
+    # İlk yazan alıcı olarak kalır; tekrarlanan upsert rolleri değiştirmez
+    assert (conversation.buyer_id, conversation.seller_id) == (1, 2)
+    assert db.query(models.Conversation).count() == 2
+
+
+def test_concurrent_first_messages_land_in_one_conversation(client, db, register):
+    buyer_headers, buyer_id = register("buyer@example.com")
+    seller_headers, seller_id = register("seller@example.com")
+    barrier = threading.Barrier(8)
+    responses = []
+
+    def send(i):
+        headers, receiver = (buyer_headers, seller_id) if i % 2 == 0 else (seller_headers, buyer_id)
+        barrier.wait()
+        responses.append(client.post("/messages/", json={"receiver_id": receiver, "text": f"m{i}"}, headers=headers))
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses]
+    assert len({r.json()["conversation_id"] for r in responses}) == 1
+    assert db.query(models.Conversation).count() == 1
+    assert db.query(models.Message).count() == 8
@@ -0,0 +1,77 @@
+import datetime
+import threading
+import pytest
+import models
+
+THREADS = 8
+APPROVAL = {"criteria_scores": {"mfi": 90}}
+
+
+def _offer(db, status="AwaitingSample", **values):
+    offer = models.Offer(seller_id=1, material_type="PP", declared_mfi=12.0, declared_density=0.91,
+                         quantity_tons=20.0, ai_estimated_price_usd=900.0, status=status, **values)
+    db.add(offer)
+    db.commit()
+    return offer.id
+
+
+def test_concurrent_approvals_publish_exactly_one_lot(client, db, admin):
+    headers, _ = admin
+    offer_id = _offer(db)
+    barrier = threading.Barrier(THREADS)
+    statuses = []
+
+    def approve():
+        barrier.wait()
+        response = client.post(f"/admin/approve_offer/{offer_id}", json=APPROVAL, headers=headers)
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=approve) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [200] + [400] * (THREADS - 1)
+    assert db.query(models.GuaranteedLot).filter(models.GuaranteedLot.original_offer_id == offer_id).count() == 1
+    assert db.get(models.Offer, offer_id).status == "Approved"
+
+
+def test_rejected_offer_cannot_be_approved(client, db, admin):
+    headers, _ = admin
+    offer_id = _offer(db)
+    assert client.post(f"/admin/reject_offer/{offer_id}", json={"reason": "Numune uygun değil"}, headers=headers).status_code == 200
+    assert client.post(f"/admin/approve_offer/{offer_id}", json=APPROVAL, headers=headers).status_code == 400
+    assert db.query(models.GuaranteedLot).count() == 0
+
+
+@pytest.mark.parametrize("path, body", [("approve_offer", APPROVAL), ("reject_offer", {"reason": "x"})])
+def test_review_endpoints_require_admin(client, db, register, path, body):
+    offer_id = _offer(db)
+    headers, _ = register("seller@example.com")
+    assert client.post(f"/admin/{path}/{offer_id}", json=body).status_code == 401
+    assert client.post(f"/admin/{path}/{offer_id}", json=body, headers=headers).status_code == 403
+    db.expire_all()
+    assert db.get(models.Offer, offer_id).status == "AwaitingSample"
+
+
+@pytest.mark.parametrize("path, body", [("approve_offer", APPROVAL), ("reject_offer", {"reason": "x"})])
+def test_offer_claimed_by_another_expert_is_not_reviewable(client, db, register, admin, path, body):
+    headers, expert_id = admin
+    other_headers, other_id = register("other-expert@example.com", role="admin")
+    lease = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=10)
+    offer_id = _offer(db, claimed_by=other_id, lease_expires_at=lease)
+
+    assert client.post(f"/admin/{path}/{offer_id}", json=body, headers=headers).status_code == 409
+    db.expire_all()
+    assert db.get(models.Offer, offer_id).status == "AwaitingSample"
+    # Kiralamanın sahibi işlemi yapabilir
+    assert client.post(f"/admin/{path}/{offer_id}", json=body, headers=other_headers).status_code == 200
+
+
+def test_expired_claim_does_not_block_review(client, db, register, admin):
+    headers, _ = admin
+    _, other_id = register("other-expert@example.com", role="admin")
+    expired = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)
+    offer_id = _offer(db, claimed_by=other_id, lease_expires_at=expired)
+    assert client.post(f"/admin/approve_offer/{offer_id}", json=APPROVAL, headers=headers).status_code == 200
@@ -0,0 +1,100 @@
+import datetime
+import threading
+import pytest
+from database import SessionLocal
+import models
+import offer_queue
+
+EXPERTS = 6
+
+
+def _offers(db, count, status="AwaitingSample"):
+    base = datetime.datetime(2026, 1, 1)
+    offers = [
+        models.Offer(seller_id=1, material_type="PP", declared_mfi=12.0, declared_density=0.91, quantity_tons=10.0,
+                     ai_estimated_price_usd=100.0 * (i + 1), estimated_value_usd=1000.0 * (i + 1), status=status,
+                     created_at=base + datetime.timedelta(minutes=i))
+        for i in range(count)
+    ]
+    db.add_all(offers)
+    db.commit()
+    return [offer.id for offer in offers]
+
+
+def test_concurrent_claims_never_hand_out_the_same_offer(db):
+    ids = _offers(db, 10)
+    barrier = threading.Barrier(EXPERTS)
+    claimed = {}
+
+    def claim(expert_id):
+        session = SessionLocal()
+        try:
+            barrier.wait()
+            claimed[expert_id] = [offer.id for offer in offer_queue.claim(session, expert_id, limit=2)]
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=claim, args=(expert_id,)) for expert_id in range(1, EXPERTS + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    handed_out = [offer_id for offer_ids in claimed.values() for offer_id in offer_ids]
+    assert len(handed_out) == len(set(handed_out))
+    owners = dict(db.query(models.Offer.id, models.Offer.claimed_by).all())
+    assert all(owners[offer_id] == expert_id for expert_id, offer_ids in claimed.items() for offer_id in offer_ids)
+
+    # Yarışı kaybeden exper boş dönebilir; kalanlar sonraki claim'de dağıtılır
+    rest = offer_queue.claim(db, expert_id=99, limit=len(ids))
+    assert sorted(handed_out + [offer.id for offer in rest]) == ids
+
+
+def test_expired_lease_can_be_claimed_and_release_checks_owner(db):
+    (offer_id,) = _offers(db, 1)
+    assert [o.id for o in offer_queue.claim(db, expert_id=1, lease_seconds=-1)] == [offer_id] # hemen dolan kira
+    assert [o.id for o in offer_queue.claim(db, expert_id=2)] == [offer_id]
+    assert offer_queue.claim(db, expert_id=3) == []
+    assert offer_queue.release(db, offer_id, expert_id=1) is False
+    assert offer_queue.release(db, offer_id, expert_id=2) is True
+
+
+def test_keyset_pages_cover_queue_once(client, db, admin):
+    headers, _ = admin
+    ids = _offers(db, 5)
+    _offers(db, 2, status="Approved")
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, "order": "value", **({"cursor": cursor} if cursor else {})}
+        response = client.get("/admin/offers/", params=params, headers=headers)
+        assert response.status_code == 200
+        seen += [offer["id"] for offer in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == list(reversed(ids)) # değere göre azalan
+    assert client.get("/admin/offers/", params={"cursor": "bozuk"}, headers=headers).status_code == 400
+
+
+@pytest.mark.parametrize("method, path", [
+    ("get", "/admin/offers/"), ("get", "/admin/offers/counts"),
+    ("post", "/admin/offers/claim"), ("post", "/admin/offers/{offer_id}/release"),
+])
+def test_queue_endpoints_require_admin(client, db, register, method, path):
+    (offer_id,) = _offers(db, 1)
+    headers, _ = register("buyer@example.com")
+    url = path.format(offer_id=offer_id)
+    assert getattr(client, method)(url).status_code == 401
+    assert getattr(client, method)(url, headers=headers).status_code == 403
+    db.expire_all()
+    assert db.get(models.Offer, offer_id).claimed_by is None
+
+
+def test_expert_claims_and_releases_through_api(client, db, admin):
+    headers, expert_id = admin
+    ids = _offers(db, 3)
+    claimed = client.post("/admin/offers/claim", params={"limit": 2}, headers=headers).json()
+    assert [offer["claimed_by"] for offer in claimed] == [expert_id, expert_id]
+    assert [offer["id"] for offer in claimed] == ids[:2]
+    assert client.post(f"/admin/offers/{ids[0]}/release", headers=headers).status_code == 200
+    assert client.post(f"/admin/offers/{ids[2]}/release", headers=headers).status_code == 409
@@ -0,0 +1,41 @@
+import datetime
+import models
+import price_history
+
+NOW = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+HOUR = price_history.bucket_start(NOW - datetime.timedelta(hours=1), "hour") # tamamen geçmiş bir saat
+
+
+def _event(db, price, minute, kind="listing", tons=0.0):
+    db.add(models.PriceEvent(lot_id=1, material_type="PP", kind=kind, price_usd=price, quantity_tons=tons,
+                             created_at=HOUR + datetime.timedelta(minutes=minute)))
+    db.commit()
+
+
+def test_compact_builds_ohlc_incrementally(client, db):
+    _event(db, 1000.0, 5)
+    _event(db, 1100.0, 20, kind="fill", tons=3.0)
+    # Geç commit edilmiş ama daha erken zamanlı olay açılışı değiştirir
+    _event(db, 950.0, 1)
+    assert price_history.compact(db, settle_seconds=0) == 3
+    assert price_history.compact(db, settle_seconds=0) == 0
+
+    _event(db, 1050.0, 30, kind="fill", tons=2.0)
+    assert price_history.compact(db, settle_seconds=0) == 1
+
+    (candle,) = price_history.candles(db, "PP", "hour")
+    assert (candle["open"], candle["high"], candle["low"], candle["close"]) == (950.0, 1100.0, 950.0, 1050.0)
+    assert (candle["events"], candle["fills"], candle["volume_tons"]) == (4, 2, 5.0)
+    assert price_history.reference_price(db, "PP") == 1050.0
+
+    response = client.get("/market/prices/PP", params={"interval": "day"})
+    assert response.status_code == 200
+    assert [c["close"] for c in response.json()] == [1050.0]
+    assert client.get("/market/prices/PP", params={"interval": "week"}).status_code == 400
+
+
+def test_compact_waits_for_recent_events_to_settle(db):
+    db.add(models.PriceEvent(lot_id=1, material_type="PP", kind="listing", price_usd=1000.0, quantity_tons=0.0))
+    db.commit()
+    assert price_history.compact(db, settle_seconds=60) == 0
+    assert price_history.compact(db, settle_seconds=0) == 1
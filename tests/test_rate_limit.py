@@ -0,0 +1,44 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import rate_limit
+
+
+def _app(backend):
+    app = FastAPI()
+
+    @app.post("/offers/")
+    def create_offer():
+        return {"ok": True}
+
+    app.add_middleware(rate_limit.RateLimitMiddleware, backend=backend, route_limits={"POST /offers/": (0.001, 2)})
+    return app
+
+
+def test_burst_exhausted_returns_429_with_retry_after():
+    client = TestClient(_app(rate_limit.InMemoryBackend()))
+    # Anonim istek IP kovasından harcar: kapasite burst * IP_LIMIT_MULTIPLIER
+    ip_burst = 2 * rate_limit.IP_LIMIT_MULTIPLIER
+    assert {client.post("/offers/").status_code for _ in range(ip_burst)} == {200}
+    response = client.post("/offers/")
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+
+def test_backend_stays_bounded_when_every_request_is_allowed():
+    backend = rate_limit.InMemoryBackend(max_keys=100)
+    for i in range(1000):
+        allowed, _ = backend.take(f"ip:10.0.{i // 256}.{i % 256}:default", 10.0, 40)
+        assert allowed
+    assert len(backend) <= 100
+
+
+def test_idle_buckets_are_swept_on_the_allow_path(monkeypatch):
+    backend = rate_limit.InMemoryBackend()
+    clock = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: clock[0])
+    backend._swept_at = clock[0]
+    for i in range(10):
+        backend.take(f"user:{i}:default", 10.0, 40)
+    clock[0] += backend.IDLE_SECONDS + backend.SWEEP_INTERVAL_SECONDS
+    backend.take("user:new:default", 10.0, 40)
+    assert len(backend) == 1
@@ -0,0 +1,26 @@
+import os
+import pytest
+import startup_profile
+
+# CI makinesine göre ayarlanabilir: STARTUP_BUDGET_MS=2500 pytest
+BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "1500"))
+
+
+@pytest.fixture(scope="module")
+def profile():
+    return startup_profile.measure("main")
+
+
+def test_main_import_stays_within_budget(profile):
+    rows, total_ms = profile
+    slowest = sorted(rows, key=lambda row: row["cumulative_ms"], reverse=True)[:5]
+    assert total_ms <= BUDGET_MS, (
+        f"`import main` {total_ms:.0f} ms, bütçe {BUDGET_MS:.0f} ms; en pahalılar: "
+        + ", ".join(f"{row['name']} {row['cumulative_ms']:.0f} ms" for row in slowest)
+    )
+
+
+def test_heavy_dependencies_are_not_imported_at_startup(profile):
+    rows, _ = profile
+    loaded = {row["name"].split(".")[0] for row in rows}
+    assert [name for name in startup_profile.LAZY_MODULES if name in loaded] == []
@@ -0,0 +1,58 @@
+import threading
+import pytest
+import models
+import write_behind
+
+
+@pytest.fixture
+def buffer():
+    # Pencere uzun tutulur ki eşzamanlı gönderimler aynı grupta toplansın
+    return write_behind.GroupCommitBuffer(models.Message.__table__, returning=("id", "created_at"), max_delay_ms=100)
+
+
+def test_concurrent_rows_share_one_commit_and_get_their_own_ids(db, buffer):
+    results = {}
+
+    def send(i):
+        results[i] = buffer.submit({"conversation_id": 1, "sender_id": 1, "text": f"m{i}"}).result(timeout=5)
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert buffer.stats["rows"] == 20
+    assert buffer.stats["batches"] < 20
+    # RETURNING id'leri parametre sırasıyla eşleşir: her istek kendi satırının id'sini alır
+    for i, written in results.items():
+        assert db.get(models.Message, written["id"]).text == f"m{i}"
+        assert written["created_at"] is not None
+
+
+def test_bad_row_does_not_drop_its_group(db, buffer):
+    good = [buffer.submit({"conversation_id": 1, "sender_id": 1, "text": f"ok{i}"}) for i in range(3)]
+    # SQLite bu değeri bağlayamaz: sadece bu satır hata almalı
+    bad = buffer.submit({"conversation_id": object(), "sender_id": 1, "text": "bad"})
+
+    assert sorted(db.get(models.Message, f.result(timeout=5)["id"]).text for f in good) == ["ok0", "ok1", "ok2"]
+    with pytest.raises(Exception):
+        bad.result(timeout=5)
+    assert buffer.stats["failed"] == 1
+
+
+def test_message_route_in_group_and_async_modes(client, db, register, monkeypatch):
+    headers, _ = register("buyer@example.com")
+    _, seller_id = register("seller@example.com")
+
+    monkeypatch.setattr(write_behind, "MODE", "group")
+    grouped = client.post("/messages/", json={"receiver_id": seller_id, "text": "merhaba"}, headers=headers).json()
+    assert db.get(models.Message, grouped["id"]).text == "merhaba"
+
+    monkeypatch.setattr(write_behind, "MODE", "async")
+    queued = client.post("/messages/", json={"receiver_id": seller_id, "text": "tekrar"}, headers=headers).json()
+    assert queued["id"] is None
+    assert queued["conversation_id"] == grouped["conversation_id"]
+    write_behind.messages.flush()
+    texts = [m["text"] for m in client.get(f"/messages/{grouped['conversation_id']}", headers=headers).json()]
+    assert texts == ["merhaba", "tekrar"]
@@ -0,0 +1,139 @@
+"""Optional group-commit write-behind buffer for append-only rows (messages).
+
+Her satır için ayrı commit + refresh yerine satırlar kısa bir süre (en fazla
+WRITE_BEHIND_MAX_DELAY_MS) tamponlanır ve tek transaction'da çok satırlı `INSERT ...
+RETURNING` ile yazılır; id'ler parametre sırasıyla geri döner. SQLite'ın tek yazar
+kilidi ve her commit'teki fsync, bir sohbet patlamasında böylece satır başına değil
+grup başına ödenir.
+
+Mod WRITE_BEHIND_MODE ile seçilir:
+    off    (varsayılan) tampon kullanılmaz, handler kendi commit'ini yapar
+    group  istek, satırının içinde olduğu grup commit edilene kadar bekler (dayanıklı, id döner)
+    async  istek satır kuyruğa girince döner (id yok); süreç çökerse son birkaç ms'lik yazım kaybolabilir
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+from sqlalchemy import insert
+from database import SessionLocal, mark_written
+import models
+
+MODES = ("off", "group", "async")
+MODE = os.environ.get("WRITE_BEHIND_MODE", "off")
+MAX_DELAY_MS = float(os.environ.get("WRITE_BEHIND_MAX_DELAY_MS", "5"))
+MAX_BATCH = int(os.environ.get("WRITE_BEHIND_MAX_BATCH", "200"))
+# group modunda isteğin commit için en fazla bekleyeceği süre
+SUBMIT_TIMEOUT_SECONDS = 10.0
+
+
+class GroupCommitBuffer:
+    def __init__(self, table, returning=("id",), max_delay_ms: float = MAX_DELAY_MS, max_batch: int = MAX_BATCH,
+                 session_factory=SessionLocal):
+        self.table = table
+        self.returning = [table.c[name] for name in returning]
+        self.max_delay = max_delay_ms / 1000.0
+        self.max_batch = max_batch
+        self.session_factory = session_factory
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._idle = threading.Condition(self._lock)
+        self.stats = {"rows": 0, "batches": 0, "failed": 0}
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"write-behind:{self.table.name}", daemon=True)
+                    self._thread.start()
+
+    def submit(self, row: dict, client_key=None) -> Future:
+        """Satırı kuyruğa koyar; Future commit sonrası RETURNING satırını (dict) taşır."""
+        self._ensure_started()
+        future = Future()
+        with self._lock:
+            self._pending += 1
+        self._queue.put((row, client_key, future))
+        return future
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, rows: list) -> list:
+        db = self.session_factory()
+        try:
+            stmt = insert(self.table).returning(*self.returning, sort_by_parameter_order=True)
+            result = [dict(r._mapping) for r in db.execute(stmt, rows)]
+            db.commit()
+            return result
+        finally:
+            db.close()
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            rows = [row for row, _, _ in batch]
+            try:
+                results = self._write(rows)
+                outcomes = list(zip(results, [None] * len(batch)))
+            except Exception:
+                # Grupta hatalı bir satır diğerlerini düşürmesin: tek tek tekrar dene
+                outcomes = []
+                for row in rows:
+                    try:
+                        outcomes.append((self._write([row])[0], None))
+                    except Exception as e:
+                        outcomes.append((None, e))
+            self.stats["batches"] += 1
+            for (row, client_key, future), (result, error) in zip(batch, outcomes):
+                if error is not None:
+                    self.stats["failed"] += 1
+                    print(f"write-behind {self.table.name} insert failed: {error}")
+                    future.set_exception(error)
+                else:
+                    self.stats["rows"] += 1
+                    mark_written(client_key)
+                    future.set_result(result)
+            with self._lock:
+                self._pending -= len(batch)
+                self._idle.notify_all()
+
+    def flush(self, timeout: float = SUBMIT_TIMEOUT_SECONDS):
+        """Kuyruktaki satırlar commit edilene kadar bekler (kapanışta)."""
+        with self._lock:
+            self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+
+messages = GroupCommitBuffer(models.Message.__table__, returning=("id", "created_at"))
+
+
+def enabled() -> bool:
+    return MODE in ("group", "async")
+
+
+def write(buffer: GroupCommitBuffer, row: dict, client_key=None) -> Optional[dict]:
+    """Moda göre satırı tampona yazar; group modunda RETURNING satırını, async modunda None döndürür."""
+    future = buffer.submit(row, client_key)
+    if MODE == "async":
+        return None
+    return future.result(timeout=SUBMIT_TIMEOUT_SECONDS)
+
+
+@atexit.register
+def _flush_all():
+    messages.flush()